@@ -31,5 +31,9 @@ setuptools.setup(
     install_requires=[
         "synapseclient>=2.3.1,<3.0.0",
         "synapsis>=0.0.7"
-    ]
+    ],
+    extras_require={
+        "zstd": ["zstandard"],
+        "yaml": ["pyyaml"]
+    }
 )
@@ -1,43 +1,180 @@
 import argparse
+import functools
+import importlib
 import sys
-from datetime import datetime
-from .commands.team_members_report import cli as team_members_report_cli
-from .commands.benefactor_permissions_report import cli as benefactor_permissions_report_cli
-from .commands.entity_permissions_report import cli as entity_permissions_report_cli
-from .commands.user_project_access_report import cli as user_project_access_report_cli
-from .commands.user_teams_report import cli as user_teams_report_cli
-# from .commands.team_access_report import cli as team_access_report_cli  # TODO: Uncomment when fully implemented.
+from datetime import datetime, timedelta
 from ._version import __version__
-from synapsis import cli as synapsis_cli
-
-ALL_ACTIONS = [
-    benefactor_permissions_report_cli,
-    entity_permissions_report_cli,
-    user_project_access_report_cli,
-    user_teams_report_cli,
-    team_members_report_cli
+
+# The commands are only imported when they are run so the CLI starts quickly.
+# (command, module, help)
+ALL_COMMANDS = [
+    ('benefactor-permissions', '.commands.benefactor_permissions_report.cli',
+     'Report the unique permissions on a Synapse entity and all its child entities.'),
+    ('entity-permissions', '.commands.entity_permissions_report.cli',
+     'Report the permissions of each user and team on a Synapse entity.'),
+    ('user-project-access', '.commands.user_project_access_report.cli',
+     'Report the projects a user has access to. NOTE: Only public projects or projects the user executing this script has access to will be reported.'),
+    ('user-teams', '.commands.user_teams_report.cli',
+     'Report the teams a user is a member of.'),
+    ('team-members', '.commands.team_members_report.cli',
+     'Report the members on a team.'),
+    ('team-access', '.commands.team_access_report.cli',
+     'Report the entities a team has access to. NOTE: Only entities in projects the user executing this script has access to will be reported.'),
+    ('snapshot', '.commands.snapshot.cli',
+     'Save the Projects, benefactors, ACLs, teams, team members, and users to a local snapshot database that reports can be run from with --from-snapshot.'),
+    ('diff', '.commands.diff_report.cli',
+     'Report the rows added, removed, or changed between two outputs of the same report or the permissions added, removed, or changed between two snapshots.'),
+    ('merge-shards', '.commands.merge_shards.cli',
+     'Merge the CSVs from a report that was run with --shard into one sorted report.'),
+    ('run-jobs', '.commands.run_jobs.cli',
+     'Run the reports defined in a jobs file in one process so they share the login, caches, and temporary view project.'),
+    ('serve', '.commands.serve.cli',
+     'Serve the reports over a local HTTP/JSON API that keeps the login and caches warm between requests.'),
+    ('warm-cache', '.commands.warm_cache.cli',
+     'Load the teams, team members, team invitations, and user profiles into a persistent cache that reports can load them from with --principal-cache.')
 ]
 
 
+def load_command(name):
+    """Imports the module for a command.
+
+    Returns:
+        The command's module or None if the command does not exist.
+    """
+    for command_name, module_name, _ in ALL_COMMANDS:
+        if command_name == name:
+            return importlib.import_module(module_name, __package__)
+    return None
+
+
+class _CommandArgumentParser(argparse.ArgumentParser):
+    def error(self, message):
+        raise ValueError(message)
+
+
+def parse_command_args(name, args, out_path=None):
+    """Parses the args for a command the same way the command line does, without the login args.
+
+    Args:
+        name: The name of the command.
+        args: The list of command line args for the command.
+        out_path: Set the command's out path to this.
+
+    Returns:
+        The parsed args.
+
+    Raises:
+        ValueError if the command does not exist, does not have an out path, or the args are invalid.
+    """
+    module = load_command(name)
+    if module is None:
+        raise ValueError('Invalid command: {0}'.format(name))
+    parser = _CommandArgumentParser(prog='syn-reports {0}'.format(name))
+    module.create(parser)
+    args = list(args)
+    if out_path:
+        out_action = next((a for a in parser._actions if a.dest == 'out_path'), None)
+        if out_action is None:
+            raise ValueError('Command does not have an out path: {0}'.format(name))
+        if out_action.option_strings:
+            args += [out_action.option_strings[-1], out_path]
+        else:
+            args = [out_path] + args
+    return parser.parse_args(args)
+
+
 def main(args=None):
-    shared_parser = argparse.ArgumentParser(add_help=False)
-    synapsis_cli.inject(shared_parser)
+    args = sys.argv[1:] if args is None else args
+    # The main parser only has flags so the first positional arg is the command.
+    command_name = next((arg for arg in args if not arg.startswith('-')), None)
 
     main_parser = argparse.ArgumentParser(description='Synapse Reports')
     main_parser.add_argument('--version', action='version', version='%(prog)s {0}'.format(__version__))
     subparsers = main_parser.add_subparsers(title='Commands', dest='command')
-    for action in ALL_ACTIONS:
-        action.create(subparsers, [shared_parser])
+    for name, module_name, help in ALL_COMMANDS:
+        if name == command_name:
+            from synapsis import cli as synapsis_cli
+            shared_parser = argparse.ArgumentParser(add_help=False)
+            synapsis_cli.inject(shared_parser)
+            shared_parser.add_argument('--session-cache', default=False,
+                                       action='store_true',
+                                       help='Reuse the logged in session from a recent run (only when logging in with an auth token). The session is cached in "~/.syn-reports/session.json".')
+            shared_parser.add_argument('--session-cache-ttl', type=int, default=None,
+                                       help='The number of seconds a cached session can be reused for. Defaults to 900.')
+            shared_parser.add_argument('--principal-cache', default=None, metavar='PATH',
+                                       help='Load the teams, team members, team invitations, and user profiles from this cache (created with warm-cache) before loading them from Synapse. Teams and user profiles older than the warm-cache --max-age are loaded from Synapse.')
+            cassette_group = shared_parser.add_mutually_exclusive_group()
+            cassette_group.add_argument('--record', default=None, metavar='DIR',
+                                        help='Record the Synapse requests and responses to this directory so the run can be replayed with --replay.')
+            cassette_group.add_argument('--replay', default=None, metavar='DIR',
+                                        help='Replay the Synapse requests and responses recorded with --record instead of calling Synapse. Does not log in.')
+            shared_parser.add_argument('--profile', default=False,
+                                       action='store_true',
+                                       help='Time the phases of the run (login, project listing, view creation, view build wait, view query, ACL fetch, principal resolution, team expansion, and output) and print the timings in aggregate and per entity.')
+            shared_parser.add_argument('--profile-stats', default=None, metavar='PATH',
+                                       help='Profile the run with cProfile and save the stats to this path (readable with pstats). Only the main thread of the main process is profiled. Implies --profile.')
+            shared_parser.add_argument('--profile-memory', default=False,
+                                       action='store_true',
+                                       help='Trace the peak memory of each phase with tracemalloc. Implies --profile. Slows down the run.')
+            shared_parser.add_argument('--trace', default=None, metavar='FILE',
+                                       help='Write the phases of the run and the spans for each entity, view scope, and CSV flush to this file as Chrome Trace Event JSON (viewable in Perfetto or chrome://tracing).')
+            shared_parser.add_argument('--metrics-file', default=None, metavar='PATH',
+                                       help='Write the metrics of the run (entities processed, rows and bytes written, API calls, cache hit rate, errors by type, and the duration of each phase) to this path when the run ends, in the Prometheus text format or as JSON if the path ends in ".json".')
+            shared_parser.add_argument('--metrics-format', default=None,
+                                       choices=['prometheus', 'json'],
+                                       help='The format of the --metrics-file. Defaults to json if the path ends in ".json" else prometheus.')
+            shared_parser.add_argument('--replay-latency', default=None,
+                                       choices=['zero', 'recorded'],
+                                       help='Replay the responses immediately (zero) or wait as long as each request took when it was recorded (recorded). Defaults to zero.')
+            parser = subparsers.add_parser(name, parents=[shared_parser], help=help)
+            load_command(name).create(parser)
+        else:
+            subparsers.add_parser(name, help=help)
 
     cmd_args = main_parser.parse_args(args)
 
     if '_execute' in cmd_args:
         exit_code = 1
+        start_time = datetime.now()
+        cassette = None
+        profiler = None
+        show_profile = False
+        metrics = None
+        cmd = None
+        exception = None
         try:
-            start_time = datetime.now()
-            synapsis_cli.configure(cmd_args, synapse_args={'multi_threaded': False}, login=True)
+            from synapsis import cli as synapsis_cli
+            from .core import Utils, SessionCache, Cassette, Profiler, RunMetrics, PrincipalCache
+            show_profile = cmd_args.profile or cmd_args.profile_stats or cmd_args.profile_memory
+            if show_profile or cmd_args.trace:
+                profiler = Profiler(stats_path=cmd_args.profile_stats and Utils.expand_path(cmd_args.profile_stats),
+                                    trace_memory=cmd_args.profile_memory,
+                                    trace_path=cmd_args.trace and Utils.expand_path(cmd_args.trace)).start()
+            # Log in on the first call to Synapse so commands that fail early or only read local files
+            # (e.g., reports loaded from a snapshot) do not wait on logging in.
+            synapsis_cli.configure(cmd_args, synapse_args={'multi_threaded': False}, login=False)
+            login_func = SessionCache(ttl=cmd_args.session_cache_ttl).login if cmd_args.session_cache else None
+            if cmd_args.record or cmd_args.replay:
+                cassette = Cassette(cmd_args.record or cmd_args.replay,
+                                    Cassette.REPLAY if cmd_args.replay else Cassette.RECORD,
+                                    latency=cmd_args.replay_latency)
+                login_func = functools.partial(cassette.login, login_func)
+            if cmd_args.metrics_file:
+                metrics = RunMetrics(cmd_args.metrics_file, command_name, format=cmd_args.metrics_format).start()
+                login_func = functools.partial(metrics.login, login_func)
+            Utils.defer_login(login_func)
+            if cmd_args.principal_cache:
+                principal_cache = PrincipalCache(cmd_args.principal_cache)
+                age = principal_cache.age()
+                print('Using principal cache: {0} (Warmed: {1}, Max age: {2})'.format(
+                    principal_cache.path,
+                    'unknown' if age is None else '{0} ago'.format(timedelta(seconds=int(age))),
+                    timedelta(seconds=int(principal_cache.max_age))))
+                if age is not None and age > principal_cache.max_age:
+                    print('  The cache is older than its max age so its stale entries are loaded from Synapse.'
+                          ' Run warm-cache to refresh it.')
+                Utils.WithCache.use_principal_cache(principal_cache)
             cmd = cmd_args._execute(cmd_args)
-            end_time = datetime.now()
             if cmd.errors:
                 print('Finished with errors.')
                 for error in cmd.errors:
@@ -48,8 +185,27 @@ def main(args=None):
                 exit_code = 0
         except Exception as ex:
             print(ex)
+            exception = ex
             exit_code = 1
         finally:
+            if cassette:
+                cassette.stop()
+            if metrics:
+                metrics.stop()
+                if exception is not None:
+                    metrics.errors['exception:{0}'.format(type(exception).__name__)] += 1
+                try:
+                    metrics.write(exit_code == 0, errors=cmd and cmd.errors)
+                    print('Metrics saved to: {0}'.format(metrics.path))
+                except Exception as ex:
+                    print('Could not write metrics: {0}'.format(ex))
+            if profiler:
+                profiler.stop()
+                if show_profile:
+                    profiler.print_report()
+                elif profiler.trace_path:
+                    print('Trace saved to: {0}'.format(profiler.trace_path))
+            end_time = datetime.now()
             print('Run time: {0}'.format(end_time - start_time))
             sys.exit(exit_code)
     else:
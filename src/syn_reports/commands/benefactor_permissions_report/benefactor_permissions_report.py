@@ -1,8 +1,12 @@
 import os
 import csv
+import math
+import shutil
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
 import synapseclient as syn
 from .benefactor_view import BenefactorView
-from ...core import Utils
+from ...core import Utils, Snapshot, CsvWriter, NormalizedWriter, ReportFilter, Profiler, RunMetrics
 from synapsis import Synapsis
 
 
@@ -14,7 +18,9 @@ class BenefactorPermissionsReport:
 
     def __init__(self, entity_ids_or_names, out_path=None,
                  out_file_prefix=None, out_file_per_entity=False,
-                 out_file_without_timestamp=False, out_file_name_max_length=None):
+                 out_file_without_timestamp=False, out_file_name_max_length=None, from_snapshot=None, processes=None,
+                 shard=None, compress=None, max_file_size=None, normalized=False, permission_levels=None,
+                 principals=None, principal_types=None, columns=None, compress_level=None):
         self._entity_ids_or_names = entity_ids_or_names if entity_ids_or_names is not None else []
         if self._entity_ids_or_names and not isinstance(self._entity_ids_or_names, list):
             self._entity_ids_or_names = [self._entity_ids_or_names]
@@ -23,12 +29,28 @@ class BenefactorPermissionsReport:
         self._out_file_without_timestamp = out_file_without_timestamp
         self._out_file_per_entity = out_file_per_entity
         self._out_file_name_max_length = out_file_name_max_length
+        self._snapshot = Snapshot(from_snapshot) if from_snapshot else None
+        # Load the data from the snapshot if set otherwise from Synapse.
+        self._utils = self._snapshot or Utils
+        self._processes = processes
+        self._shard = shard
+        self._compress = compress
+        self._compress_level = compress_level
+        self._max_file_size = max_file_size
+        self._normalized = normalized
+        self._filter = ReportFilter(permission_levels=permission_levels,
+                                    principals=principals,
+                                    principal_types=principal_types)
+        self._columns = columns
         self._csv_full_path = None
-        self._csv_file = None
         self._csv_writer = None
+        self._normalized_writer = None
         self.csv_files_created = []
         self.errors = []
 
+    # The number of shards to split the entities into for each process so the work stays balanced.
+    SHARDS_PER_PROCESS = 4
+
     CSV_HEADERS = ['entity_type',
                    'entity_id',
                    'entity_name',
@@ -45,27 +67,96 @@ class BenefactorPermissionsReport:
                    'user_data',
                    'permission_level']
 
+    # The columns that need the full profile of team members and invited users. The other user columns are
+    # loaded from the team's members so the profiles are only loaded if one of these columns is included.
+    TEAM_MEMBER_PROFILE_COLUMNS = ['user_data']
+    INVITEE_PROFILE_COLUMNS = ['username', 'first_name', 'last_name', 'user_data']
+
     def execute(self):
+        try:
+            self._columns = Utils.select_columns(self.CSV_HEADERS, self._columns)
+        except ValueError as ex:
+            self._show_error(str(ex))
+            return self
+        if self._normalized and self._columns != self.CSV_HEADERS:
+            self._show_error('Columns cannot be selected for normalized output.')
+            return self
+
         if self._out_path and not self._out_file_per_entity:
             if not self._start_csv():
                 return self
 
         try:
+            if not self._filter.resolve(self._utils, self._show_error):
+                return self
+
             if not self._entity_ids_or_names:
-                user = Synapsis.getUserProfile()
-                print('Loading all Projects accessible to user: {0}'.format(user.userName))
-                for activity in Utils.users_project_access(user.ownerId):
-                    project_id = activity['id']
-                    project_name = activity['name']
-                    self._entity_ids_or_names.append(project_id)
-                    print('  - Adding Project: {0} ({1})'.format(project_name, project_id))
+                # Report on each Project as soon as it is listed. The next page of Projects is loaded in the
+                # background while the current Projects are reported on.
+                self._entity_ids_or_names = self._add_projects(Utils.prefetch(self._list_projects()))
+
+            if self._shard:
+                self._select_shard()
 
+            if self._processes and self._processes > 1:
+                # The entities are split into shards so all the entities need to be listed first.
+                self._entity_ids_or_names = list(self._entity_ids_or_names)
+
+            if self._processes and self._processes > 1 and len(self._entity_ids_or_names) > 1:
+                self._report_in_processes()
+            else:
+                self._report_on_entities()
+        finally:
+            self._end_csv()
+            if self._snapshot:
+                self._snapshot.close()
+            if len(self.csv_files_created) > 0:
+                print('')
+                print('Report(s) saved to:')
+                for csv_file in self.csv_files_created:
+                    print(csv_file)
+        return self
+
+    def _list_projects(self):
+        """Lists all the Projects in the snapshot or accessible to the user.
+
+        Returns:
+            Generator
+        """
+        if self._snapshot:
+            print('Loading all Projects in snapshot: {0}'.format(self._snapshot.path))
+            return self._snapshot.projects()
+        else:
+            user = Utils.WithCache.get_current_user()
+            print('Loading all Projects accessible to user: {0}'.format(user.userName))
+            return Utils.users_project_access(user.ownerId)
+
+    def _add_projects(self, projects):
+        """Prints each Project and yields its ID.
+        Runs on the thread that reports on the Projects so the output is in the order the Projects are reported on.
+
+        Returns:
+            Generator
+        """
+        for project in projects:
+            print('  - Adding Project: {0} ({1})'.format(project['name'], project['id']))
+            yield project['id']
+
+    def _report_on_entities(self):
+        if self._snapshot:
+            benefactor_view = self._snapshot.benefactor_view()
+        else:
             print('Creating Temporary Project and Views...')
-            with BenefactorView() as benefactor_view:
-                for id_or_name in self._entity_ids_or_names:
+            benefactor_view = BenefactorView()
+        with benefactor_view:
+            # The total is not known while the Projects are still being listed.
+            total = len(self._entity_ids_or_names) if isinstance(self._entity_ids_or_names, list) else None
+            for number, id_or_name in enumerate(self._entity_ids_or_names, start=1):
+                with Profiler.entity(id_or_name):
+                    RunMetrics.increment(RunMetrics.ENTITIES_PROCESSED)
                     try:
                         print('=' * 80)
-                        entity = Utils.get_entity(id_or_name, self._show_error)
+                        entity = self._utils.get_entity(id_or_name, self._show_error)
                         if entity:
                             entity_type = Synapsis.ConcreteTypes.get(entity)
                             entity_name = entity['name']
@@ -73,14 +164,13 @@ class BenefactorPermissionsReport:
                                 if not self._start_csv(project_name=entity_name):
                                     return self
 
-                            print('Reporting on {0}: {1} ({2}) [{3} of {4}]'.format(
+                            print('Reporting on {0}: {1} ({2}) [{3}]'.format(
                                 entity_type.name,
                                 entity_name, entity['id'],
-                                self._entity_ids_or_names.index(id_or_name) + 1,
-                                len(self._entity_ids_or_names)
+                                number if total is None else '{0} of {1}'.format(number, total)
                             ))
-                            benefactor_view.set_scope(entity)
-                            self._report_on_view(benefactor_view)
+                            # Report on the benefactors while the rest of the view is still being loaded.
+                            self._report_on_view(benefactor_view.stream_scope(entity))
                             if self._out_path and self._out_file_per_entity:
                                 self._end_csv()
                         else:
@@ -88,14 +178,107 @@ class BenefactorPermissionsReport:
                                 'Entity does not exist or you do not have access to the entity: {0}'.format(id_or_name))
                     except Exception as ex:
                         self._show_error('ERROR: {0}'.format(ex))
+
+    def _select_shard(self):
+        """Only keeps the entities in the shard this report is running on."""
+        entity_ids = [self._get_entity_id(id_or_name) for id_or_name in self._entity_ids_or_names]
+        # Balance the shards by the number of benefactors in each entity if it is known.
+        size_func = self._snapshot.benefactors_count if self._snapshot else None
+        self._entity_ids_or_names = Utils.select_shard(entity_ids, self._shard, size_func=size_func)
+        print('Reporting on shard {0} of {1}: {2} of {3} entities.'.format(self._shard[0],
+                                                                          self._shard[1],
+                                                                          len(self._entity_ids_or_names),
+                                                                          len(entity_ids)))
+
+    def _get_entity_id(self, id_or_name):
+        """Gets the ID of an entity so the entity is in the same shard however it was specified."""
+        if Synapsis.is_synapse_id(id_or_name):
+            return id_or_name
+        # Errors are shown when the entity is reported on.
+        entity = self._utils.get_entity(id_or_name, lambda msg: None, only_header=True)
+        return entity['id'] if entity else id_or_name
+
+    def _report_in_processes(self):
+        """Splits the entities into shards and reports on each shard in a pool of processes.
+
+        Each shard is written to its own CSV and the shards are appended to the report's CSV in order
+        so the result is the same as reporting in one process. Per-entity CSVs are written by the processes.
+        """
+        entity_ids_or_names = self._entity_ids_or_names
+        shard_size = math.ceil(len(entity_ids_or_names) / (self._processes * self.SHARDS_PER_PROCESS))
+        shards = [entity_ids_or_names[i:i + shard_size] for i in range(0, len(entity_ids_or_names), shard_size)]
+        print('Reporting on {0} entities in {1} shards with {2} processes...'.format(len(entity_ids_or_names),
+                                                                                     len(shards),
+                                                                                     self._processes))
+        shards_dir = None
+        if self._csv_writer or self._normalized_writer:
+            shards_dir = tempfile.mkdtemp(prefix='.shards-', dir=os.path.dirname(self._csv_full_path))
+
+        shard_args = []
+        for index, shard in enumerate(shards, start=1):
+            shard_args.append(({
+                'entity_ids_or_names': shard,
+                'out_path': os.path.join(shards_dir, 'shard-{0}.csv'.format(index)) if shards_dir else (
+                    self._out_path if self._out_file_per_entity else None),
+                'out_file_prefix': self._out_file_prefix,
+                'out_file_per_entity': self._out_file_per_entity,
+                'out_file_without_timestamp': self._out_file_without_timestamp,
+                'out_file_name_max_length': self._out_file_name_max_length,
+                'compress': None if shards_dir else self._compress,
+                'compress_level': self._compress_level,
+                'max_file_size': None if shards_dir else self._max_file_size,
+                'normalized': self._normalized,
+                'permission_levels': self._filter.permission_levels,
+                'principals': self._filter.principals,
+                'principal_types': self._filter.principal_types,
+                'columns': self._columns,
+                'from_snapshot': self._snapshot.path if self._snapshot else None
+            }, shards_dir is not None))
+
+        failed_shards = []
+        merged = False
+        try:
+            results = Utils.process_map(_report_on_shard, shard_args, self._processes, login=not self._snapshot,
+                                        return_exceptions=True)
+            for index, result in enumerate(results, start=1):
+                if isinstance(result, BrokenProcessPool):
+                    # A process died (e.g., killed for running out of memory) before this shard completed.
+                    # The shards that completed are still merged.
+                    failed_shards.append(index)
+                    continue
+                elif isinstance(result, Exception):
+                    raise result
+                csv_files, errors = result
+                for error in errors:
+                    # The errors were already printed by the process.
+                    self.errors.append('Shard {0} of {1}: {2}'.format(index, len(shards), error))
+                if shards_dir:
+                    for csv_file in csv_files:
+                        with open(csv_file, mode='r', newline='', encoding='utf-8') as f:
+                            if self._normalized_writer:
+                                # Principals and team rosters in more than one shard are only written once.
+                                table = NormalizedWriter.table_of(csv_file)
+                                for row in csv.DictReader(f):
+                                    self._normalized_writer.add(table, row)
+                            else:
+                                for row in csv.DictReader(f):
+                                    self._csv_writer.writerow(row)
+                        os.remove(csv_file)
+                else:
+                    self.csv_files_created.extend(csv_files)
+            merged = True
+        except Exception as ex:
+            self._show_error('ERROR: {0}'.format(ex))
         finally:
-            self._end_csv()
-            if len(self.csv_files_created) > 0:
-                print('')
-                print('Report(s) saved to:')
-                for csv_file in self.csv_files_created:
-                    print(csv_file)
-        return self
+            for index in failed_shards:
+                self._show_error('ERROR: A process terminated abruptly. Shard {0} of {1} was not reported: {2}'.format(
+                    index, len(shards), ', '.join(shards[index - 1])))
+            if shards_dir:
+                if merged:
+                    # Only the partial outputs of the failed shards are left.
+                    shutil.rmtree(shards_dir, ignore_errors=True)
+                else:
+                    print('Shard outputs that were not merged are in: {0}'.format(shards_dir))
 
     def _start_csv(self, project_name=None):
         self._end_csv()
@@ -122,35 +305,47 @@ class BenefactorPermissionsReport:
             self._csv_full_path = os.path.join(self._out_path, csv_filename)
 
         Utils.ensure_dirs(os.path.dirname(self._csv_full_path))
-        self._csv_file = open(self._csv_full_path, mode='w', newline='', encoding='utf-8')
-        self._csv_writer = csv.DictWriter(self._csv_file,
-                                          delimiter=',',
-                                          quotechar='"',
-                                          fieldnames=self.CSV_HEADERS,
-                                          quoting=csv.QUOTE_ALL)
-        self._csv_writer.writeheader()
-        self.csv_files_created.append(self._csv_full_path)
+        if self._normalized:
+            self._normalized_writer = NormalizedWriter(self._csv_full_path,
+                                                       compress=self._compress,
+                                                       compress_level=self._compress_level,
+                                                       max_file_size=self._max_file_size)
+            self._csv_full_path = self._normalized_writer.path
+        else:
+            # The rows are compressed and written on a background thread and rotated to a new file at max_file_size.
+            self._csv_writer = CsvWriter(self._csv_full_path,
+                                         self._columns,
+                                         compress=self._compress,
+                                         compress_level=self._compress_level,
+                                         max_file_size=self._max_file_size,
+                                         extrasaction='ignore')
+            self._csv_full_path = self._csv_writer.path
         return True
 
     def _end_csv(self):
-        if self._csv_file:
-            self._csv_file.close()
-            self._csv_file = None
-            self._csv_writer = None
+        for name in ['_csv_writer', '_normalized_writer']:
+            writer = getattr(self, name)
+            if writer:
+                setattr(self, name, None)
+                try:
+                    writer.close()
+                finally:
+                    self.csv_files_created.extend(writer.paths)
 
     def _show_error(self, msg):
         self.errors.append(msg)
         Utils.eprint(msg)
 
-    def _report_on_view(self, benefactor_view):
-        for item in benefactor_view:
+    def _report_on_view(self, benefactor_items):
+        for item in benefactor_items:
             try:
                 benefactor_id = item['benefactor_id']
                 entity_project_id = item['project_id']
 
-                bundle = Utils.WithCache.get_bundle(benefactor_id,
-                                                    include_entity=True,
-                                                    include_access_control_list=True)
+                with Profiler.phase(Profiler.ACL_FETCH):
+                    bundle = self._utils.WithCache.get_bundle(benefactor_id,
+                                                              include_entity=True,
+                                                              include_access_control_list=True)
                 entity = bundle['entity']
                 entity_type = Synapsis.ConcreteTypes.get(entity)
                 print('{0}: {1} ({2})'.format(entity_type.name, entity['name'], entity['id']))
@@ -160,48 +355,117 @@ class BenefactorPermissionsReport:
                 resource_accesses = sorted(entity_acl.get('resourceAccess', []), key=lambda r: r.get('principalId'))
 
                 for resource in resource_accesses:
-                    user_or_team = Utils.WithCache.get_user_or_team(resource.get('principalId'))
                     permission = Synapsis.Permissions.get(resource.get('accessType'))
-
-                    self._display_principal(entity, entity_type, entity_project_id, permission, user_or_team)
-
+                    principal_id = resource.get('principalId')
+                    # Skip the principals that cannot match the filters before loading them.
+                    if not self._filter.includes_permission(permission) or \
+                            not self._filter.may_include_principal(principal_id):
+                        continue
+                    with Profiler.phase(Profiler.PRINCIPAL_RESOLUTION):
+                        user_or_team = self._utils.WithCache.get_user_or_team(principal_id)
+
+                    team_members = []
+                    team_invites = []
                     if isinstance(user_or_team, syn.Team):
-                        team_members = Utils.WithCache.get_team_members(user_or_team.id)
-                        for team_member in team_members:
-                            is_team_manager = team_member.get('isAdmin')
-                            member = team_member.get('member')
-                            user_id = member.get('ownerId')
-                            user = Utils.WithCache.get_user(user_id)
-                            self._display_principal(entity,
-                                                    entity_type,
-                                                    entity_project_id,
-                                                    permission,
-                                                    user,
-                                                    from_team_id=user_or_team.id,
-                                                    from_team_name=user_or_team.name,
-                                                    from_team_user_is_manager=is_team_manager)
-                            team_invites = Utils.WithCache.get_team_open_invitations(user_or_team.id)
-                            for team_invite in team_invites:
-                                user_id = team_invite.get('inviteeId', None)
-                                email = team_invite.get('inviteeEmail', None)
-                                if user_id is not None:
-                                    user = Utils.WithCache.get_user(user_id)
-                                else:
-                                    user = email
-                                self._display_principal(entity,
-                                                        entity_type,
-                                                        entity_project_id,
-                                                        permission,
-                                                        user,
-                                                        from_team_id=user_or_team.id,
-                                                        from_team_name=user_or_team.name,
-                                                        from_team_user_is_manager=is_team_manager,
-                                                        is_invite=True)
-
+                        with Profiler.phase(Profiler.TEAM_EXPANSION):
+                            team_members = self._filter.get_team_members(user_or_team.id, self._utils)
+                            team_invites = self._filter.get_team_invitations(user_or_team.id, self._utils)
+
+                    is_included = self._filter.includes(self._get_principal_type(user_or_team), principal_id)
+                    if is_included:
+                        self._display_principal(entity, entity_type, entity_project_id, permission, user_or_team)
+                    if self._normalized_writer and (is_included or team_members or team_invites):
+                        self._add_normalized_rows(entity, entity_type, entity_project_id, permission,
+                                                  principal_id, user_or_team, team_members, team_invites)
+
+                    for team_member in team_members:
+                        is_team_manager = team_member.get('isAdmin')
+                        member = team_member.get('member')
+                        user_id = member.get('ownerId')
+                        if self._loads_profiles(self.TEAM_MEMBER_PROFILE_COLUMNS):
+                            with Profiler.phase(Profiler.PRINCIPAL_RESOLUTION):
+                                user = self._utils.WithCache.get_user(user_id)
+                        else:
+                            user = syn.UserProfile(**member)
+                        self._display_principal(entity,
+                                                entity_type,
+                                                entity_project_id,
+                                                permission,
+                                                user,
+                                                from_team_id=user_or_team.id,
+                                                from_team_name=user_or_team.name,
+                                                from_team_user_is_manager=is_team_manager)
+                        if not self._filter.is_set:
+                            # Without filters the invitations are listed after each member (with the member's
+                            # is_team_manager) so the output is the same as before the filters were added.
+                            self._display_team_invites(entity, entity_type, entity_project_id, permission,
+                                                       user_or_team, team_invites,
+                                                       from_team_user_is_manager=is_team_manager)
+
+                    if self._filter.is_set:
+                        # The invitations are listed once per team so they can match without a member.
+                        self._display_team_invites(entity, entity_type, entity_project_id, permission,
+                                                   user_or_team, team_invites)
 
             except Exception as ex:
                 self._show_error('Error loading ACL data: {0}'.format(ex))
 
+    @Profiler.timed(Profiler.OUTPUT)
+    def _add_normalized_rows(self, entity, entity_type, entity_project_id, permission, principal_id, user_or_team,
+                             team_members, team_invites):
+        self._normalized_writer.add_acl_entry(entity,
+                                              entity_type,
+                                              self._get_entity_parent_id(entity),
+                                              entity_project_id,
+                                              principal_id,
+                                              permission)
+        # Only write each team's members and invitations the first time the team is on an ACL.
+        if self._normalized_writer.add_principal(principal_id, user_or_team) and isinstance(user_or_team, syn.Team):
+            self._normalized_writer.add_team(user_or_team, team_members, team_invites, self._utils.WithCache.get_users)
+
+    def _display_team_invites(self, entity, entity_type, entity_project_id, permission, team, team_invites,
+                              from_team_user_is_manager=None):
+        for team_invite in team_invites:
+            user_id = team_invite.get('inviteeId', None)
+            email = team_invite.get('inviteeEmail', None)
+            if user_id is None:
+                user = email
+            elif self._loads_profiles(self.INVITEE_PROFILE_COLUMNS):
+                with Profiler.phase(Profiler.PRINCIPAL_RESOLUTION):
+                    user = self._utils.WithCache.get_user(user_id)
+            else:
+                user = syn.UserProfile(ownerId=user_id, userName=None)
+            self._display_principal(entity,
+                                    entity_type,
+                                    entity_project_id,
+                                    permission,
+                                    user,
+                                    from_team_id=team.id,
+                                    from_team_name=team.name,
+                                    from_team_user_is_manager=from_team_user_is_manager,
+                                    is_invite=True)
+
+    def _loads_profiles(self, columns):
+        """Gets if the profiles of the team members or invitees are loaded for any of the columns.
+        The normalized output loads the profiles once per user for the principals table so they are not loaded
+        for each team on each benefactor only to be printed.
+        """
+        return not self._normalized_writer and any(c in self._columns for c in columns)
+
+    @staticmethod
+    def _get_principal_type(user_or_team):
+        if isinstance(user_or_team, syn.Team):
+            return 'Team'
+        return 'Unknown' if user_or_team is None else 'User'
+
+    def _get_entity_parent_id(self, entity):
+        # Do not include the parent ID for projects since no one has access to that container, and
+        # it's not needed or useful.
+        if Synapsis.ConcreteTypes.get(entity).is_project:
+            return None
+        return entity['parentId']
+
+    @Profiler.timed(Profiler.OUTPUT)
     def _display_principal(self, entity, entity_type, entity_project_id, permission, user_or_team_or_email,
                            from_team_id=None, from_team_name=None, from_team_user_is_manager=None,
                            is_invite=False):
@@ -251,6 +515,9 @@ class BenefactorPermissionsReport:
         if is_invite:
             if user_id is None:
                 print('{0}Invited Email: {1}'.format(indent, username))
+            elif username is None:
+                # The invitee's profile is not loaded when none of its columns are included.
+                print('{0}Invited User ID: {1}'.format(indent, user_id))
             else:
                 print('{0}Invited Username: {1} ({2})'.format(indent, username, user_id))
         elif username:
@@ -269,11 +536,7 @@ class BenefactorPermissionsReport:
 
         print('{0}Permission: {1}'.format(indent, permission.name))
 
-        entity_parent_id = entity['parentId']
-        # Do not include the parent ID for projects since no one has access to that container, and
-        # it's not needed or useful.
-        if Synapsis.ConcreteTypes.get(entity).is_project:
-            entity_parent_id = None
+        entity_parent_id = self._get_entity_parent_id(entity)
 
         if self._csv_writer:
             self._csv_writer.writerow({
@@ -293,3 +556,24 @@ class BenefactorPermissionsReport:
                 'user_data': user_data,
                 'permission_level': permission.name
             })
+
+
+def _report_on_shard(shard_args):
+    """Reports on a shard of entities in a worker process.
+
+    Args:
+        shard_args: Tuple (the report args, if the shard's CSVs are merged into the report by the main process).
+
+    Returns:
+        Tuple (list of CSV files created, list of errors).
+    """
+    report_args, merged = shard_args
+    try:
+        report = BenefactorPermissionsReport(**report_args).execute()
+        if merged:
+            # The main process counts the rows and bytes when it merges the shard's CSVs into the report.
+            RunMetrics.discard(RunMetrics.ROWS_WRITTEN, RunMetrics.BYTES_WRITTEN)
+        return report.csv_files_created, report.errors
+    except Exception as ex:
+        Utils.eprint('ERROR: {0}'.format(ex))
+        return [], ['ERROR: {0}'.format(ex)]
@@ -1,6 +1,8 @@
 import uuid
+import threading
 import synapseclient as syn
-from ...core import Utils
+from contextlib import contextmanager
+from ...core import Utils, Profiler
 from synapseclient.core.exceptions import SynapseHTTPError
 from synapsis import Synapsis
 
@@ -9,10 +11,23 @@ class BenefactorView(list):
     COL_BENEFACTORID = 'benefactorId'
     COL_PROJECTID = 'projectId'
 
-    def __init__(self, without_view=False):
+    # The Project the views are created in while share_view_project is active.
+    _sharing_view_project = False
+    _shared_view_project = None
+    _shared_view_project_lock = threading.Lock()
+
+    def __init__(self, without_view=False, view_project=None):
+        """
+        Args:
+            without_view: Load each folder and file individually instead of with a view.
+            view_project: An existing Project to create the views in. The Project is not deleted by this view.
+        """
         self.scope = None
-        self.view_project = None
+        self.view_project = view_project
+        self._owns_view_project = view_project is None
         self.without_view = without_view
+        # The (benefactor_id, project_id) of each item so duplicates are skipped without searching the list.
+        self._item_keys = set()
 
     def __enter__(self):
         return self
@@ -20,6 +35,10 @@ class BenefactorView(list):
     def __exit__(self, type, value, traceback):
         self.delete()
 
+    def clear(self):
+        super().clear()
+        self._item_keys.clear()
+
     def set_scope(self, scope, clear=True):
         """Load a new scope object and optionally clear the benefactor list data.
 
@@ -27,22 +46,44 @@ class BenefactorView(list):
             scope: The Project, Folder, or File to scope the view to.
             clear: Whether to clear the loaded benefactor list data or not.
         """
+        for item in self.stream_scope(scope, clear=clear):
+            self.append(item)
+
+    def stream_scope(self, scope, clear=True):
+        """Loads a new scope object and yields each new benefactor item as soon as it is loaded, while the rest of
+        the view's query results are still being loaded. The items are not added to the benefactor list data, only
+        the keys to skip duplicate items are kept, so the memory used does not grow with the number of items.
+
+        Args:
+            scope: The Project, Folder, or File to scope the view to.
+            clear: Whether to clear the loaded benefactor list data and keys or not.
+
+        Returns:
+            Generator
+        """
         if clear:
             self.clear()
         self.scope = scope
-        self.load()
+        # Only trace the loading so the span does not include the time the caller takes to use each item.
+        yield from Profiler.iterate_span(Profiler.SET_SCOPE, self.load())
 
     def load(self):
+        """Loads the benefactor items for the current scope.
+
+        Returns:
+            Generator of the items that were not already loaded.
+        """
         try:
             if type(self.scope) in [syn.Project, syn.Folder, syn.File]:
-                self._add_single_scope_item(self.scope)
+                yield from self._add_single_scope_item(self.scope)
 
                 if type(self.scope) in [syn.Project, syn.Folder]:
-                    if self.view_project is None and not self.without_view:
-                        self._create_project()
+                    if not self.without_view:
+                        with Profiler.phase(Profiler.VIEW_CREATION):
+                            self.ensure_view_project()
 
                     # Create a view and load the uniq benefactors for each folder and file in the scoped container.
-                    self._create_folder_and_file_view()
+                    yield from self._create_folder_and_file_view()
             else:
                 raise Exception('Scope entity must be a Project, Folder, or File.')
         except Exception as ex:
@@ -55,14 +96,22 @@ class BenefactorView(list):
         """
         try:
             if self.without_view:
-                self._fallback_add_folders_and_files()
+                yield from self._fallback_add_folders_and_files()
             else:
-                self._query_view(self._create_view([syn.EntityViewType.FOLDER, syn.EntityViewType.FILE]))
+                with Profiler.phase(Profiler.VIEW_CREATION):
+                    view = self._create_view([syn.EntityViewType.FOLDER, syn.EntityViewType.FILE])
+                try:
+                    yield from self._query_view(view)
+                finally:
+                    if not self._owns_view_project:
+                        # The Project is not deleted with this view (e.g., it is shared by a batch of reports)
+                        # so the views would be left in it.
+                        self._delete_view(view)
         except SynapseHTTPError as ex:
             if 'scope exceeds the maximum number' in str(ex):
                 print('Cannot create Folder/File view for: {0}. Falling back to individual loading and views.'.format(
                     self.scope.name))
-                self._fallback_add_folders_and_files()
+                yield from self._fallback_add_folders_and_files()
             else:
                 raise
 
@@ -91,7 +140,9 @@ class BenefactorView(list):
                                                         child_item_id,
                                                         child_added_count,
                                                         len(child_items)))
-            self._add_single_scope_item(child_item_id, project_id=project_id, benefactor_id=child_item_benefactor_id)
+            yield from self._add_single_scope_item(child_item_id,
+                                                   project_id=project_id,
+                                                   benefactor_id=child_item_benefactor_id)
             if child_type.is_folder:
                 folder_ids.append(child_item_id)
 
@@ -104,7 +155,7 @@ class BenefactorView(list):
                                                                             syn_folder.name,
                                                                             folder_added_count,
                                                                             len(folder_ids)))
-            self.set_scope(syn_folder, clear=False)
+            yield from self.stream_scope(syn_folder, clear=False)
 
     def _add_single_scope_item(self, entity_or_id, project_id=None, benefactor_id=None):
         """Gets the benefactor data for a single entity and adds it to self.
@@ -113,32 +164,54 @@ class BenefactorView(list):
             entity_or_id: The entity (or entity ID) to add benefactor data for.
 
         Returns:
-            None
+            Generator of the item if it was added.
         """
         if benefactor_id is None:
             benefactor_header = Synapsis.restGET('/entity/{0}/benefactor'.format(Synapsis.id_of(entity_or_id)))
             benefactor_id = benefactor_header.get('id')
         if project_id is None:
             project_id = Utils.WithCache.get_project_id(Synapsis.id_of(entity_or_id))
-        self._add_item(benefactor_id, project_id)
+        item = self._new_item(benefactor_id, project_id)
+        if item:
+            yield item
 
     def _query_view(self, view):
+        """Queries the view one page of JSON results at a time instead of downloading the results as a CSV.
+        The next page is loaded in the background while the items from the current page are used.
+        """
         query = 'SELECT DISTINCT {0},{1} FROM {2}'.format(self.COL_BENEFACTORID, self.COL_PROJECTID, view.id)
-        query_result = Synapsis.tableQuery(query=query, resultsAs='csv')
+        # The first page is returned once the view has been built.
+        with Profiler.phase(Profiler.VIEW_BUILD_WAIT):
+            query_result = Synapsis.tableQuery(query=query, resultsAs='rowset')
 
         col_benefactorid = self._get_table_column_index(query_result.headers, self.COL_BENEFACTORID)
         col_projectid = self._get_table_column_index(query_result.headers, self.COL_PROJECTID)
 
-        for row in query_result:
-            self._add_item(row[col_benefactorid], row[col_projectid])
+        for row in Utils.prefetch(Profiler.iterate(Profiler.VIEW_QUERY, query_result)):
+            item = self._new_item(row.values[col_benefactorid], row.values[col_projectid])
+            if item:
+                yield item
 
-    def _add_item(self, benefactor_id, project_id):
-        item = {
+    def _delete_view(self, view):
+        try:
+            Synapsis.Utils.delete_skip_trash(view)
+        except Exception as ex:
+            Utils.eprint('Error deleting view: {0}, Error: {1}'.format(Synapsis.id_of(view), ex))
+
+    def _new_item(self, benefactor_id, project_id):
+        """Gets a benefactor item if it has not already been loaded.
+
+        Returns:
+            The item or None if it was already loaded.
+        """
+        key = (benefactor_id, project_id)
+        if key in self._item_keys:
+            return None
+        self._item_keys.add(key)
+        return {
             'benefactor_id': benefactor_id,
             'project_id': project_id
         }
-        if item not in self:
-            self.append(item)
 
     def _get_table_column_index(self, headers, column_name):
         """Gets the column index for a Synapse Table Column.
@@ -147,10 +220,50 @@ class BenefactorView(list):
             if item.name == column_name:
                 return index
 
+    def ensure_view_project(self):
+        """Creates the temporary Project the views are created in if it does not exist.
+
+        Returns:
+            The Project.
+        """
+        if self.view_project is None:
+            if BenefactorView._sharing_view_project:
+                self.view_project = self._get_shared_view_project()
+                self._owns_view_project = False
+            else:
+                self._create_project()
+        return self.view_project
+
     def _create_project(self):
         name = '_TEMP_{0}_VIEW_PROJECT_'.format(str(uuid.uuid4()))
         self.view_project = Synapsis.store(syn.Project(name=name))
 
+    @classmethod
+    @contextmanager
+    def share_view_project(cls):
+        """Creates the views of every BenefactorView in one temporary Project until exited
+        (e.g., while a batch of reports is run) instead of a Project per BenefactorView.
+        The Project is created when it is first needed and deleted on exit.
+        """
+        cls._sharing_view_project = True
+        try:
+            yield
+        finally:
+            cls._sharing_view_project = False
+            with cls._shared_view_project_lock:
+                view_project = cls._shared_view_project
+                cls._shared_view_project = None
+            if view_project:
+                Synapsis.Utils.delete_skip_trash(view_project)
+
+    @classmethod
+    def _get_shared_view_project(cls):
+        with cls._shared_view_project_lock:
+            if cls._shared_view_project is None:
+                name = '_TEMP_{0}_VIEW_PROJECT_'.format(str(uuid.uuid4()))
+                cls._shared_view_project = Synapsis.store(syn.Project(name=name))
+            return cls._shared_view_project
+
     def _create_view(self, entity_types):
         name = '_TEMP_{0}_VIEW_'.format(str(uuid.uuid4()))
         cols = [
@@ -168,5 +281,5 @@ class BenefactorView(list):
         return Synapsis.store(schema)
 
     def delete(self):
-        if self.view_project:
+        if self.view_project and self._owns_view_project:
             Synapsis.Utils.delete_skip_trash(self.view_project)
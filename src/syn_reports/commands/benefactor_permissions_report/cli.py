@@ -1,10 +1,8 @@
 from .benefactor_permissions_report import BenefactorPermissionsReport
+from ...core import Utils, CsvWriter, ReportFilter
 
 
-def create(subparsers, parents):
-    parser = subparsers.add_parser('benefactor-permissions',
-                                   parents=parents,
-                                   help='Report the unique permissions on a Synapse entity and all its child entities.')
+def create(parser):
     parser.add_argument('entities',
                         nargs='*',
                         help='The IDs and/or names of the entities to report on. Will report on all Projects the user has access to if not set.')
@@ -20,6 +18,43 @@ def create(subparsers, parents):
     parser.add_argument('--out-file-name-max-length', type=int,
                         help='The max length of the CSV file name (minus the extension).')
 
+    parser.add_argument('--permission-level',
+                        nargs='+',
+                        type=ReportFilter.parse_permission_level,
+                        default=None,
+                        help='Only report on these permission levels, e.g., ADMIN, CAN_EDIT_AND_DELETE, CAN_EDIT, CAN_DOWNLOAD, CAN_VIEW (or the names, e.g., "Can View").')
+    parser.add_argument('--principal',
+                        nargs='+',
+                        default=None,
+                        help='Only report on these users and teams (IDs, usernames, or team names). Users are also reported on through the teams they are a member of.')
+    parser.add_argument('--principal-type',
+                        nargs='+',
+                        choices=ReportFilter.PRINCIPAL_TYPES,
+                        default=None,
+                        help='Only report on these types of principals.')
+    parser.add_argument('--columns',
+                        nargs='+',
+                        default=None,
+                        help='Only include these columns, in this order. Data that is only needed for the other columns is not loaded. One or more of: {0}'.format(', '.join(BenefactorPermissionsReport.CSV_HEADERS)))
+    parser.add_argument('--normalized', default=False,
+                        action='store_true',
+                        help='Write the ACL entries, principals, team members, and team invitations to separate CSVs keyed by ID (with "-acl_entries", "-principals", "-team_members", and "-team_invitations" added to the file name) instead of one row per entity, principal, and team member.')
+    parser.add_argument('--compress', default=None,
+                        choices=list(CsvWriter.COMPRESSIONS),
+                        help='Compress the CSV files while they are written. zstd requires the zstandard package.')
+    parser.add_argument('--compress-level', type=int, default=None,
+                        help='The level to compress the CSV files at (gzip: 1-9, zstd: 1-22). Defaults to {0}.'.format(
+                            ', '.join('{0} for {1}'.format(level, compress)
+                                      for compress, level in CsvWriter.COMPRESS_LEVELS.items())))
+    parser.add_argument('--max-file-size', type=Utils.parse_size, default=None,
+                        help='Start a new CSV file (with the same name plus "-part0002", etc.) once a file reaches this size, e.g., 500MB or 2GB.')
+
+    parser.add_argument('--from-snapshot', default=None,
+                        help='Path to a snapshot database created with the "snapshot" command to load the data from instead of Synapse.')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Split the entities into shards and report on them in this number of processes.')
+    parser.add_argument('--shard', type=Utils.parse_shard, default=None,
+                        help='Only report on the entities in this shard of the entities, in the format INDEX/COUNT (e.g., 1/4). Entities are assigned to shards the same way on every host. Combine the outputs with the "merge-shards" command.')
     parser.set_defaults(_execute=execute)
 
 
@@ -30,5 +65,16 @@ def execute(args):
         out_file_prefix=args.out_file_prefix,
         out_file_per_entity=args.out_file_per_entity,
         out_file_without_timestamp=args.out_file_without_timestamp,
-        out_file_name_max_length=args.out_file_name_max_length
+        out_file_name_max_length=args.out_file_name_max_length,
+        from_snapshot=args.from_snapshot,
+        processes=args.processes,
+        shard=args.shard,
+        compress=args.compress,
+        compress_level=args.compress_level,
+        max_file_size=args.max_file_size,
+        normalized=args.normalized,
+        permission_levels=args.permission_level,
+        principals=args.principal,
+        principal_types=args.principal_type,
+        columns=args.columns
     ).execute()
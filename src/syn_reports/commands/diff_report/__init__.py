@@ -0,0 +1,2 @@
+from .cli import create, execute
+from .diff_report import DiffReport
@@ -0,0 +1,32 @@
+from .diff_report import DiffReport
+from ...core import ExternalSort
+
+
+def create(parser):
+    parser.add_argument('old_path',
+                        help='The older report CSV or snapshot.')
+    parser.add_argument('new_path',
+                        help='The newer report CSV or snapshot.')
+    parser.add_argument('-o', '--out-path', default=None,
+                        help='Path to export the report to. Specify a path that ends in ".csv" to export to a specific file otherwise a timestamped filename will be created in the out path.')
+    parser.add_argument('-k', '--key-columns',
+                        nargs='+',
+                        default=None,
+                        help='The columns that identify a row. Defaults to the entity, project, and principal columns in the files.')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='The max number of rows to sort in memory. Defaults to {0}.'.format(
+                            ExternalSort.DEFAULT_CHUNK_SIZE))
+    parser.add_argument('--tmp-dir', default=None,
+                        help='The directory to write the sorted chunks to. Defaults to the system temp directory.')
+    parser.set_defaults(_execute=execute)
+
+
+def execute(args):
+    return DiffReport(
+        args.old_path,
+        args.new_path,
+        out_path=args.out_path,
+        key_columns=args.key_columns,
+        chunk_size=args.chunk_size,
+        tmp_dir=args.tmp_dir
+    ).execute()
@@ -0,0 +1,209 @@
+import os
+import csv
+import itertools
+from collections import Counter
+from contextlib import ExitStack
+from ...core import Utils, Snapshot, ExternalSort
+
+
+class DiffReport:
+    """
+    This report shows the rows that were added, removed, or changed between two outputs of the same report or
+    the permissions that were added, removed, or changed between two snapshots.
+
+    Both inputs are sorted by their key columns (with an external sort so memory use is bounded) and compared with
+    a merge-join so the inputs never need to fit in memory.
+    """
+    SQLITE_HEADER = b'SQLite format 3\x00'
+
+    # The columns that identify a row in each report, in sort order.
+    KEY_COLUMNS = ['entity_id',
+                   'project_id',
+                   'principal_id',
+                   'principal_type',
+                   'team_id',
+                   'user_id',
+                   'username']
+
+    # The order the rows are read from a snapshot in.
+    SNAPSHOT_SORT_COLUMNS = ['entity_id', 'principal_id']
+
+    CHANGE_ADDED = 'added'
+    CHANGE_REMOVED = 'removed'
+    CHANGE_CHANGED = 'changed'
+
+    def __init__(self, old_path, new_path, out_path=None, key_columns=None, chunk_size=None, tmp_dir=None):
+        self._old_path = Utils.expand_path(old_path)
+        self._new_path = Utils.expand_path(new_path)
+        self._out_path = Utils.expand_path(out_path) if out_path else None
+        self._key_columns = key_columns
+        self._chunk_size = chunk_size
+        self._tmp_dir = Utils.expand_path(tmp_dir) if tmp_dir else None
+        self._fieldnames = None
+        self._value_columns = None
+        self._csv_full_path = None
+        self._csv_file = None
+        self._csv_writer = None
+        self.counts = Counter()
+        self.errors = []
+
+    def execute(self):
+        try:
+            with ExitStack() as stack:
+                old_fieldnames, old_rows, old_is_snapshot = self._open(self._old_path, stack)
+                new_fieldnames, new_rows, new_is_snapshot = self._open(self._new_path, stack)
+
+                if old_is_snapshot != new_is_snapshot or old_fieldnames != new_fieldnames:
+                    self._show_error('Cannot compare files with different columns. Both files must be snapshots '
+                                     'or the output of the same report.')
+                    return self
+
+                self._fieldnames = old_fieldnames
+                key_columns = self._key_columns or [c for c in self.KEY_COLUMNS if c in self._fieldnames]
+                missing_columns = [c for c in key_columns if c not in self._fieldnames]
+                if not key_columns or missing_columns:
+                    self._show_error('Invalid key columns: {0}. Must be columns in: {1}'.format(
+                        ', '.join(missing_columns or key_columns), ', '.join(self._fieldnames)))
+                    return self
+                self._key_columns = key_columns
+                self._value_columns = [c for c in self._fieldnames if c not in self._key_columns]
+
+                print('Comparing: {0}'.format(self._old_path))
+                print('       To: {0}'.format(self._new_path))
+                print('Key Columns: {0}'.format(', '.join(self._key_columns)))
+
+                old_rows = self._sorted(old_rows, old_is_snapshot)
+                new_rows = self._sorted(new_rows, new_is_snapshot)
+
+                self._start_csv()
+                self._merge_join(old_rows, new_rows)
+
+            print('=' * 80)
+            for change in [self.CHANGE_ADDED, self.CHANGE_REMOVED, self.CHANGE_CHANGED]:
+                print('{0}: {1}'.format(change.capitalize(), self.counts[change]))
+        except Exception as ex:
+            self._show_error('ERROR: {0}'.format(ex))
+        finally:
+            if self._csv_file:
+                self._csv_file.close()
+            if self._csv_full_path:
+                print('Report saved to: {0}'.format(self._csv_full_path))
+        return self
+
+    def _open(self, path, stack):
+        """Opens a report CSV or a snapshot.
+
+        Returns:
+            Tuple (fieldnames, iterable of row dicts, is snapshot).
+        """
+        with open(path, mode='rb') as f:
+            is_snapshot = f.read(len(self.SQLITE_HEADER)) == self.SQLITE_HEADER
+
+        if is_snapshot:
+            snapshot = stack.enter_context(Snapshot(path))
+            fieldnames = Snapshot.ACL_ROW_HEADERS
+            rows = snapshot.acl_rows()
+        else:
+            f = stack.enter_context(open(path, mode='r', newline='', encoding='utf-8'))
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames or []
+            rows = reader
+        # Compare all values as strings the same way they are written to a report.
+        rows = ({k: '' if row.get(k) is None else str(row.get(k)) for k in fieldnames} for row in rows)
+        return fieldnames, rows, is_snapshot
+
+    def _sorted(self, rows, is_snapshot):
+        if is_snapshot and self._key_columns[:len(self.SNAPSHOT_SORT_COLUMNS)] == self.SNAPSHOT_SORT_COLUMNS:
+            # The snapshot rows are unique and already in this order.
+            return rows
+        return ExternalSort(self._fieldnames,
+                            key=self._row_key,
+                            chunk_size=self._chunk_size,
+                            tmp_dir=self._tmp_dir).sort(rows)
+
+    def _row_key(self, row):
+        return tuple(row[c] for c in self._key_columns)
+
+    def _row_values(self, row):
+        return tuple(row[c] for c in self._value_columns)
+
+    def _merge_join(self, old_rows, new_rows):
+        old_groups = itertools.groupby(old_rows, key=self._row_key)
+        new_groups = itertools.groupby(new_rows, key=self._row_key)
+        old = next(old_groups, None)
+        new = next(new_groups, None)
+
+        while old is not None or new is not None:
+            if new is None or (old is not None and old[0] < new[0]):
+                for row in old[1]:
+                    self._report_change(self.CHANGE_REMOVED, row)
+                old = next(old_groups, None)
+            elif old is None or new[0] < old[0]:
+                for row in new[1]:
+                    self._report_change(self.CHANGE_ADDED, row)
+                new = next(new_groups, None)
+            else:
+                self._compare_rows(list(old[1]), list(new[1]))
+                old = next(old_groups, None)
+                new = next(new_groups, None)
+
+    def _compare_rows(self, old_rows, new_rows):
+        """Compares the rows that have the same key."""
+        # Drop the rows that are in both.
+        new_counts = Counter(self._row_values(row) for row in new_rows)
+        old_counts = Counter(self._row_values(row) for row in old_rows)
+        old_rows = [row for row in old_rows if self._remove_count(new_counts, self._row_values(row))]
+        new_rows = [row for row in new_rows if self._remove_count(old_counts, self._row_values(row))]
+
+        for old_row, new_row in itertools.zip_longest(old_rows, new_rows):
+            if new_row is None:
+                self._report_change(self.CHANGE_REMOVED, old_row)
+            elif old_row is None:
+                self._report_change(self.CHANGE_ADDED, new_row)
+            else:
+                self._report_change(self.CHANGE_CHANGED, new_row, old_row=old_row)
+
+    def _remove_count(self, counts, values):
+        """Decrements the count for the values. Returns True if the values were not in the counts."""
+        if counts[values] > 0:
+            counts[values] -= 1
+            return False
+        return True
+
+    def _report_change(self, change, row, old_row=None):
+        self.counts[change] += 1
+        previous_values = None
+        if old_row is not None:
+            previous_values = '; '.join('{0}: {1}'.format(c, old_row[c])
+                                        for c in self._value_columns if old_row[c] != row[c])
+
+        print('  {0}: {1}'.format(change.capitalize(), ', '.join(
+            '{0}={1}'.format(c, row[c]) for c in self._key_columns + ['permission_level']
+            if c in row and row[c])))
+        if previous_values:
+            print('    Previous: {0}'.format(previous_values))
+
+        if self._csv_writer:
+            out_row = {'change': change, 'previous_values': previous_values}
+            out_row.update(row)
+            self._csv_writer.writerow(out_row)
+
+    def _start_csv(self):
+        if not self._out_path:
+            return
+        if self._out_path.lower().endswith('.csv'):
+            self._csv_full_path = self._out_path
+        else:
+            self._csv_full_path = os.path.join(self._out_path, 'diff-{0}.csv'.format(Utils.timestamp_str()))
+        Utils.ensure_dirs(os.path.dirname(self._csv_full_path))
+        self._csv_file = open(self._csv_full_path, mode='w', newline='', encoding='utf-8')
+        self._csv_writer = csv.DictWriter(self._csv_file,
+                                          delimiter=',',
+                                          quotechar='"',
+                                          fieldnames=['change'] + self._fieldnames + ['previous_values'],
+                                          quoting=csv.QUOTE_ALL)
+        self._csv_writer.writeheader()
+
+    def _show_error(self, msg):
+        self.errors.append(msg)
+        Utils.eprint(msg)
@@ -1,10 +1,8 @@
 from .entity_permissions_report import EntityPermissionsReport
+from ...core import Utils, ReportFilter
 
 
-def create(subparsers, parents):
-    parser = subparsers.add_parser('entity-permissions',
-                                   parents=parents,
-                                   help='Report the permissions of each user and team on a Synapse entity.')
+def create(parser):
     parser.add_argument('entities',
                         nargs='+',
                         help='The IDs and/or names of the entities to report on.')
@@ -18,6 +16,31 @@ def create(subparsers, parents):
                         default=False,
                         action='store_true',
                         help='Report permissions on every entity regardless of the parent permission.')
+    parser.add_argument('--permission-level',
+                        nargs='+',
+                        type=ReportFilter.parse_permission_level,
+                        default=None,
+                        help='Only report on these permission levels, e.g., ADMIN, CAN_EDIT_AND_DELETE, CAN_EDIT, CAN_DOWNLOAD, CAN_VIEW (or the names, e.g., "Can View").')
+    parser.add_argument('--principal',
+                        nargs='+',
+                        default=None,
+                        help='Only report on these users and teams (IDs, usernames, or team names). Users are also reported on through the teams they are a member of.')
+    parser.add_argument('--principal-type',
+                        nargs='+',
+                        choices=ReportFilter.PRINCIPAL_TYPES,
+                        default=None,
+                        help='Only report on these types of principals.')
+    parser.add_argument('--normalized', default=False,
+                        action='store_true',
+                        help='Write the ACL entries, principals, team members, and team invitations to separate CSVs keyed by ID (with "-acl_entries", "-principals", "-team_members", and "-team_invitations" added to the file name) instead of one row per entity, principal, and team member.')
+    parser.add_argument('--columns',
+                        nargs='+',
+                        default=None,
+                        help='Only include these columns, in this order. Data that is only needed for the other columns is not loaded. One or more of: {0}'.format(', '.join(EntityPermissionsReport.CSV_HEADERS)))
+    parser.add_argument('--from-snapshot', default=None,
+                        help='Path to a snapshot database created with the "snapshot" command to load the data from instead of Synapse.')
+    parser.add_argument('--shard', type=Utils.parse_shard, default=None,
+                        help='Only report on the entities in this shard of the entities, in the format INDEX/COUNT (e.g., 1/4). Entities are assigned to shards the same way on every host. Combine the outputs with the "merge-shards" command.')
     parser.set_defaults(_execute=execute)
 
 
@@ -26,5 +49,12 @@ def execute(args):
         args.entities,
         out_path=args.out_path,
         recursive=args.recursive,
-        report_on_all=args.all
+        report_on_all=args.all,
+        from_snapshot=args.from_snapshot,
+        shard=args.shard,
+        normalized=args.normalized,
+        permission_levels=args.permission_level,
+        principals=args.principal,
+        principal_types=args.principal_type,
+        columns=args.columns
     ).execute()
@@ -1,7 +1,7 @@
 import os
 import csv
 import synapseclient as syn
-from ...core import Utils
+from ...core import Utils, Snapshot, NormalizedWriter, ReportFilter, Profiler, RunMetrics
 from synapsis import Synapsis
 
 
@@ -10,16 +10,28 @@ class EntityPermissionsReport:
     This report will show the permissions of each user and team on an entity.
     """
 
-    def __init__(self, entity_ids_or_names, out_path=None, recursive=False, report_on_all=False):
+    def __init__(self, entity_ids_or_names, out_path=None, recursive=False, report_on_all=False,
+                 from_snapshot=None, shard=None, normalized=False, permission_levels=None, principals=None,
+                 principal_types=None, columns=None):
         self._entity_ids_or_names = entity_ids_or_names
         if self._entity_ids_or_names and not isinstance(self._entity_ids_or_names, list):
             self._entity_ids_or_names = [self._entity_ids_or_names]
         self._out_path = Utils.expand_path(out_path) if out_path else None
         self._recursive = recursive
         self._report_on_all = report_on_all
+        self._snapshot = Snapshot(from_snapshot) if from_snapshot else None
+        # Load the data from the snapshot if set otherwise from Synapse.
+        self._utils = self._snapshot or Utils
+        self._shard = shard
+        self._normalized = normalized
+        self._filter = ReportFilter(permission_levels=permission_levels,
+                                    principals=principals,
+                                    principal_types=principal_types)
+        self._columns = columns
         self._csv_full_path = None
         self._csv_file = None
         self._csv_writer = None
+        self._normalized_writer = None
         self.errors = []
 
     CSV_HEADERS = ['entity_type',
@@ -37,6 +49,15 @@ class EntityPermissionsReport:
                    'permission_level']
 
     def execute(self):
+        try:
+            self._columns = Utils.select_columns(self.CSV_HEADERS, self._columns)
+        except ValueError as ex:
+            self._show_error(str(ex))
+            return self
+        if self._normalized and self._columns != self.CSV_HEADERS:
+            self._show_error('Columns cannot be selected for normalized output.')
+            return self
+
         if self._out_path:
             if self._out_path.lower().endswith('.csv'):
                 self._csv_full_path = self._out_path
@@ -44,28 +65,68 @@ class EntityPermissionsReport:
                 self._csv_full_path = os.path.join(self._out_path,
                                                    'entity-permissions-{0}.csv'.format(Utils.timestamp_str()))
             Utils.ensure_dirs(os.path.dirname(self._csv_full_path))
-            self._csv_file = open(self._csv_full_path, mode='w', newline='', encoding='utf-8')
-            self._csv_writer = csv.DictWriter(self._csv_file,
-                                              delimiter=',',
-                                              quotechar='"',
-                                              fieldnames=self.CSV_HEADERS,
-                                              quoting=csv.QUOTE_ALL)
-            self._csv_writer.writeheader()
+            if self._normalized:
+                self._normalized_writer = NormalizedWriter(self._csv_full_path, include_emails=True)
+            else:
+                self._csv_file = open(self._csv_full_path, mode='w', newline='', encoding='utf-8')
+                self._csv_writer = csv.DictWriter(self._csv_file,
+                                                  delimiter=',',
+                                                  quotechar='"',
+                                                  fieldnames=self._columns,
+                                                  quoting=csv.QUOTE_ALL,
+                                                  extrasaction='ignore')
+                self._csv_writer.writeheader()
         try:
+            if not self._filter.resolve(self._utils, self._show_error):
+                return self
+
+            if self._shard:
+                self._select_shard()
+
             for id_or_name in self._entity_ids_or_names:
-                self._report_on_entity(id_or_name)
+                with Profiler.entity(id_or_name):
+                    self._report_on_entity(id_or_name)
+                RunMetrics.increment(RunMetrics.ENTITIES_PROCESSED)
         finally:
             if self._csv_file:
                 self._csv_file.close()
-            if self._csv_full_path:
+                RunMetrics.add_file(self._csv_full_path)
+            if self._snapshot:
+                self._snapshot.close()
+            if self._normalized_writer:
+                self._normalized_writer.close()
+                print('')
+                print('Report saved to:')
+                for path in self._normalized_writer.paths:
+                    print(path)
+            elif self._csv_full_path:
                 print('')
                 print('Report saved to: {0}'.format(self._csv_full_path))
         return self
 
+    def _select_shard(self):
+        """Only keeps the entities in the shard this report is running on."""
+        entity_ids = [self._get_entity_id(id_or_name) for id_or_name in self._entity_ids_or_names]
+        # Balance the shards by the number of benefactors in each entity if it is known.
+        size_func = self._snapshot.benefactors_count if self._snapshot else None
+        self._entity_ids_or_names = Utils.select_shard(entity_ids, self._shard, size_func=size_func)
+        print('Reporting on shard {0} of {1}: {2} of {3} entities.'.format(self._shard[0],
+                                                                          self._shard[1],
+                                                                          len(self._entity_ids_or_names),
+                                                                          len(entity_ids)))
+
+    def _get_entity_id(self, id_or_name):
+        """Gets the ID of an entity so the entity is in the same shard however it was specified."""
+        if Synapsis.is_synapse_id(id_or_name):
+            return id_or_name
+        # Errors are shown when the entity is reported on.
+        entity = self._utils.get_entity(id_or_name, lambda msg: None, only_header=True)
+        return entity['id'] if entity else id_or_name
+
     def _report_on_entity(self, id_or_name, root_benefactor_id=None):
         print('=' * 80)
         print('Looking up entity: "{0}"...'.format(id_or_name))
-        entity_header = Utils.get_entity(id_or_name, self._show_error, only_header=True)
+        entity_header = self._utils.get_entity(id_or_name, self._show_error, only_header=True)
 
         if entity_header:
             try:
@@ -77,39 +138,61 @@ class EntityPermissionsReport:
                 if not self._report_on_all and (root_benefactor_id is not None and root_benefactor_id == benefactor_id):
                     print('  Permissions inherited from root entity.')
                 else:
-                    # NOTE: Do not use syn._getACL() as it will raise an error if the entity inherits its ACL and
-                    # it is slower as it will make an API call to get the benefactorId.
-                    entity_acl = Synapsis.restGET('/entity/{0}/acl'.format(benefactor_id))
+                    with Profiler.phase(Profiler.ACL_FETCH):
+                        entity_acl = self._utils.WithCache.get_acl(benefactor_id)
+                    if entity_acl is None:
+                        raise Exception('Could not load the ACL for benefactor: {0}'.format(benefactor_id))
                     # Get the resource access items and sort them so they can be compared.
                     resource_accesses = sorted(entity_acl.get('resourceAccess', []), key=lambda r: r.get('principalId'))
 
                     for resource in resource_accesses:
-                        user_or_team = Utils.WithCache.get_user_or_team(resource.get('principalId'))
                         permission = Synapsis.Permissions.get(resource.get('accessType'))
-                        self._display_principal(entity_header, entity_type, permission, user_or_team)
+                        principal_id = resource.get('principalId')
+                        # Skip the principals that cannot match the filters before loading them.
+                        if not self._filter.includes_permission(permission) or \
+                                not self._filter.may_include_principal(principal_id):
+                            continue
+                        with Profiler.phase(Profiler.PRINCIPAL_RESOLUTION):
+                            user_or_team = self._utils.WithCache.get_user_or_team(principal_id)
 
+                        team_members = []
                         if isinstance(user_or_team, syn.Team):
-                            team_members = Utils.WithCache.get_team_members(user_or_team.id)
-                            for team_member in team_members:
-                                is_team_manager = team_member.get('isAdmin')
-                                member = team_member.get('member')
-                                user_id = member.get('ownerId')
-                                user = Utils.WithCache.get_user(user_id)
-                                self._display_principal(entity_header,
-                                                        entity_type,
-                                                        permission,
-                                                        user,
-                                                        from_team_id=user_or_team.id,
-                                                        from_team_name=user_or_team.name,
-                                                        from_team_user_is_manager=is_team_manager)
+                            with Profiler.phase(Profiler.TEAM_EXPANSION):
+                                team_members = self._filter.get_team_members(user_or_team.id, self._utils)
+
+                        is_included = self._filter.includes(self._get_principal_type(user_or_team), principal_id)
+                        if is_included:
+                            self._display_principal(entity_header, entity_type, permission, user_or_team)
+                        if self._normalized_writer and (is_included or team_members):
+                            self._add_normalized_rows(entity_header, entity_type, permission,
+                                                      principal_id, user_or_team, team_members)
+
+                        for team_member in team_members:
+                            is_team_manager = team_member.get('isAdmin')
+                            member = team_member.get('member')
+                            user_id = member.get('ownerId')
+                            # The emails are only in the user's profile. The normalized output loads the profiles
+                            # once per user for the principals table.
+                            if 'emails' in self._columns and not self._normalized_writer:
+                                with Profiler.phase(Profiler.PRINCIPAL_RESOLUTION):
+                                    user = self._utils.WithCache.get_user(user_id)
+                            else:
+                                user = syn.UserProfile(**member)
+                            self._display_principal(entity_header,
+                                                    entity_type,
+                                                    permission,
+                                                    user,
+                                                    from_team_id=user_or_team.id,
+                                                    from_team_name=user_or_team.name,
+                                                    from_team_user_is_manager=is_team_manager)
 
                 if self._recursive:
                     if root_benefactor_id is None:
                         root_benefactor_id = benefactor_id
 
                     if entity_type.is_project or entity_type.is_folder:
-                        for child in Synapsis.getChildren(entity_header['id'],
-                                                          includeTypes=['folder', 'file', 'table']):
+                        for child in self._utils.get_children(entity_header['id'],
+                                                              include_types=['folder', 'file', 'table']):
                             self._report_on_entity(child['id'], root_benefactor_id=root_benefactor_id)
 
             except Exception as ex:
@@ -117,6 +200,20 @@ class EntityPermissionsReport:
         else:
             self._show_error('Entity does not exist or you do not have access to the entity.')
 
+    @Profiler.timed(Profiler.OUTPUT)
+    def _add_normalized_rows(self, entity, entity_type, permission, principal_id, user_or_team, team_members):
+        self._normalized_writer.add_acl_entry(entity, entity_type, None, None, principal_id, permission)
+        # Only write each team's members the first time the team is on an ACL.
+        if self._normalized_writer.add_principal(principal_id, user_or_team) and isinstance(user_or_team, syn.Team):
+            self._normalized_writer.add_team(user_or_team, team_members, [], self._utils.WithCache.get_users)
+
+    @staticmethod
+    def _get_principal_type(user_or_team):
+        if isinstance(user_or_team, syn.Team):
+            return 'Team'
+        return 'Unknown' if user_or_team is None else 'User'
+
+    @Profiler.timed(Profiler.OUTPUT)
     def _display_principal(self, entity, entity_type, permission, user_or_team,
                            from_team_id=None, from_team_name=None, from_team_user_is_manager=None):
         indent = '  ' if from_team_id is None else '    '
@@ -164,6 +261,7 @@ class EntityPermissionsReport:
         print('{0}Permission: {1}'.format(indent, permission.name))
 
         if self._csv_writer:
+            RunMetrics.increment(RunMetrics.ROWS_WRITTEN)
             self._csv_writer.writerow({
                 'entity_type': entity_type.name,
                 'entity_id': entity['id'],
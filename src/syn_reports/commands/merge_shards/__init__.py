@@ -0,0 +1,2 @@
+from .cli import create, execute
+from .shard_merger import ShardMerger
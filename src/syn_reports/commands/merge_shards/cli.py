@@ -0,0 +1,28 @@
+from .shard_merger import ShardMerger
+
+
+def create(parser):
+    parser.add_argument('out_path',
+                        help='Path to export the merged report to. Specify a path that ends in ".csv" to export to a specific file otherwise a timestamped filename will be created in the out path.')
+    parser.add_argument('shards',
+                        nargs='+',
+                        help='The CSVs from each shard.')
+    parser.add_argument('-s', '--sort-columns',
+                        nargs='+',
+                        default=None,
+                        help='The columns to sort the merged report by. Defaults to the entity, project, and principal columns in the CSVs.')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='The max number of rows to sort in memory.')
+    parser.add_argument('--tmp-dir', default=None,
+                        help='The directory to write the sorted chunks to. Defaults to the system temp directory.')
+    parser.set_defaults(_execute=execute)
+
+
+def execute(args):
+    return ShardMerger(
+        args.out_path,
+        args.shards,
+        sort_columns=args.sort_columns,
+        chunk_size=args.chunk_size,
+        tmp_dir=args.tmp_dir
+    ).execute()
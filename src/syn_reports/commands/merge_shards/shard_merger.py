@@ -0,0 +1,85 @@
+import os
+import csv
+import itertools
+from contextlib import ExitStack
+from ..diff_report import DiffReport
+from ...core import Utils, ExternalSort
+
+
+class ShardMerger:
+    """
+    Merges the outputs of a report that was run in shards (with --shard) into one report sorted by the
+    entity and principal columns.
+
+    The rows are streamed through an external sort so the shards never need to fit in memory.
+    """
+
+    def __init__(self, out_path, shard_paths, sort_columns=None, chunk_size=None, tmp_dir=None):
+        self._out_path = Utils.expand_path(out_path)
+        self._shard_paths = [Utils.expand_path(p) for p in shard_paths]
+        self._sort_columns = sort_columns
+        self._chunk_size = chunk_size
+        self._tmp_dir = Utils.expand_path(tmp_dir) if tmp_dir else None
+        self._csv_full_path = None
+        self.rows_merged = 0
+        self.errors = []
+
+    def execute(self):
+        try:
+            with ExitStack() as stack:
+                fieldnames = None
+                readers = []
+                for shard_path in self._shard_paths:
+                    f = stack.enter_context(open(shard_path, mode='r', newline='', encoding='utf-8'))
+                    reader = csv.DictReader(f)
+                    if fieldnames is None:
+                        fieldnames = reader.fieldnames
+                    elif reader.fieldnames != fieldnames:
+                        self._show_error('Shard has different columns than the other shards: {0}'.format(shard_path))
+                        return self
+                    readers.append(reader)
+
+                if not fieldnames:
+                    self._show_error('Shards are empty.')
+                    return self
+
+                sort_columns = self._sort_columns or [c for c in DiffReport.KEY_COLUMNS if c in fieldnames]
+                missing_columns = [c for c in sort_columns if c not in fieldnames]
+                if missing_columns:
+                    self._show_error('Invalid sort columns: {0}. Must be columns in: {1}'.format(
+                        ', '.join(missing_columns), ', '.join(fieldnames)))
+                    return self
+
+                print('Merging {0} shards sorted by: {1}'.format(len(readers), ', '.join(sort_columns) or 'None'))
+                rows = itertools.chain.from_iterable(readers)
+                if sort_columns:
+                    rows = ExternalSort(fieldnames,
+                                        key=lambda r: tuple(r[c] for c in sort_columns),
+                                        chunk_size=self._chunk_size,
+                                        tmp_dir=self._tmp_dir).sort(rows)
+
+                if self._out_path.lower().endswith('.csv'):
+                    self._csv_full_path = self._out_path
+                else:
+                    self._csv_full_path = os.path.join(self._out_path,
+                                                       'merged-shards-{0}.csv'.format(Utils.timestamp_str()))
+                Utils.ensure_dirs(os.path.dirname(self._csv_full_path))
+                with open(self._csv_full_path, mode='w', newline='', encoding='utf-8') as csv_file:
+                    csv_writer = csv.DictWriter(csv_file,
+                                                delimiter=',',
+                                                quotechar='"',
+                                                fieldnames=fieldnames,
+                                                quoting=csv.QUOTE_ALL)
+                    csv_writer.writeheader()
+                    for row in rows:
+                        csv_writer.writerow(row)
+                        self.rows_merged += 1
+            print('Merged {0} rows.'.format(self.rows_merged))
+            print('Report saved to: {0}'.format(self._csv_full_path))
+        except Exception as ex:
+            self._show_error('ERROR: {0}'.format(ex))
+        return self
+
+    def _show_error(self, msg):
+        self.errors.append(msg)
+        Utils.eprint(msg)
@@ -0,0 +1,2 @@
+from .cli import create, execute
+from .job_runner import JobRunner
@@ -0,0 +1,19 @@
+from .job_runner import JobRunner
+
+
+def create(parser):
+    parser.add_argument('jobs_path',
+                        help='Path to a YAML (requires the pyyaml package) or JSON file with the list of jobs to run. Each job has a "command", the command\'s "args", and optionally an "out" path and a "name".')
+    parser.add_argument('--max-jobs', type=int, default=None,
+                        help='The max number of jobs to run at once. Defaults to 1.')
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='The max number of entities, ACLs, users, teams, etc. to keep in each cache while the jobs are run. Defaults to keeping all of them.')
+    parser.set_defaults(_execute=execute)
+
+
+def execute(args):
+    return JobRunner(
+        args.jobs_path,
+        max_jobs=args.max_jobs,
+        cache_size=args.cache_size
+    ).execute()
@@ -0,0 +1,140 @@
+import json
+import shlex
+from datetime import datetime
+from ..benefactor_permissions_report import BenefactorView
+from ...core import Utils
+
+
+class JobRunner:
+    """
+    Runs a batch of reports in one process so the reports share the login, the cached profiles, teams, and
+    team members (loaded once for the whole batch), and one temporary Project for the benefactor views.
+
+    The jobs file is a list of jobs (or a mapping with a "jobs" list), e.g.:
+
+        jobs:
+          - name: nightly-benefactors
+            command: benefactor-permissions
+            args: [syn123, syn456, --compress, gzip]
+            out: reports/benefactors.csv
+          - command: team-members
+            args: 3412345 --overlap
+            out: reports/
+
+    "args" are the command line args for the command (a list or a string), "out" is added as the
+    command's out path, and "name" defaults to the command and the job's number.
+    """
+    # Commands that cannot be run as a job.
+    EXCLUDED_COMMANDS = ['run-jobs', 'serve']
+
+    def __init__(self, jobs_path, max_jobs=None, cache_size=None):
+        """
+        Args:
+            jobs_path: The path of the jobs file.
+            max_jobs: The max number of jobs to run at once.
+            cache_size: The max number of entities, ACLs, users, teams, etc. to keep in each cache while the
+                jobs are run. Every result is kept if not set since the jobs share the caches.
+        """
+        self._jobs_path = Utils.expand_path(jobs_path)
+        self._max_jobs = max_jobs or 1
+        self._cache_size = cache_size
+        self.jobs_run = 0
+        self.jobs_failed = 0
+        self.errors = []
+
+    def execute(self):
+        jobs = self._load_jobs()
+        if not jobs:
+            return self
+
+        print('Running {0} jobs...'.format(len(jobs)))
+        with BenefactorView.share_view_project(), Utils.WithCache.cache_size(self._cache_size):
+            if self._max_jobs > 1:
+                results = Utils.thread_map(self._run_job, jobs, max_workers=self._max_jobs)
+            else:
+                results = map(self._run_job, jobs)
+            for name, errors in results:
+                self.jobs_run += 1
+                if errors:
+                    self.jobs_failed += 1
+                for error in errors:
+                    self.errors.append('{0}: {1}'.format(name, error))
+
+        print('=' * 80)
+        print('Ran {0} jobs, {1} with errors.'.format(self.jobs_run, self.jobs_failed))
+        return self
+
+    def _load_jobs(self):
+        """Loads the jobs file and parses the args of each job.
+        Nothing is run if any job is invalid.
+
+        Returns:
+            List of (name, parsed args) or None if the jobs file is invalid.
+        """
+        load = json.load if self._jobs_path.lower().endswith('.json') else self._yaml_loader()
+        try:
+            with open(self._jobs_path, mode='r', encoding='utf-8') as f:
+                data = load(f)
+        except Exception as ex:
+            self._show_error('Error loading jobs file: {0}, Error: {1}'.format(self._jobs_path, ex))
+            return None
+
+        if isinstance(data, dict):
+            data = data.get('jobs')
+        if not isinstance(data, list) or not data:
+            self._show_error('Jobs file must contain a list of jobs: {0}'.format(self._jobs_path))
+            return None
+
+        jobs = []
+        for number, job in enumerate(data, start=1):
+            parsed = self._parse_job(number, job)
+            if parsed is not None:
+                jobs.append(parsed)
+        return jobs if len(jobs) == len(data) else None
+
+    def _parse_job(self, number, job):
+        # Import here since the CLI imports the commands.
+        from ...cli import parse_command_args
+
+        if not isinstance(job, dict) or not job.get('command'):
+            self._show_error('Job {0} must have a "command".'.format(number))
+            return None
+
+        command = job['command']
+        name = str(job.get('name') or '{0} #{1}'.format(command, number))
+        job_args = job.get('args') or []
+        job_args = shlex.split(job_args) if isinstance(job_args, str) else [str(a) for a in job_args]
+        try:
+            if command in self.EXCLUDED_COMMANDS:
+                raise ValueError('Invalid command: {0}'.format(command))
+            return name, parse_command_args(command, job_args, out_path=job.get('out') and str(job['out']))
+        except ValueError as ex:
+            self._show_error('{0}: {1}'.format(name, ex))
+            return None
+
+    def _run_job(self, job):
+        name, args = job
+        print('=' * 80)
+        print('Starting job: {0}'.format(name))
+        start_time = datetime.now()
+        try:
+            errors = args._execute(args).errors
+        except Exception as ex:
+            errors = [str(ex)]
+            Utils.eprint('{0}: {1}'.format(name, ex))
+        print('Finished job: {0} {1}. Run time: {2}'.format(name,
+                                                           'with errors' if errors else 'successfully',
+                                                           datetime.now() - start_time))
+        return name, errors
+
+    @staticmethod
+    def _yaml_loader():
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError('YAML jobs files require the pyyaml package: pip install syn-reports[yaml]')
+        return yaml.safe_load
+
+    def _show_error(self, msg):
+        self.errors.append(msg)
+        Utils.eprint(msg)
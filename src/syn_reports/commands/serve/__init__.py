@@ -0,0 +1,2 @@
+from .cli import create, execute
+from .report_server import ReportServer, CsvTail
@@ -0,0 +1,26 @@
+from .report_server import ReportServer
+
+
+def create(parser):
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='The host to serve on. Defaults to 127.0.0.1.')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='The port to serve on. Defaults to 8765.')
+    parser.add_argument('--max-requests', type=int, default=None,
+                        help='The max number of reports to run at once. Other requests are rejected until one finishes. Defaults to 4.')
+    parser.add_argument('--refresh-interval', type=int, default=None,
+                        help='Clear the caches and load the recently used user profiles again in the background every this number of seconds.')
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='The max number of entities, ACLs, users, teams, etc. to keep in each cache. Defaults to {0}.'.format(
+                            ReportServer.DEFAULT_CACHE_SIZE))
+    parser.set_defaults(_execute=execute)
+
+
+def execute(args):
+    return ReportServer(
+        host=args.host,
+        port=args.port,
+        max_requests=args.max_requests,
+        refresh_interval=args.refresh_interval,
+        cache_size=args.cache_size
+    ).execute()
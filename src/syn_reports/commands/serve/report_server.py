@@ -0,0 +1,274 @@
+import os
+import io
+import csv
+import json
+import glob
+import time
+import shutil
+import codecs
+import tempfile
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from ..benefactor_permissions_report import BenefactorView
+from ...core import Utils
+
+
+class ReportServer:
+    """
+    Serves the reports over a local HTTP/JSON API so the login and the Utils.WithCache caches stay warm
+    between requests.
+
+    API:
+        GET /commands
+            The commands that can be run.
+        POST /reports/<command> {"args": ["syn123", "--out-file-per-entity"]}
+            Runs the command with the args (the same as the command line args) and streams the rows of its
+            CSV files as JSON lines while the report runs: {"file": "<csv name>", "row": {...}}.
+            The last line is: {"done": true, "errors": [...], "run_time": "<seconds>"}.
+
+    If refresh_interval is set the caches are cleared on the interval so they are never older than the interval,
+    and the most recently loaded user profiles (up to MAX_REFRESH_USER_PROFILES) are loaded again in the background
+    so they stay warm.
+    """
+    COMMANDS = ['benefactor-permissions',
+                'entity-permissions',
+                'user-project-access',
+                'user-teams',
+                'team-members',
+                'team-access']
+
+    DEFAULT_MAX_REQUESTS = 4
+
+    # The max number of results to keep in each cache. Large so requests do not evict each other's results.
+    DEFAULT_CACHE_SIZE = 100000
+
+    # The max number of user profiles to load again when the caches are refreshed (in batches of 100).
+    MAX_REFRESH_USER_PROFILES = 10000
+
+    # How often to check the report's CSV files for new rows.
+    POLL_SECONDS = 0.1
+
+    def __init__(self, host='127.0.0.1', port=8765, max_requests=None, refresh_interval=None, cache_size=None):
+        self._host = host
+        self._port = port
+        self._max_requests = max_requests or self.DEFAULT_MAX_REQUESTS
+        self._refresh_interval = refresh_interval
+        self._cache_size = cache_size or self.DEFAULT_CACHE_SIZE
+        self._request_slots = threading.BoundedSemaphore(self._max_requests)
+        self._stopped = threading.Event()
+        self._http_server = None
+        self.errors = []
+
+    def execute(self):
+        with BenefactorView.share_view_project(), Utils.WithCache.cache_size(self._cache_size):
+            self._http_server = ThreadingHTTPServer((self._host, self._port), self._handler_class())
+            self._http_server.daemon_threads = True
+            print('Serving reports on: http://{0}:{1}'.format(*self._http_server.server_address[:2]))
+            if self._refresh_interval:
+                threading.Thread(target=self._refresh_caches, daemon=True).start()
+            try:
+                self._http_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self._stopped.set()
+                self._http_server.server_close()
+        return self
+
+    def shutdown(self):
+        """Stops the server. Must be called from a different thread than execute."""
+        self._stopped.set()
+        if self._http_server:
+            self._http_server.shutdown()
+
+    @property
+    def server_address(self):
+        return self._http_server.server_address if self._http_server else None
+
+    def run_report(self, command, args, on_row=None):
+        """Runs a report in a temporary directory and passes each row to on_row as it is written.
+
+        Args:
+            command: The name of the command to run.
+            args: The list of command line args for the command.
+            on_row: Called with (CSV file name, row) for each row.
+
+        Returns:
+            List of errors.
+
+        Raises:
+            ValueError if the command or args are invalid.
+        """
+        # Import here since the CLI imports the commands.
+        from ...cli import parse_command_args
+
+        if command not in self.COMMANDS:
+            raise ValueError('Invalid command: {0}. Must be one of: {1}'.format(command, ', '.join(self.COMMANDS)))
+        out_dir = tempfile.mkdtemp(prefix='syn-reports-serve-')
+        try:
+            cmd_args = parse_command_args(command, args, out_path=out_dir)
+            if getattr(cmd_args, 'compress', None):
+                raise ValueError('--compress is not supported when serving reports.')
+
+            result = {'errors': []}
+
+            def _run():
+                try:
+                    result['errors'] = cmd_args._execute(cmd_args).errors
+                except Exception as ex:
+                    result['errors'] = [str(ex)]
+
+            thread = threading.Thread(target=_run, daemon=True)
+            thread.start()
+            tails = {}
+            while thread.is_alive():
+                thread.join(self.POLL_SECONDS)
+                self._read_rows(out_dir, tails, on_row)
+            self._read_rows(out_dir, tails, on_row)
+            return result['errors']
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    def _read_rows(self, out_dir, tails, on_row):
+        for path in sorted(glob.glob(os.path.join(out_dir, '**', '*.csv'), recursive=True)):
+            tail = tails.get(path)
+            if tail is None:
+                tail = tails[path] = CsvTail(path)
+            for row in tail.read_rows():
+                if on_row:
+                    on_row(os.path.relpath(path, out_dir), row)
+
+    def _refresh_caches(self):
+        while not self._stopped.wait(self._refresh_interval):
+            print('Refreshing caches...')
+            try:
+                count = Utils.WithCache.refresh_cache(max_user_profiles=self.MAX_REFRESH_USER_PROFILES)
+                print('Refreshed caches. Loaded {0} user profiles.'.format(count))
+            except Exception as ex:
+                Utils.eprint('Error refreshing caches: {0}'.format(ex))
+
+    def _handler_class(self):
+        server = self
+
+        class _RequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') == '/commands':
+                    self._send_json(200, {'commands': server.COMMANDS})
+                else:
+                    self._send_json(404, {'error': 'Not found: {0}'.format(self.path)})
+
+            def do_POST(self):
+                prefix = '/reports/'
+                if not self.path.startswith(prefix):
+                    self._send_json(404, {'error': 'Not found: {0}'.format(self.path)})
+                    return
+                command = self.path[len(prefix):].strip('/')
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                    args = body.get('args', [])
+                    if not isinstance(args, list):
+                        raise ValueError('"args" must be a list.')
+                    args = [str(a) for a in args]
+                except ValueError as ex:
+                    self._send_json(400, {'error': 'Invalid request: {0}'.format(ex)})
+                    return
+
+                if not server._request_slots.acquire(blocking=False):
+                    self._send_json(503, {'error': 'Too many requests. Try again later.'},
+                                    headers={'Retry-After': '1'})
+                    return
+                try:
+                    self._stream_report(command, args)
+                finally:
+                    server._request_slots.release()
+
+            def _stream_report(self, command, args):
+                start_time = time.monotonic()
+                headers_sent = False
+
+                def _write_line(data):
+                    nonlocal headers_sent
+                    if not headers_sent:
+                        self.send_response(200)
+                        self.send_header('Content-Type', 'application/x-ndjson')
+                        self.end_headers()
+                        headers_sent = True
+                    self.wfile.write(json.dumps(data).encode('utf-8') + b'\n')
+                    self.wfile.flush()
+
+                try:
+                    errors = server.run_report(command, args,
+                                               on_row=lambda name, row: _write_line({'file': name, 'row': row}))
+                except ValueError as ex:
+                    if headers_sent:
+                        raise
+                    self._send_json(400, {'error': str(ex)})
+                    return
+                _write_line({'done': True,
+                             'errors': errors,
+                             'run_time': '{0:.3f}'.format(time.monotonic() - start_time)})
+
+            def _send_json(self, status, data, headers=None):
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                print('{0} {1}'.format(datetime.now().isoformat(timespec='seconds'), format % args))
+
+        return _RequestHandler
+
+
+class CsvTail:
+    """
+    Reads the rows that have been added to a CSV file that is still being written.
+    Only complete rows are returned, a partially written row is returned once it is complete.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._offset = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._pending = ''
+        self._fieldnames = None
+
+    def read_rows(self):
+        """Reads the new rows.
+
+        Returns:
+            List of dicts.
+        """
+        with open(self.path, mode='rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        self._offset += len(data)
+        self._pending += self._decoder.decode(data)
+
+        # A row is complete at the end of a line if all its quotes are closed (quotes in values are doubled).
+        end = 0
+        pos = 0
+        quotes = 0
+        while True:
+            newline = self._pending.find('\n', pos)
+            if newline == -1:
+                break
+            quotes += self._pending.count('"', pos, newline + 1)
+            pos = newline + 1
+            if quotes % 2 == 0:
+                end = pos
+        block, self._pending = self._pending[:end], self._pending[end:]
+
+        rows = []
+        for values in csv.reader(io.StringIO(block, newline='')):
+            if self._fieldnames is None:
+                self._fieldnames = values
+            else:
+                rows.append(dict(zip(self._fieldnames, values)))
+        return rows
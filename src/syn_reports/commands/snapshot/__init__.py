@@ -0,0 +1,2 @@
+from .cli import create, execute
+from .snapshot_builder import SnapshotBuilder
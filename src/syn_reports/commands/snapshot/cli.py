@@ -0,0 +1,20 @@
+from .snapshot_builder import SnapshotBuilder
+
+
+def create(parser):
+    parser.add_argument('out_path',
+                        help='Path of the snapshot database file to create.')
+    parser.add_argument('entities',
+                        nargs='*',
+                        help='The IDs and/or names of the entities to snapshot. Will snapshot all Projects the user has access to if not set.')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='The max number of threads to load data with.')
+    parser.set_defaults(_execute=execute)
+
+
+def execute(args):
+    return SnapshotBuilder(
+        args.out_path,
+        entity_ids_or_names=args.entities,
+        max_workers=args.max_workers
+    ).execute()
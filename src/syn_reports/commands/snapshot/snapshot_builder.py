@@ -0,0 +1,113 @@
+import os
+from ..benefactor_permissions_report import BenefactorView
+from ...core import Utils, Snapshot
+
+
+class SnapshotBuilder:
+    """
+    Crawls the Projects, benefactors, ACLs, teams, team members, team invitations, and user profiles
+    once and saves them to a Snapshot so reports can be run from the Snapshot without calling Synapse.
+    """
+
+    def __init__(self, out_path, entity_ids_or_names=None, max_workers=None):
+        self._out_path = Utils.expand_path(out_path)
+        self._entity_ids_or_names = entity_ids_or_names if entity_ids_or_names is not None else []
+        if self._entity_ids_or_names and not isinstance(self._entity_ids_or_names, list):
+            self._entity_ids_or_names = [self._entity_ids_or_names]
+        self._max_workers = max_workers
+        self.errors = []
+
+    def execute(self):
+        # Build the snapshot in a temp file so an existing snapshot is only replaced by a complete snapshot.
+        tmp_path = '{0}.tmp'.format(self._out_path)
+        try:
+            with Snapshot(tmp_path, create=True) as snapshot:
+                snapshot.set_meta('created_at', Utils.timestamp_str())
+                self._build(snapshot)
+            os.replace(tmp_path, self._out_path)
+            print('Snapshot saved to: {0}'.format(self._out_path))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self
+
+    def _build(self, snapshot):
+        if not self._entity_ids_or_names:
+            user = Utils.WithCache.get_current_user()
+            print('Loading all Projects accessible to user: {0}'.format(user.userName))
+            self._entity_ids_or_names = [p['id'] for p in Utils.users_project_access(user.ownerId)]
+
+        print('Creating Temporary Project and Views...')
+        benefactor_ids = set()
+        with BenefactorView() as benefactor_view:
+            view_project = benefactor_view.ensure_view_project()
+            for benefactors in Utils.thread_map(lambda e: self._load_benefactors(e, view_project),
+                                                self._entity_ids_or_names,
+                                                max_workers=self._max_workers):
+                benefactor_ids.update(benefactors)
+
+        print('Loading ACLs for {0} benefactors...'.format(len(benefactor_ids)))
+        principal_ids = set()
+        user_ids = set()
+        for benefactor_id, bundle in Utils.thread_map(self._load_bundle, sorted(benefactor_ids),
+                                                      max_workers=self._max_workers):
+            if bundle is None:
+                self._show_error('Error loading ACL data for: {0}'.format(benefactor_id))
+                continue
+            snapshot.add_bundle(bundle)
+            if bundle['entity'].get('createdBy'):
+                user_ids.add(str(bundle['entity']['createdBy']))
+            for resource in (bundle.get('accessControlList') or {}).get('resourceAccess', []):
+                principal_ids.add(str(resource['principalId']))
+
+        print('Loading {0} users and teams...'.format(len(principal_ids)))
+        # NOTE: User and Team IDs do NOT overlap in Synapse.
+        principal_users = Utils.WithCache.get_users(principal_ids, max_workers=self._max_workers)
+        user_ids.update(principal_users.keys())
+        team_ids = sorted(principal_ids - set(principal_users.keys()))
+
+        for team, members, invitations in Utils.thread_map(self._load_team, team_ids, max_workers=self._max_workers):
+            if team is None:
+                continue
+            snapshot.add_team(team, members, invitations)
+            user_ids.update(str(m['member']['ownerId']) for m in members)
+            user_ids.update(str(i['inviteeId']) for i in invitations if i.get('inviteeId'))
+
+        print('Loading {0} user profiles...'.format(len(user_ids)))
+        for user in Utils.WithCache.get_users(user_ids, max_workers=self._max_workers).values():
+            snapshot.add_user(user)
+        snapshot.commit()
+
+    def _load_benefactors(self, id_or_name, view_project):
+        """Loads the unique benefactor IDs for an entity and all its child entities."""
+        try:
+            entity = Utils.get_entity(id_or_name, self._show_error)
+            if not entity:
+                self._show_error(
+                    'Entity does not exist or you do not have access to the entity: {0}'.format(id_or_name))
+                return []
+            print('Loading benefactors for: {0} ({1})'.format(entity['name'], entity['id']))
+            with BenefactorView(view_project=view_project) as benefactor_view:
+                benefactor_view.set_scope(entity)
+                return [item['benefactor_id'] for item in benefactor_view]
+        except Exception as ex:
+            self._show_error('ERROR: {0}'.format(ex))
+            return []
+
+    def _load_bundle(self, benefactor_id):
+        bundle = Utils.WithCache.get_bundle(benefactor_id,
+                                            include_entity=True,
+                                            include_entity_path=True,
+                                            include_access_control_list=True)
+        return benefactor_id, bundle
+
+    def _load_team(self, team_id):
+        team = Utils.WithCache.get_team(team_id)
+        if team is None:
+            # The principal is not a team or the user does not have access to it.
+            return None, [], []
+        return team, Utils.WithCache.get_team_members(team_id), Utils.WithCache.get_team_open_invitations(team_id)
+
+    def _show_error(self, msg):
+        self.errors.append(msg)
+        Utils.eprint(msg)
@@ -1,2 +1,3 @@
 from .cli import create, execute
 from .team_access_report import TeamAccessReport
+from .access_index import AccessIndex
@@ -0,0 +1,145 @@
+import os
+import json
+from datetime import datetime
+from ..benefactor_permissions_report import BenefactorView
+from ...core import Utils
+from synapsis import Synapsis
+
+
+class AccessIndex:
+    """
+    An inverted index of each principal (user or team) to the entities and permission levels it has been granted.
+
+    Synapse cannot look up the entities a principal has access to so the index is built from one scan of the
+    unique benefactors in each accessible Project (the same view technique the benefactor-permissions report uses)
+    and saved to disk so any number of principals can be looked up without scanning again.
+    """
+    DEFAULT_PATH = os.path.join('~', '.syn-reports', 'access-index.json')
+    VERSION = 1
+
+    def __init__(self, path=None):
+        self.path = Utils.expand_path(path or self.DEFAULT_PATH)
+        self.created_at = None
+        # The entities that were scanned or None if all the Projects accessible to the user were scanned.
+        self.scope = None
+        # Entity ID -> [entity type, entity name]
+        self.entities = {}
+        # Principal ID -> [[entity ID, permission level], ...]
+        self.principals = {}
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def load(self):
+        with open(self.path, mode='r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != self.VERSION:
+            raise Exception('Unsupported access index version: {0}. Rebuild the index.'.format(data.get('version')))
+        self.created_at = data['created_at']
+        self.scope = data.get('scope')
+        self.entities = data['entities']
+        self.principals = data['principals']
+        return self
+
+    def save(self):
+        Utils.ensure_dirs(os.path.dirname(self.path))
+        tmp_path = '{0}.tmp'.format(self.path)
+        with open(tmp_path, mode='w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.VERSION,
+                'created_at': self.created_at,
+                'scope': self.scope,
+                'entities': self.entities,
+                'principals': self.principals
+            }, f, separators=(',', ':'))
+        # Only replace the existing index once the new one is fully written.
+        os.replace(tmp_path, self.path)
+        return self
+
+    def build(self, entity_ids_or_names=None, show_error_func=None):
+        """Scans the benefactors of each entity and indexes the ACL of each benefactor by principal.
+
+        Args:
+            entity_ids_or_names: The entities to scan. Scans all Projects accessible to the user if not set.
+            show_error_func: Function to call with error messages.
+
+        Returns:
+            self
+        """
+        show_error_func = show_error_func or Utils.eprint
+        self.created_at = datetime.now().isoformat()
+        self.scope = list(entity_ids_or_names) if entity_ids_or_names else None
+        self.entities = {}
+        self.principals = {}
+
+        if not entity_ids_or_names:
+            user = Utils.WithCache.get_current_user()
+            print('Loading all Projects accessible to user: {0}'.format(user.userName))
+            entity_ids_or_names = [p['id'] for p in Utils.users_project_access(user.ownerId)]
+
+        print('Creating Temporary Project and Views...')
+        with BenefactorView() as benefactor_view:
+            for index, id_or_name in enumerate(entity_ids_or_names, start=1):
+                try:
+                    entity = Utils.get_entity(id_or_name, show_error_func)
+                    if not entity:
+                        show_error_func(
+                            'Entity does not exist or you do not have access to the entity: {0}'.format(id_or_name))
+                        continue
+                    print('Indexing: {0} ({1}) [{2} of {3}]'.format(entity['name'], entity['id'], index,
+                                                                    len(entity_ids_or_names)))
+                    benefactor_view.set_scope(entity)
+                    for item in benefactor_view:
+                        self._add_benefactor(item['benefactor_id'], show_error_func)
+                except Exception as ex:
+                    show_error_func('ERROR: {0}'.format(ex))
+        return self
+
+    def _add_benefactor(self, benefactor_id, show_error_func):
+        bundle = Utils.WithCache.get_bundle(benefactor_id, include_entity=True, include_access_control_list=True)
+        if bundle is None:
+            show_error_func('Error loading ACL data for: {0}'.format(benefactor_id))
+            return
+
+        entity = bundle['entity']
+        entity_id = entity['id']
+        if entity_id in self.entities:
+            return
+        self.entities[entity_id] = [Synapsis.ConcreteTypes.get(entity).name, entity['name']]
+
+        entity_acl = bundle.get('accessControlList') or {}
+        for resource in entity_acl.get('resourceAccess', []):
+            permission = Synapsis.Permissions.get(resource.get('accessType'))
+            principal_id = str(resource.get('principalId'))
+            self.principals.setdefault(principal_id, []).append([entity_id, permission.name])
+
+    def has_scope(self, entity_ids_or_names):
+        """Gets if the index was built for the entities.
+
+        Args:
+            entity_ids_or_names: The entities or None for all the Projects accessible to the user.
+        """
+        return sorted(self.scope or []) == sorted(entity_ids_or_names or [])
+
+    def scope_str(self):
+        return ', '.join(self.scope) if self.scope else 'All accessible Projects'
+
+    def get(self, principal_id):
+        """Gets the entities a principal has been granted access to.
+
+        Args:
+            principal_id: The ID of the user or team.
+
+        Returns:
+            List of dicts with the entity_id, entity_type, entity_name, and permission_level.
+        """
+        results = []
+        for entity_id, permission_level in self.principals.get(str(principal_id), []):
+            entity_type, entity_name = self.entities[entity_id]
+            results.append({
+                'entity_id': entity_id,
+                'entity_type': entity_type,
+                'entity_name': entity_name,
+                'permission_level': permission_level
+            })
+        return results
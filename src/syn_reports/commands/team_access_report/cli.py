@@ -1,20 +1,33 @@
 from .team_access_report import TeamAccessReport
 
 
-def create(subparsers, parents):
-    parser = subparsers.add_parser('team-access',
-                                   parents=parents,
-                                   help='Report the entities a team has access to.')
+def create(parser):
     parser.add_argument('teams',
                         nargs='+',
                         help='The IDs and/or names of the teams to report on.')
     parser.add_argument('-o', '--out-path', default=None,
                         help='Path to export the report to. Specify a path that ends in ".csv" to export to a specific file otherwise a timestamped filename will be created in the out path.')
+    parser.add_argument('--index-path', default=None,
+                        help='Path to the access index file. Defaults to "~/.syn-reports/access-index.json". The index is built if it does not exist.')
+    parser.add_argument('--rebuild-index', default=False,
+                        action='store_true',
+                        help='Rebuild the access index before reporting.')
+    parser.add_argument('--index-scope',
+                        nargs='*',
+                        help='The IDs and/or names of the entities to scan when building the access index. Will scan all Projects the user has access to if not set. The index is rebuilt if it was built for a different scope.')
+    parser.add_argument('--columns',
+                        nargs='+',
+                        default=None,
+                        help='Only include these columns, in this order. Data that is only needed for the other columns is not loaded. One or more of: {0}'.format(', '.join(TeamAccessReport.CSV_HEADERS)))
     parser.set_defaults(_execute=execute)
 
 
 def execute(args):
     return TeamAccessReport(
         args.teams,
-        out_path=args.out_path
+        out_path=args.out_path,
+        index_path=args.index_path,
+        rebuild_index=args.rebuild_index,
+        index_scope=args.index_scope,
+        columns=args.columns
     ).execute()
@@ -1,19 +1,29 @@
 import os
 import csv
-from ...core import Utils
+from .access_index import AccessIndex
+from ...core import Utils, RunMetrics
 from synapsis import Synapsis
 
 
 class TeamAccessReport:
     """
-    This report shows all the users on a team.
+    This report shows all the entities a team has access to.
+    NOTE: Only entities in projects the user executing this script has access to will be reported.
+          The entities are looked up in an AccessIndex which is built the first time the report is run.
     """
 
-    def __init__(self, team_ids_or_names, out_path=None):
+    def __init__(self, team_ids_or_names, out_path=None, index_path=None, rebuild_index=False, index_scope=None,
+                 columns=None):
         self._team_ids_or_names = team_ids_or_names
         if self._team_ids_or_names and not isinstance(self._team_ids_or_names, list):
             self._team_ids_or_names = [self._team_ids_or_names]
         self._out_path = Utils.expand_path(out_path) if out_path else None
+        self._access_index = AccessIndex(index_path)
+        self._rebuild_index = rebuild_index
+        self._index_scope = index_scope
+        if self._index_scope and not isinstance(self._index_scope, list):
+            self._index_scope = [self._index_scope]
+        self._columns = columns
         self._csv_full_path = None
         self._csv_file = None
         self._csv_writer = None
@@ -27,7 +37,26 @@ class TeamAccessReport:
                    'permission_level']
 
     def execute(self):
-        raise NotImplementedError('This command has not been completed.')
+        try:
+            self._columns = Utils.select_columns(self.CSV_HEADERS, self._columns)
+        except ValueError as ex:
+            self._show_error(str(ex))
+            return self
+
+        rebuild_index = self._rebuild_index or not self._access_index.exists()
+        if not rebuild_index:
+            self._access_index.load()
+            # The index is only rebuilt for a different scope if one is set, otherwise the existing index is used.
+            if self._index_scope and not self._access_index.has_scope(self._index_scope):
+                print('Access index was built for: {0}. Rebuilding for: {1}'.format(
+                    self._access_index.scope_str(), ', '.join(self._index_scope)))
+                rebuild_index = True
+        if rebuild_index:
+            print('Building access index: {0}'.format(self._access_index.path))
+            self._access_index.build(self._index_scope, show_error_func=self._show_error).save()
+        print('Using access index: {0} (Created: {1}, Scope: {2})'.format(self._access_index.path,
+                                                                         self._access_index.created_at,
+                                                                         self._access_index.scope_str()))
 
         if self._out_path:
             if self._out_path.lower().endswith('.csv'):
@@ -39,15 +68,18 @@ class TeamAccessReport:
             self._csv_writer = csv.DictWriter(self._csv_file,
                                               delimiter=',',
                                               quotechar='"',
-                                              fieldnames=self.CSV_HEADERS,
-                                              quoting=csv.QUOTE_ALL)
+                                              fieldnames=self._columns,
+                                              quoting=csv.QUOTE_ALL,
+                                              extrasaction='ignore')
             self._csv_writer.writeheader()
         try:
             for id_or_name in self._team_ids_or_names:
                 self._report_on_team(id_or_name)
+                RunMetrics.increment(RunMetrics.ENTITIES_PROCESSED)
         finally:
             if self._csv_file:
                 self._csv_file.close()
+                RunMetrics.add_file(self._csv_full_path)
             if self._csv_full_path:
                 print('Report saved to: {0}'.format(self._csv_full_path))
         return self
@@ -55,6 +87,7 @@ class TeamAccessReport:
     def _report_on_team(self, id_or_name):
         print('=' * 80)
         print('Looking up team: "{0}"...'.format(id_or_name))
+        team = None
         try:
             team = Synapsis.getTeam(id_or_name)
         except ValueError:
@@ -67,9 +100,22 @@ class TeamAccessReport:
             try:
                 team_id = team['id']
                 team_name = team['name']
-                print('Team: {0} ({1})'.format(team_name, team_id))
-                # TODO: How do we get the entities this team has access to?
-                raise NotImplementedError()
+                entities = self._access_index.get(team_id)
+                print('Team: {0} ({1}) has access to {2} entities.'.format(team_name, team_id, len(entities)))
+                for item in entities:
+                    print('  ---')
+                    print('  {0}: {1} ({2})'.format(item['entity_type'], item['entity_name'], item['entity_id']))
+                    print('  Permission: {0}'.format(item['permission_level']))
+                    if self._csv_writer:
+                        RunMetrics.increment(RunMetrics.ROWS_WRITTEN)
+                        self._csv_writer.writerow({
+                            'team_id': team_id,
+                            'team_name': team_name,
+                            'entity_type': item['entity_type'],
+                            'entity_id': item['entity_id'],
+                            'entity_name': item['entity_name'],
+                            'permission_level': item['permission_level']
+                        })
             except Exception as ex:
                 self._show_error('Error loading team data: {0}'.format(ex))
         else:
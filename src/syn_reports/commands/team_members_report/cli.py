@@ -1,20 +1,30 @@
 from .team_members_report import TeamMembersReport
 
 
-def create(subparsers, parents):
-    parser = subparsers.add_parser('team-members',
-                                   parents=parents,
-                                   help='Report the members on a team.')
+def create(parser):
     parser.add_argument('teams',
                         nargs='+',
                         help='The IDs and/or names of the teams to report on.')
     parser.add_argument('-o', '--out-path', default=None,
                         help='Path to export the report to. Specify a path that ends in ".csv" to export to a specific file otherwise a timestamped filename will be created in the out path.')
+    parser.add_argument('--overlap',
+                        default=False,
+                        action='store_true',
+                        help='Report the number of members each pair of teams have in common and the number of teams each user is on. Saved to "-overlap.csv" and "-user-team-counts.csv" files next to the report.')
+    parser.add_argument('--columns',
+                        nargs='+',
+                        default=None,
+                        help='Only include these columns, in this order. Data that is only needed for the other columns is not loaded. One or more of: {0}'.format(', '.join(TeamMembersReport.CSV_HEADERS)))
+    parser.add_argument('--from-snapshot', default=None,
+                        help='Path to a snapshot database created with the "snapshot" command to load the data from instead of Synapse.')
     parser.set_defaults(_execute=execute)
 
 
 def execute(args):
     return TeamMembersReport(
         args.teams,
-        out_path=args.out_path
+        out_path=args.out_path,
+        overlap=args.overlap,
+        from_snapshot=args.from_snapshot,
+        columns=args.columns
     ).execute()
@@ -1,6 +1,7 @@
 import os
 import csv
-from ...core import Utils
+import itertools
+from ...core import Utils, Snapshot, RunMetrics
 from synapsis import Synapsis
 
 
@@ -9,11 +10,22 @@ class TeamMembersReport:
     This report shows all the users on a team.
     """
 
-    def __init__(self, team_ids_or_names, out_path=None):
+    def __init__(self, team_ids_or_names, out_path=None, overlap=False, from_snapshot=None, columns=None):
         self._team_ids_or_names = team_ids_or_names
         if self._team_ids_or_names and not isinstance(self._team_ids_or_names, list):
             self._team_ids_or_names = [self._team_ids_or_names]
         self._out_path = Utils.expand_path(out_path) if out_path else None
+        self._overlap = overlap
+        self._snapshot = Snapshot(from_snapshot) if from_snapshot else None
+        # Load the data from the snapshot if set otherwise from Synapse.
+        self._utils = self._snapshot or Utils
+        self._columns = columns
+        # The teams reported on, the set of member IDs for each team, and the username and team IDs of each member.
+        # Only populated when reporting the overlap.
+        self._teams = []
+        self._team_member_ids = {}
+        self._member_usernames = {}
+        self._member_team_ids = {}
         self._csv_full_path = None
         self._csv_file = None
         self._csv_writer = None
@@ -28,7 +40,18 @@ class TeamMembersReport:
                    'company',
                    'is_admin']
 
+    OVERLAP_USER_CSV_HEADERS = ['user_id',
+                                'username',
+                                'team_count',
+                                'team_ids']
+
     def execute(self):
+        try:
+            self._columns = Utils.select_columns(self.CSV_HEADERS, self._columns)
+        except ValueError as ex:
+            self._show_error(str(ex))
+            return self
+
         if self._out_path:
             if self._out_path.lower().endswith('.csv'):
                 self._csv_full_path = self._out_path
@@ -39,15 +62,22 @@ class TeamMembersReport:
             self._csv_writer = csv.DictWriter(self._csv_file,
                                               delimiter=',',
                                               quotechar='"',
-                                              fieldnames=self.CSV_HEADERS,
-                                              quoting=csv.QUOTE_ALL)
+                                              fieldnames=self._columns,
+                                              quoting=csv.QUOTE_ALL,
+                                              extrasaction='ignore')
             self._csv_writer.writeheader()
         try:
             for id_or_name in self._team_ids_or_names:
                 self._report_on_team(id_or_name)
+                RunMetrics.increment(RunMetrics.ENTITIES_PROCESSED)
+            if self._overlap:
+                self._report_overlap()
         finally:
             if self._csv_file:
                 self._csv_file.close()
+                RunMetrics.add_file(self._csv_full_path)
+            if self._snapshot:
+                self._snapshot.close()
             if self._csv_full_path:
                 print('Report saved to: {0}'.format(self._csv_full_path))
         return self
@@ -57,7 +87,8 @@ class TeamMembersReport:
         print('Looking up team: "{0}"...'.format(id_or_name))
         team = None
         try:
-            team = Synapsis.getTeam(id_or_name)
+            # Load the team from Synapse directly so errors are reported instead of the team not being found.
+            team = self._snapshot.get_team(id_or_name) if self._snapshot else Synapsis.getTeam(id_or_name)
         except ValueError:
             # Team does not exist.
             pass
@@ -66,12 +97,25 @@ class TeamMembersReport:
 
         if team:
             try:
-                members = list(Synapsis.getTeamMembers(team))
+                if self._snapshot:
+                    members = self._snapshot.get_team_members(team.id)
+                else:
+                    members = list(Synapsis.getTeamMembers(team))
                 print('Found team: {0} ({1}) with {2} members.'.format(team.name, team.id, len(members)))
+                if self._overlap and team.id not in self._team_member_ids:
+                    self._add_overlap_team(team, members)
+                # Load the member profiles in batches. Users on multiple teams are only loaded once.
+                # The profiles are only needed for the company, the other columns are in the member header.
+                if 'company' in self._columns:
+                    users = self._utils.WithCache.get_users([record.get('member').get('ownerId')
+                                                             for record in members])
+                else:
+                    users = {}
                 for record in members:
                     print('  ---')
                     member = record.get('member')
-                    user = Utils.WithCache.get_user(member.get('ownerId'))
+                    # Fall back to the member header if the profile cannot be loaded.
+                    user = users.get(str(member.get('ownerId'))) or member
 
                     user_id = user.get('ownerId')
                     username = user.get('userName', None)
@@ -91,6 +135,7 @@ class TeamMembersReport:
                     print('  Is Admin: {0}'.format('Yes' if is_admin else 'No'))
 
                     if self._csv_writer:
+                        RunMetrics.increment(RunMetrics.ROWS_WRITTEN)
                         self._csv_writer.writerow({'team_id': team.id,
                                                    'team_name': team.name,
                                                    'user_id': user_id,
@@ -104,6 +149,62 @@ class TeamMembersReport:
         else:
             self._show_error('Team does not exist or you do not have access to the team.')
 
+    def _add_overlap_team(self, team, members):
+        self._teams.append(team)
+        member_ids = set()
+        for record in members:
+            member = record.get('member')
+            user_id = int(member.get('ownerId'))
+            member_ids.add(user_id)
+            # The username is in the member header so the profiles do not need to be loaded.
+            self._member_usernames[user_id] = member.get('userName', None)
+            self._member_team_ids.setdefault(user_id, []).append(team.id)
+        self._team_member_ids[team.id] = frozenset(member_ids)
+
+    def _report_overlap(self):
+        """Reports the number of members each pair of teams have in common and the number of teams each user is on.
+        """
+        print('=' * 80)
+        print('Team Overlap:')
+        for team_a, team_b in itertools.combinations(self._teams, 2):
+            count = len(self._team_member_ids[team_a.id] & self._team_member_ids[team_b.id])
+            if count:
+                print('  {0} ({1}) and {2} ({3}): {4} shared members.'.format(
+                    team_a.name, team_a.id, team_b.name, team_b.id, count))
+
+        multi_team_user_count = len([t for t in self._member_team_ids.values() if len(t) > 1])
+        print('  {0} users are on more than one team.'.format(multi_team_user_count))
+
+        if not self._csv_full_path:
+            return
+
+        matrix_csv_path = self._csv_full_path[:-len('.csv')] + '-overlap.csv'
+        with open(matrix_csv_path, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
+            writer.writerow(['team_id', 'team_name'] + [team.id for team in self._teams])
+            for team_a in self._teams:
+                writer.writerow([team_a.id, team_a.name] +
+                                [len(self._team_member_ids[team_a.id] & self._team_member_ids[team_b.id])
+                                 for team_b in self._teams])
+        print('Overlap saved to: {0}'.format(matrix_csv_path))
+
+        users_csv_path = self._csv_full_path[:-len('.csv')] + '-user-team-counts.csv'
+        with open(users_csv_path, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f,
+                                    delimiter=',',
+                                    quotechar='"',
+                                    fieldnames=self.OVERLAP_USER_CSV_HEADERS,
+                                    quoting=csv.QUOTE_ALL)
+            writer.writeheader()
+            for user_id, team_ids in sorted(self._member_team_ids.items(), key=lambda u: -len(u[1])):
+                writer.writerow({
+                    'user_id': user_id,
+                    'username': self._member_usernames.get(user_id),
+                    'team_count': len(team_ids),
+                    'team_ids': ','.join(team_ids)
+                })
+        print('User team counts saved to: {0}'.format(users_csv_path))
+
     def _show_error(self, msg):
         self.errors.append(msg)
         Utils.eprint(msg)
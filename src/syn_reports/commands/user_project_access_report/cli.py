@@ -1,10 +1,7 @@
 from .user_project_access_report import UserProjectAccessReport
 
 
-def create(subparsers, parents):
-    parser = subparsers.add_parser('user-project-access',
-                                   parents=parents,
-                                   help='Report the projects a user has access to. NOTE: Only public projects or projects the user executing this script has access to will be reported.')
+def create(parser):
     parser.add_argument('users',
                         nargs='+',
                         help='The IDs and/or usernames of the users to report on.')
@@ -15,6 +12,12 @@ def create(subparsers, parents):
                         )
     parser.add_argument('-o', '--out-path', default=None,
                         help='Path to export the report to. Specify a path that ends in ".csv" to export to a specific file otherwise a timestamped filename will be created in the out-path.')
+    parser.add_argument('--columns',
+                        nargs='+',
+                        default=None,
+                        help='Only include these columns, in this order. Data that is only needed for the other columns is not loaded. One or more of: {0}'.format(', '.join(UserProjectAccessReport.CSV_HEADERS)))
+    parser.add_argument('--from-snapshot', default=None,
+                        help='Path to a snapshot database created with the "snapshot" command to load the data from instead of Synapse.')
     parser.set_defaults(_execute=execute)
 
 
@@ -22,5 +25,7 @@ def execute(args):
     return UserProjectAccessReport(
         args.users,
         only_created_by=args.only_created_by,
-        out_path=args.out_path
+        out_path=args.out_path,
+        from_snapshot=args.from_snapshot,
+        columns=args.columns
     ).execute()
@@ -2,7 +2,7 @@ import functools
 import os
 import csv
 import synapseclient as syn
-from ...core import Utils
+from ...core import Utils, Snapshot, RunMetrics
 from synapsis import Synapsis
 
 
@@ -13,12 +13,17 @@ class UserProjectAccessReport:
           This is a Synapse limitation.
     """
 
-    def __init__(self, user_ids_or_usernames, only_created_by=False, out_path=None):
+    def __init__(self, user_ids_or_usernames, only_created_by=False, out_path=None, from_snapshot=None,
+                 columns=None):
         self._user_ids_or_usernames = user_ids_or_usernames
         if self._user_ids_or_usernames and not isinstance(self._user_ids_or_usernames, list):
             self._user_ids_or_usernames = [self._user_ids_or_usernames]
         self.only_created_by = only_created_by
         self._out_path = Utils.expand_path(out_path) if out_path else None
+        self._snapshot = Snapshot(from_snapshot) if from_snapshot else None
+        # Load the data from the snapshot if set otherwise from Synapse.
+        self._utils = self._snapshot or Utils
+        self._columns = columns
         self._csv_full_path = None
         self._csv_file = None
         self._csv_writer = None
@@ -36,6 +41,16 @@ class UserProjectAccessReport:
                    ]
 
     def execute(self):
+        try:
+            self._columns = Utils.select_columns(self.CSV_HEADERS, self._columns)
+        except ValueError as ex:
+            self._show_error(str(ex))
+            return self
+
+        # The project is only loaded if its creator is needed.
+        load_project = self.only_created_by or \
+            'project_created_by' in self._columns or 'project_created_by_id' in self._columns
+
         if self._out_path:
             if self._out_path.lower().endswith('.csv'):
                 self._csv_full_path = self._out_path
@@ -47,16 +62,18 @@ class UserProjectAccessReport:
             self._csv_writer = csv.DictWriter(self._csv_file,
                                               delimiter=',',
                                               quotechar='"',
-                                              fieldnames=self.CSV_HEADERS,
-                                              quoting=csv.QUOTE_ALL)
+                                              fieldnames=self._columns,
+                                              quoting=csv.QUOTE_ALL,
+                                              extrasaction='ignore')
             self._csv_writer.writeheader()
         try:
             for id_or_name in self._user_ids_or_usernames:
+                RunMetrics.increment(RunMetrics.ENTITIES_PROCESSED)
                 print('=' * 80)
                 print('Looking up user: "{0}"...'.format(id_or_name))
 
                 try:
-                    user = Utils.WithCache.get_user(id_or_name)
+                    user = self._utils.WithCache.get_user(id_or_name)
                 except ValueError:
                     # User does not exist
                     user = None
@@ -72,24 +89,34 @@ class UserProjectAccessReport:
                     if last_name:
                         print('  Last Name: {0}'.format(last_name))
 
-                    for activity in Utils.users_project_access(user_id):
+                    for activity in self._utils.users_project_access(user_id):
                         project_id = activity['id']
-                        project = Synapsis.get(project_id)
-                        created_by_id = project.createdBy
-                        created_by = Utils.WithCache.get_user(created_by_id)
-                        created_by_username = created_by.userName
+                        created_by_id = None
+                        created_by_username = None
+                        if load_project:
+                            project = self._utils.get_entity(project_id, self._show_error)
+                            if project is None:
+                                self._show_error('Could not load project: {0}'.format(project_id))
+                                continue
+                            created_by_id = project['createdBy']
+                            if 'project_created_by' in self._columns:
+                                created_by = self._utils.WithCache.get_user(created_by_id)
+                                created_by_username = created_by.userName
 
                         if not self.only_created_by or (self.only_created_by and user_id == created_by_id):
                             project_name = activity['name']
-                            user_permission = self._get_permission(project_id, principal_id=user_id)
+                            user_permission = None
+                            if 'permission_level' in self._columns:
+                                user_permission = self._get_permission(project_id, principal_id=user_id)
 
                             print('    Project: {0} (ID: {1}, Permission: {2}, Created By: {3})'.format(
                                 project_name,
                                 project_id,
-                                user_permission.name,
+                                user_permission.name if user_permission else None,
                                 created_by_username))
 
                             if self._csv_writer:
+                                RunMetrics.increment(RunMetrics.ROWS_WRITTEN)
                                 self._csv_writer.writerow({
                                     'user_id': user_id,
                                     'username': username,
@@ -97,7 +124,7 @@ class UserProjectAccessReport:
                                     'last_name': last_name,
                                     'project_id': project_id,
                                     'project_name': project_name,
-                                    'permission_level': user_permission.name,
+                                    'permission_level': user_permission.name if user_permission else None,
                                     'project_created_by': created_by_username,
                                     'project_created_by_id': created_by_id
                                 })
@@ -106,6 +133,9 @@ class UserProjectAccessReport:
         finally:
             if self._csv_file:
                 self._csv_file.close()
+                RunMetrics.add_file(self._csv_full_path)
+            if self._snapshot:
+                self._snapshot.close()
             if self._csv_full_path:
                 print('')
                 print('Report saved to: {0}'.format(self._csv_full_path))
@@ -120,9 +150,9 @@ class UserProjectAccessReport:
         :returns: Synapsis.Permission or Synapsis.Permissions.NO_PERMISSION
         """
         # TODO: make this method return the highest permission the user has.
-        principal_id = Synapsis._getUserbyPrincipalIdOrName(principal_id)
-        acl = Synapsis._getACL(entity)
-        resource_access = acl['resourceAccess']
+        principal_id = int(principal_id)
+        acl = self._utils.WithCache.get_acl(Synapsis.id_of(entity))
+        resource_access = acl['resourceAccess'] if acl else []
 
         # Look for the principal's individual permission on the entity.
         for resource in resource_access:
@@ -149,9 +179,12 @@ class UserProjectAccessReport:
             List
         """
         try:
-            return list(Utils.users_teams(user_id))
+            return list(self._utils.users_teams(user_id))
         except syn.core.exceptions.SynapseHTTPError:
             return []
+        except ValueError as ex:
+            self._show_error('Error loading teams, Error: {0}'.format(ex))
+            return []
 
     def _show_error(self, msg):
         self.errors.append(msg)
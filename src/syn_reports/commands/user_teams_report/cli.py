@@ -1,10 +1,7 @@
 from .user_teams_report import UserTeamsReport
 
 
-def create(subparsers, parents):
-    parser = subparsers.add_parser('user-teams',
-                                   parents=parents,
-                                   help='Report the teams a user is a member of.')
+def create(parser):
     parser.add_argument('users',
                         nargs='+',
                         help='The IDs and/or usernames of the users to report on.')
@@ -14,6 +11,16 @@ def create(subparsers, parents):
                         help='Only report teams that also have this user in the team.',
                         action='append',
                         nargs='?')
+    parser.add_argument('--mode',
+                        default=UserTeamsReport.MODE_AUTO,
+                        choices=UserTeamsReport.MODES,
+                        help='How to load the teams. "per-user" loads the teams for each user, "team-major" loads the members of each team once and is faster for large lists of users (only with --has-member). Defaults to "auto" which picks the mode with the fewest API calls.')
+    parser.add_argument('--columns',
+                        nargs='+',
+                        default=None,
+                        help='Only include these columns, in this order. Data that is only needed for the other columns is not loaded. One or more of: {0}'.format(', '.join(UserTeamsReport.CSV_HEADERS)))
+    parser.add_argument('--from-snapshot', default=None,
+                        help='Path to a snapshot database created with the "snapshot" command to load the data from instead of Synapse.')
     parser.set_defaults(_execute=execute)
 
 
@@ -21,5 +28,8 @@ def execute(args):
     return UserTeamsReport(
         args.users,
         required_member_ids_or_usernames=args.has_member,
-        out_path=args.out_path
+        out_path=args.out_path,
+        mode=args.mode,
+        from_snapshot=args.from_snapshot,
+        columns=args.columns
     ).execute()
@@ -1,6 +1,7 @@
 import os
 import csv
-from ...core import Utils
+import math
+from ...core import Utils, Snapshot, RunMetrics
 from synapsis import Synapsis
 
 
@@ -9,7 +10,18 @@ class UserTeamsReport:
     This report shows all the teams a user is a member of.
     """
 
-    def __init__(self, user_ids_or_usernames, required_member_ids_or_usernames=None, out_path=None):
+    MODE_AUTO = 'auto'
+    MODE_PER_USER = 'per-user'
+    MODE_TEAM_MAJOR = 'team-major'
+    MODES = [MODE_AUTO, MODE_PER_USER, MODE_TEAM_MAJOR]
+
+    # Estimates used to pick the mode with the fewest API calls.
+    EST_TEAMS_PER_USER = 10
+    EST_TEAM_MEMBER_PAGES = 2
+    PAGE_SIZE = 20
+
+    def __init__(self, user_ids_or_usernames, required_member_ids_or_usernames=None, out_path=None, mode=MODE_AUTO,
+                 from_snapshot=None, columns=None):
         self._user_ids_or_usernames = user_ids_or_usernames
         if self._user_ids_or_usernames and not isinstance(self._user_ids_or_usernames, list):
             self._user_ids_or_usernames = [self._user_ids_or_usernames]
@@ -19,6 +31,11 @@ class UserTeamsReport:
             self._required_member_ids_or_usernames = [self._required_member_ids_or_usernames]
 
         self._out_path = Utils.expand_path(out_path) if out_path else None
+        self._mode = mode or self.MODE_AUTO
+        self._snapshot = Snapshot(from_snapshot) if from_snapshot else None
+        # Load the data from the snapshot if set otherwise from Synapse.
+        self._utils = self._snapshot or Utils
+        self._columns = columns
         self._csv_full_path = None
         self._csv_file = None
         self._csv_writer = None
@@ -33,6 +50,19 @@ class UserTeamsReport:
                    'is_admin']
 
     def execute(self):
+        if self._mode not in self.MODES:
+            self._show_error('Invalid mode: {0}. Must be one of: {1}'.format(self._mode, ', '.join(self.MODES)))
+            return self
+        if self._mode == self.MODE_TEAM_MAJOR and not self._required_member_ids_or_usernames:
+            # Without a required member every team in Synapse would be loaded.
+            self._show_error('The {0} mode can only be used with --has-member.'.format(self.MODE_TEAM_MAJOR))
+            return self
+        try:
+            self._columns = Utils.select_columns(self.CSV_HEADERS, self._columns)
+        except ValueError as ex:
+            self._show_error(str(ex))
+            return self
+
         if self._out_path:
             if self._out_path.lower().endswith('.csv'):
                 self._csv_full_path = self._out_path
@@ -43,15 +73,19 @@ class UserTeamsReport:
             self._csv_writer = csv.DictWriter(self._csv_file,
                                               delimiter=',',
                                               quotechar='"',
-                                              fieldnames=self.CSV_HEADERS,
-                                              quoting=csv.QUOTE_ALL)
+                                              fieldnames=self._columns,
+                                              quoting=csv.QUOTE_ALL,
+                                              extrasaction='ignore')
             self._csv_writer.writeheader()
         try:
             required_members = []
             required_members_usernames = []
+            # The IDs of the teams the required members are on. This will be None if the teams for any of the
+            # required members cannot be loaded, in which case each team's members will be checked.
+            required_members_team_ids = set()
             if self._required_member_ids_or_usernames:
                 for required_user_id_or_name in self._required_member_ids_or_usernames:
-                    required_user = Utils.WithCache.get_user(required_user_id_or_name)
+                    required_user = self._utils.WithCache.get_user(required_user_id_or_name)
                     if required_user is None:
                         self._show_error(
                             'Could not find user matching: {0}. Aborting.'.format(required_user_id_or_name))
@@ -59,72 +93,229 @@ class UserTeamsReport:
                     else:
                         required_members.append(required_user)
                         required_members_usernames.append(required_user.userName)
+                        if required_members_team_ids is not None:
+                            team_ids = self._utils.WithCache.get_users_team_ids(required_user.ownerId)
+                            if team_ids is None:
+                                self._show_error('Could not load all the teams for: {0} ({1}).'
+                                                 ' Checking the members of each team instead.'.format(
+                                                     required_user.userName, required_user.ownerId))
+                                required_members_team_ids = None
+                            else:
+                                required_members_team_ids.update(team_ids)
 
             if required_members:
                 print('Only including teams that have members: {0}'.format(
                     ' or '.join(['{0} ({1})'.format(m.userName, m.ownerId) for m in required_members])))
 
+            mode = self._mode
+            if mode == self.MODE_AUTO:
+                mode = self._choose_mode(required_members_usernames, required_members_team_ids)
+            elif mode == self.MODE_TEAM_MAJOR and required_members_team_ids is None:
+                # Without the required members' teams every team in Synapse would be loaded.
+                print('Using the {0} mode since the teams of the required members could not be loaded.'.format(
+                    self.MODE_PER_USER))
+                mode = self.MODE_PER_USER
+
+            if mode == self.MODE_TEAM_MAJOR:
+                print('Loading the members of each team...')
+                users_teams_index = self._build_users_teams_index(required_members_team_ids)
+
+                def get_memberships(user_id):
+                    return users_teams_index.get(str(user_id), [])
+            else:
+                def get_memberships(user_id):
+                    # Load the next page of teams while the membership for the current teams is being loaded.
+                    teams = Utils.prefetch(self._utils.users_teams(user_id))
+                    return Utils.thread_map(
+                        lambda t: self._get_team_membership(t,
+                                                            user_id,
+                                                            required_members_usernames,
+                                                            required_members_team_ids), teams)
+
             for id_or_name in self._user_ids_or_usernames:
-                print('=' * 80)
-                print('Looking up user: "{0}"...'.format(id_or_name))
-
-                user = Utils.WithCache.get_user(id_or_name)
-
-                if user:
-                    user_id = user.ownerId
-                    username = user.userName
-                    first_name = user.get('firstName', None)
-                    last_name = user.get('lastName', None)
-                    print('Username: {0} ({1})'.format(username, user_id))
-                    if first_name:
-                        print('First Name: {0}'.format(first_name))
-                    if last_name:
-                        print('Last Name: {0}'.format(last_name))
-
-                    teams = Utils.users_teams(user_id)
-
-                    for team in teams:
-                        team_id = team['id']
-                        team_name = team['name']
-
-                        # Check if the team has at least on of the required members.
-                        if required_members:
-                            found_match = False
-                            members = Utils.WithCache.get_team_members(team_id)
-                            for result in members:
-                                member = result.get('member')
-                                if member.get('userName') in required_members_usernames:
-                                    found_match = True
-                                    break
-
-                            if not found_match:
-                                continue
-
-                        team_member = Synapsis.restGET('/team/{0}/member/{1}'.format(team_id, user_id))
-                        is_admin = team_member.get('isAdmin', False)
-
-                        print('  ---')
-                        print('  Team: {0} ({1})'.format(team_name, team_id))
-                        print('  Is Admin: {0}'.format('Yes' if is_admin else 'No'))
-                        if self._csv_writer:
-                            self._csv_writer.writerow({
-                                'user_id': user_id,
-                                'username': username,
-                                'first_name': first_name,
-                                'last_name': last_name,
-                                'team_id': team_id,
-                                'team_name': team_name,
-                                'is_admin': is_admin
-                            })
-                else:
-                    self._show_error('Could not find user matching: {0}'.format(id_or_name))
+                self._report_on_user(id_or_name, get_memberships)
+                RunMetrics.increment(RunMetrics.ENTITIES_PROCESSED)
         finally:
             if self._csv_file:
                 self._csv_file.close()
+                RunMetrics.add_file(self._csv_full_path)
+            if self._snapshot:
+                self._snapshot.close()
             if self._csv_full_path:
                 print('Report saved to: {0}'.format(self._csv_full_path))
         return self
 
+    def _report_on_user(self, id_or_name, get_memberships):
+        print('=' * 80)
+        print('Looking up user: "{0}"...'.format(id_or_name))
+
+        user = self._utils.WithCache.get_user(id_or_name)
+
+        if user:
+            user_id = user.ownerId
+            username = user.userName
+            first_name = user.get('firstName', None)
+            last_name = user.get('lastName', None)
+            print('Username: {0} ({1})'.format(username, user_id))
+            if first_name:
+                print('First Name: {0}'.format(first_name))
+            if last_name:
+                print('Last Name: {0}'.format(last_name))
+
+            # The teams are loaded as they are reported so an error loading the rest of the teams is reported
+            # after the teams that were loaded.
+            try:
+                self._report_on_memberships(user, get_memberships(user_id))
+            except Exception as ex:
+                self._show_error('Error loading teams for user: {0} ({1}), Error: {2}'.format(username, user_id, ex))
+        else:
+            self._show_error('Could not find user matching: {0}'.format(id_or_name))
+
+    def _report_on_memberships(self, user, memberships):
+        user_id = user.ownerId
+        username = user.userName
+        first_name = user.get('firstName', None)
+        last_name = user.get('lastName', None)
+        for team, is_member_match, is_admin in memberships:
+            if not is_member_match:
+                continue
+
+            team_id = team['id']
+            team_name = team['name']
+
+            print('  ---')
+            print('  Team: {0} ({1})'.format(team_name, team_id))
+            if is_admin is not None:
+                print('  Is Admin: {0}'.format('Yes' if is_admin else 'No'))
+            if self._csv_writer:
+                RunMetrics.increment(RunMetrics.ROWS_WRITTEN)
+                self._csv_writer.writerow({
+                    'user_id': user_id,
+                    'username': username,
+                    'first_name': first_name,
+                    'last_name': last_name,
+                    'team_id': team_id,
+                    'team_name': team_name,
+                    'is_admin': is_admin
+                })
+
+    def _choose_mode(self, required_members_usernames, required_members_team_ids):
+        """Picks the mode that is estimated to make the fewest API calls.
+
+        Per-user mode pages through each user's teams and loads the user's membership on each team.
+        Team-major mode pages through each team's members once and answers every user from the result.
+        Team-major mode is only picked when the teams are limited to the required members' teams, otherwise it
+        would page through every team in Synapse.
+
+        Returns:
+            MODE_PER_USER or MODE_TEAM_MAJOR
+        """
+        user_count = len(self._user_ids_or_usernames)
+        per_user_calls = user_count * (math.ceil(self.EST_TEAMS_PER_USER / self.PAGE_SIZE) +
+                                       self.EST_TEAMS_PER_USER)
+
+        if not required_members_usernames or required_members_team_ids is None:
+            return self.MODE_PER_USER
+        # One call to load each team plus the pages of members.
+        team_major_calls = len(required_members_team_ids) * (1 + self.EST_TEAM_MEMBER_PAGES)
+
+        return self.MODE_TEAM_MAJOR if team_major_calls < per_user_calls else self.MODE_PER_USER
+
+    def _build_users_teams_index(self, required_members_team_ids):
+        """Loads the members of each of the required members' teams once and indexes the teams by the requested
+        users.
+
+        Returns:
+            Dict of user ID to a list of (team, has required member, is admin).
+        """
+        user_ids = set()
+        for user in Utils.thread_map(self._utils.WithCache.get_user, self._user_ids_or_usernames):
+            if user:
+                user_ids.add(str(user.ownerId))
+
+        index = {}
+        for team, members in Utils.thread_map(lambda t: self._get_team_members(t, user_ids),
+                                              sorted(required_members_team_ids)):
+            if team is None:
+                continue
+            # Each team has a required member since it is one of the required members' teams.
+            for member, is_admin in members:
+                user_id = str(member.get('ownerId'))
+                if user_id in user_ids:
+                    index.setdefault(user_id, []).append((team, True, is_admin))
+        return index
+
+    def _get_team_members(self, team_id, user_ids):
+        """Pages through the members of a team and only keeps the requested users.
+
+        Returns:
+            Tuple (team, list of (member, is admin)). The team will be None if it cannot be loaded.
+        """
+        team = self._utils.WithCache.get_team(team_id)
+        if team is None:
+            return None, []
+
+        members = []
+        try:
+            if self._snapshot:
+                results = self._snapshot.get_team_members(team['id'])
+            else:
+                results = Synapsis.getTeamMembers(team['id'])
+            for result in results:
+                member = result.get('member')
+                if str(member.get('ownerId')) in user_ids:
+                    members.append((member, result.get('isAdmin', False)))
+        except Exception as ex:
+            self._show_error('Error loading team members for team: {0}, Error: {1}'.format(team['id'], ex))
+        return team, members
+
+    def _get_team_membership(self, team, user_id, required_members_usernames, required_members_team_ids):
+        """Gets if a team has one of the required members and if the user is an admin on the team.
+
+        Args:
+            team: The team to check.
+            user_id: The ID of the user to get the membership for.
+            required_members_usernames: The usernames that must be on the team.
+            required_members_team_ids: The IDs of the teams the required members are on or None
+                                       if the team's members need to be checked.
+
+        Returns:
+            Tuple (team, has required member, is admin). Is admin will be None if the is_admin column is not
+            included and the membership was not loaded.
+        """
+        team_id = team['id']
+        team_member = None
+
+        # Check if the team has at least one of the required members.
+        if required_members_usernames:
+            if required_members_team_ids is not None:
+                if str(team_id) not in required_members_team_ids:
+                    return team, False, False
+            else:
+                members = self._utils.WithCache.get_team_members(team_id)
+                found_match = False
+                for result in members:
+                    member = result.get('member')
+                    if member.get('userName') in required_members_usernames:
+                        found_match = True
+                    if str(member.get('ownerId')) == str(user_id):
+                        team_member = result
+                if not found_match:
+                    return team, False, False
+
+        # Use the membership from the team roster if it was loaded, otherwise look it up.
+        if team_member is None:
+            if 'is_admin' not in self._columns:
+                return team, True, None
+            try:
+                team_member = self._utils.WithCache.get_team_member(team_id, user_id)
+            except Exception as ex:
+                self._show_error('Error loading team membership for team: {0}, Error: {1}'.format(team_id, ex))
+                return team, True, None
+
+        is_admin = team_member.get('isAdmin', False) if team_member else False
+        return team, True, is_admin
+
     def _show_error(self, msg):
         self.errors.append(msg)
         Utils.eprint(msg)
@@ -0,0 +1,2 @@
+from .cli import create, execute
+from .cache_warmer import CacheWarmer
@@ -0,0 +1,156 @@
+import time
+import synapseclient as syn
+from synapsis import Synapsis
+from ...core import Utils, PrincipalCache, Profiler, RunMetrics
+
+
+class CacheWarmer:
+    """
+    Loads the teams, team members, team invitations, and the user profiles of the members and invitees
+    into a PrincipalCache so later reports (run with --principal-cache) do not load them one at a time.
+
+    The teams and profiles are loaded concurrently. An existing cache is refreshed incrementally: the members and
+    invitations of a team are only reloaded if the team's etag has changed or they are older than max_age, and
+    user profiles are only reloaded if they are older than max_age. Synapse does not provide etags for team
+    members, invitations, or profiles without loading them, so max_age bounds how stale they can be. Reports load
+    the teams and profiles that are older than max_age from Synapse if the cache has not been refreshed.
+    """
+    DEFAULT_MAX_AGE = PrincipalCache.DEFAULT_MAX_AGE
+
+    def __init__(self, cache_path=None, team_ids_or_names=None, max_age=None, full=False, max_workers=None):
+        self._cache_path = cache_path
+        self._team_ids_or_names = team_ids_or_names if team_ids_or_names is not None else []
+        if self._team_ids_or_names and not isinstance(self._team_ids_or_names, list):
+            self._team_ids_or_names = [self._team_ids_or_names]
+        self._max_age = self.DEFAULT_MAX_AGE if max_age is None else max_age
+        self._full = full
+        self._max_workers = max_workers
+        self._now = None
+        self._deleted_team_ids = set()
+        self.errors = []
+
+    def execute(self):
+        # Always load from Synapse so the cache is refreshed.
+        Utils.WithCache.use_principal_cache(None)
+        self._now = time.time()
+        with PrincipalCache(self._cache_path, create=True) as cache:
+            if cache.get_meta('endpoint') not in (None, Synapsis.Synapse.repoEndpoint):
+                print('Cache was created for another Synapse endpoint. Reloading everything.')
+                cache.clear()
+                self._full = True
+            cache.set_meta('endpoint', Synapsis.Synapse.repoEndpoint)
+            self._warm_teams(cache)
+            self._warm_users(cache)
+            # Reports do not read the teams and users that are older than the max age.
+            cache.set_meta('max_age', self._max_age)
+            cache.set_meta('warmed_at', self._now)
+            cache.commit()
+            print('Principal cache saved to: {0}'.format(cache.path))
+        return self
+
+    def _warm_teams(self, cache):
+        team_states = cache.team_states()
+        if self._team_ids_or_names:
+            teams = [team for team in Utils.thread_map(self._get_team, self._team_ids_or_names,
+                                                       max_workers=self._max_workers) if team]
+            print('Loading {0} teams...'.format(len(teams)))
+        else:
+            print('Loading all teams...')
+            # Load the members of the listed teams while the next pages of teams are listed.
+            teams = Utils.prefetch(syn.Team(**team) for team in Utils.all_teams())
+
+        listed_ids = set()
+        stale_teams = []
+
+        def _stale_teams():
+            for team in teams:
+                team_id = str(team['id'])
+                listed_ids.add(team_id)
+                if self._is_fresh(team_states.get(team_id), team.get('etag')):
+                    continue
+                stale_teams.append(team_id)
+                yield team
+
+        loaded_count = 0
+        for team, members, invitations in Utils.thread_map(self._load_team, _stale_teams(),
+                                                            max_workers=self._max_workers):
+            RunMetrics.increment(RunMetrics.ENTITIES_PROCESSED)
+            if members is None:
+                continue
+            cache.add_team(team, members, invitations, loaded_at=self._now)
+            loaded_count += 1
+
+        removed_ids = [team_id for team_id in team_states if team_id in self._deleted_team_ids or (
+                not self._team_ids_or_names and team_id not in listed_ids)]
+        cache.remove_teams(removed_ids)
+        print('Teams: {0} loaded, {1} unchanged, {2} removed.'.format(
+            loaded_count, len(listed_ids) - len(stale_teams), len(removed_ids)))
+
+    def _warm_users(self, cache):
+        user_states = cache.user_states()
+        user_ids = cache.referenced_user_ids()
+        stale_ids = {user_id for user_id in user_ids
+                     if not self._is_fresh(user_states.get(user_id), None, check_etag=False)}
+
+        print('Loading {0} user profiles...'.format(len(stale_ids)))
+        with Profiler.phase(Profiler.PRINCIPAL_RESOLUTION):
+            users = Utils.WithCache.get_users(sorted(stale_ids), max_workers=self._max_workers)
+        changed_count = 0
+        for user_id, user in users.items():
+            if user_states.get(user_id, (None,))[0] != user.get('etag'):
+                changed_count += 1
+            cache.add_user(user, loaded_at=self._now)
+
+        # Remove the users that no longer exist or are no longer on a cached team.
+        removed_ids = [user_id for user_id in user_states
+                       if user_id not in user_ids or (user_id in stale_ids and user_id not in users)]
+        cache.remove_users(removed_ids)
+        print('Users: {0} loaded ({1} changed), {2} unchanged, {3} removed.'.format(
+            len(users), changed_count, len(user_ids) - len(stale_ids), len(removed_ids)))
+
+    def _is_fresh(self, state, etag, check_etag=True):
+        """Gets if a cached team or user can be kept.
+
+        Args:
+            state: The cached (etag, loaded_at) or None if not cached.
+            etag: The current etag.
+            check_etag: Compare the etags.
+        """
+        if self._full or state is None:
+            return False
+        cached_etag, loaded_at = state
+        if check_etag and cached_etag != etag:
+            return False
+        return self._now - (loaded_at or 0) < self._max_age
+
+    def _get_team(self, team_id_or_name):
+        team = Utils.WithCache.get_team(team_id_or_name)
+        if team is None:
+            self._show_error('Team does not exist or you do not have access to the team: {0}'.format(team_id_or_name))
+        return team
+
+    def _load_team(self, team):
+        """Loads the members and open invitations of a team.
+
+        Returns:
+            Tuple (team, members, invitations). members is None if the team could not be loaded, in which case
+            the team is left as it is in the cache unless it was deleted.
+        """
+        try:
+            with Profiler.phase(Profiler.TEAM_EXPANSION):
+                members = list(Synapsis.getTeamMembers(team['id']))
+                invitations = list(Synapsis.get_team_open_invitations(team['id']))
+            return team, members, invitations
+        except syn.core.exceptions.SynapseHTTPError as ex:
+            if ex.response.status_code == 404:
+                # The team was deleted after it was listed.
+                self._deleted_team_ids.add(str(team['id']))
+                return team, None, None
+            self._show_error('Error loading team: {0} ({1}), Error: {2}'.format(team['name'], team['id'], ex))
+        except Exception as ex:
+            self._show_error('Error loading team: {0} ({1}), Error: {2}'.format(team['name'], team['id'], ex))
+        return team, None, None
+
+    def _show_error(self, msg):
+        self.errors.append(msg)
+        Utils.eprint(msg)
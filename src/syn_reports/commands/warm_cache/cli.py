@@ -0,0 +1,26 @@
+from .cache_warmer import CacheWarmer
+
+
+def create(parser):
+    parser.add_argument('teams',
+                        nargs='*',
+                        help='The IDs and/or names of the teams to cache. Will cache all the teams in Synapse if not set.')
+    parser.add_argument('--cache-path', default=None,
+                        help='Path of the principal cache to create or refresh. Defaults to "~/.syn-reports/principal-cache.db".')
+    parser.add_argument('--max-age', type=int, default=None,
+                        help='Reload the members of teams whose etag has not changed and the user profiles after this many seconds. Defaults to 86400.')
+    parser.add_argument('--full', default=False, action='store_true',
+                        help='Reload everything instead of refreshing the cache incrementally.')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='The max number of threads to load data with.')
+    parser.set_defaults(_execute=execute)
+
+
+def execute(args):
+    return CacheWarmer(
+        cache_path=args.cache_path,
+        team_ids_or_names=args.teams,
+        max_age=args.max_age,
+        full=args.full,
+        max_workers=args.max_workers
+    ).execute()
@@ -1 +1,11 @@
 from .utils import Utils
+from .profiler import Profiler
+from .run_metrics import RunMetrics
+from .external_sort import ExternalSort
+from .csv_writer import CsvWriter
+from .normalized_writer import NormalizedWriter
+from .report_filter import ReportFilter
+from .snapshot import Snapshot, SnapshotBenefactorView
+from .session_cache import SessionCache
+from .principal_cache import PrincipalCache
+from .cassette import Cassette
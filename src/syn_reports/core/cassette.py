@@ -0,0 +1,230 @@
+import os
+import glob
+import gzip
+import json
+import time
+import base64
+import hashlib
+import threading
+import multiprocessing.util
+from collections import deque
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from synapsis import Synapsis
+from .utils import Utils
+
+
+class Cassette:
+    """
+    Records the Synapse REST requests and responses of a run to a directory, or replays them from the directory
+    without network access, so a run can be repeated offline (e.g., to profile or debug it) with the same data.
+
+    Each process writes its requests and responses to its own gzipped JSON lines file in the directory
+    (interactions-<pid>.jsonl.gz), one line per response with the key of its request. When replaying, the files
+    are indexed by request key and each request is answered with the next recorded response for the same method,
+    URL, and body. Requests whose body differs between runs (e.g., the random names of the temporary view Project
+    and views) fall back to the next recorded response for the same method and URL.
+    """
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+    LATENCY_ZERO = 'zero'
+    LATENCY_RECORDED = 'recorded'
+    LATENCIES = [LATENCY_ZERO, LATENCY_RECORDED]
+
+    FILE_PATTERN = 'interactions-*.jsonl.gz'
+
+    # The cassette that is recording or replaying in this process.
+    active = None
+
+    def __init__(self, path, mode, latency=None):
+        """
+        Args:
+            path: The directory to record to or replay from.
+            mode: RECORD or REPLAY.
+            latency: LATENCY_ZERO to replay responses immediately or LATENCY_RECORDED to wait as long as the
+                     recorded request took.
+        """
+        if mode not in [self.RECORD, self.REPLAY]:
+            raise ValueError('Invalid mode: {0}'.format(mode))
+        self.path = Utils.expand_path(path)
+        self.mode = mode
+        self.latency = latency or self.LATENCY_ZERO
+        if self.latency not in self.LATENCIES:
+            raise ValueError('Invalid latency: {0}. Must be one of: {1}'.format(self.latency,
+                                                                              ', '.join(self.LATENCIES)))
+        self._lock = threading.Lock()
+        self._file = None
+        self._responses = {}
+        self._started = False
+        self.recorded_count = 0
+        self.replayed_count = 0
+
+    @property
+    def is_replay(self):
+        return self.mode == self.REPLAY
+
+    def process_args(self):
+        """Gets the args to create this cassette in another process."""
+        return {'path': self.path, 'mode': self.mode, 'latency': self.latency}
+
+    def login(self, login_func=None):
+        """Logs into Synapse and starts recording, or starts replaying without logging in.
+
+        Args:
+            login_func: The function to log in with. Defaults to Synapsis.login.
+        """
+        if not self.is_replay:
+            (login_func or Synapsis.login)()
+        self.start()
+
+    def start(self):
+        """Records or replays the requests made with the current Synapse session.
+        Must be called after logging in since logging in creates a new session.
+        """
+        with self._lock:
+            if not self._started:
+                if self.is_replay:
+                    self._load()
+                else:
+                    Utils.ensure_dirs(self.path)
+                    file_path = os.path.join(self.path, self.FILE_PATTERN.replace('*', str(os.getpid())))
+                    self._file = gzip.open(file_path, mode='at', encoding='utf-8')
+                    # Processes in a pool exit without running atexit handlers.
+                    multiprocessing.util.Finalize(self, self.stop, exitpriority=10)
+                self._started = True
+                Cassette.active = self
+
+        session = Synapsis.Synapse._requests_session
+        for prefix in ['https://', 'http://']:
+            adapter = session.get_adapter(prefix)
+            if not isinstance(adapter, _CassetteAdapter):
+                session.mount(prefix, _CassetteAdapter(self, adapter))
+
+    def stop(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+            if Cassette.active is self:
+                Cassette.active = None
+
+    def _load(self):
+        file_paths = sorted(glob.glob(os.path.join(self.path, self.FILE_PATTERN)))
+        if not file_paths:
+            raise Exception('No recorded requests found in: {0}'.format(self.path))
+        for file_path in file_paths:
+            with gzip.open(file_path, mode='rt', encoding='utf-8') as f:
+                for line in f:
+                    interaction = json.loads(line)
+                    for key in [interaction['key'], self._url_key(interaction['method'], interaction['url'])]:
+                        self._responses.setdefault(key, deque()).append(interaction)
+
+    @staticmethod
+    def _key(method, url, body):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return hashlib.sha1(b'\n'.join([method.upper().encode('utf-8'),
+                                        url.encode('utf-8'),
+                                        body or b''])).hexdigest()
+
+    @staticmethod
+    def _url_key(method, url):
+        return '{0} {1}'.format(method.upper(), url)
+
+    def send(self, request, adapter, **kwargs):
+        """Sends a request with the adapter and records the response, or replays the recorded response."""
+        key = self._key(request.method, request.url, request.body)
+        if self.is_replay:
+            return self._replay(request, key)
+
+        start_time = time.monotonic()
+        response = adapter.send(request, **kwargs)
+        elapsed = time.monotonic() - start_time
+        content = response.content
+        try:
+            body = content.decode('utf-8')
+            is_base64 = False
+        except UnicodeDecodeError:
+            body = base64.b64encode(content).decode('ascii')
+            is_base64 = True
+        line = json.dumps({'key': key,
+                           'method': request.method.upper(),
+                           'url': request.url,
+                           'status': response.status_code,
+                           'reason': response.reason,
+                           'content_type': response.headers.get('Content-Type'),
+                           'body': body,
+                           'base64': is_base64,
+                           'elapsed': round(elapsed, 4)}, separators=(',', ':'))
+        with self._lock:
+            if self._file:
+                self._file.write(line + '\n')
+                self.recorded_count += 1
+        return response
+
+    @staticmethod
+    def _next_interaction(responses, repeat_last):
+        """Gets the next recorded interaction from the responses for a key.
+        Each interaction is in the responses for its exact key and for its method and URL so the interactions that
+        were already replayed for the other key are skipped.
+
+        Args:
+            responses: The deque of interactions or None.
+            repeat_last: Get the last interaction again even if it was already replayed.
+
+        Returns:
+            The interaction or None.
+        """
+        if not responses:
+            return None
+        while len(responses) > 1 and responses[0].get('replayed'):
+            responses.popleft()
+        if len(responses) > 1:
+            return responses.popleft()
+        return responses[0] if repeat_last or not responses[0].get('replayed') else None
+
+    def _replay(self, request, key):
+        with self._lock:
+            # Keep the last response so repeated requests (e.g., polling a job) get the final response.
+            interaction = self._next_interaction(self._responses.get(key), repeat_last=True)
+            if interaction is None:
+                # Fall back to the method and URL if the body is different.
+                interaction = self._next_interaction(self._responses.get(self._url_key(request.method, request.url)),
+                                                     repeat_last=False)
+            if interaction is None:
+                raise Exception('Request not recorded in cassette: {0} {1}'.format(request.method, request.url))
+            interaction['replayed'] = True
+            self.replayed_count += 1
+
+        if self.latency == self.LATENCY_RECORDED:
+            time.sleep(interaction.get('elapsed') or 0)
+
+        response = requests.Response()
+        response.status_code = interaction['status']
+        response.reason = interaction.get('reason')
+        response.headers = CaseInsensitiveDict()
+        if interaction.get('content_type'):
+            response.headers['Content-Type'] = interaction['content_type']
+        body = interaction['body']
+        response._content = base64.b64decode(body) if interaction.get('base64') else body.encode('utf-8')
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+
+class _CassetteAdapter(BaseAdapter):
+    """Sends the requests of a Synapse session through a Cassette."""
+
+    def __init__(self, cassette, adapter):
+        super().__init__()
+        self._cassette = cassette
+        self._adapter = adapter
+
+    def send(self, request, **kwargs):
+        return self._cassette.send(request, self._adapter, **kwargs)
+
+    def close(self):
+        self._adapter.close()
@@ -0,0 +1,213 @@
+import io
+import csv
+import gzip
+import queue
+import threading
+from .profiler import Profiler
+from .run_metrics import RunMetrics
+
+
+class CsvWriter:
+    """
+    Writes report rows to a CSV file.
+
+    The rows are formatted on the calling thread and written (and compressed) on a background thread so the
+    report is not blocked by the disk or the compression. If max_file_size is set, a new part file with its own
+    header is started before a file would exceed the size, e.g., report.csv.gz, report-part0002.csv.gz, etc.
+    """
+    COMPRESSIONS = {
+        'gzip': '.gz',
+        'zstd': '.zst'
+    }
+    # The default compression level of each compression. Favors speed over size (gzip defaults to 9).
+    COMPRESS_LEVELS = {
+        'gzip': 6,
+        'zstd': 3
+    }
+
+    # The number of bytes of formatted rows to send to the background thread at a time.
+    BATCH_SIZE = 64 * 1024
+    QUEUE_SIZE = 100
+
+    def __init__(self, path, fieldnames, compress=None, max_file_size=None, extrasaction='raise',
+                 compress_level=None):
+        """
+        Args:
+            path: The path of the CSV file. The compression's extension is added if not set.
+            fieldnames: The names of the columns.
+            extrasaction: 'raise' or 'ignore' the values in a row that are not in fieldnames.
+            compress: None, 'gzip', or 'zstd'.
+            max_file_size: The max size of each file in bytes (after compression). A file only exceeds the size
+                if a single row does not fit in it.
+            compress_level: The compression level. Defaults to COMPRESS_LEVELS.
+        """
+        if compress is not None and compress not in self.COMPRESSIONS:
+            raise ValueError('Invalid compression: {0}. Must be one of: {1}'.format(
+                compress, ', '.join(self.COMPRESSIONS)))
+        self._compress_level = compress_level if compress_level is not None else self.COMPRESS_LEVELS.get(compress)
+        if compress == 'zstd':
+            # Fail before the report starts if the optional dependency is not installed.
+            self._zstd_compressor(self._compress_level)
+
+        self._extension = '.csv' + (self.COMPRESSIONS[compress] if compress else '')
+        self._base_path = path[:-len(self._extension)] if path.endswith(self._extension) else (
+            path[:-len('.csv')] if path.lower().endswith('.csv') else path)
+        self.path = self._base_path + self._extension
+        self._fieldnames = fieldnames
+        self._compress = compress
+        self._max_file_size = max_file_size
+        self.paths = []
+
+        self._buffer = io.StringIO()
+        # The offset of the end of each row in the buffer.
+        self._row_ends = []
+        self._writer = csv.DictWriter(self._buffer,
+                                      delimiter=',',
+                                      quotechar='"',
+                                      fieldnames=fieldnames,
+                                      quoting=csv.QUOTE_ALL,
+                                      extrasaction=extrasaction)
+        self._writer.writeheader()
+        self._header = self._take_buffer()[0].encode('utf-8')
+
+        self._file = None
+        self._raw_file = None
+        # The number of bytes written to the compressor since it was last flushed.
+        self._unflushed = 0
+        self._has_rows = False
+        self._error = None
+        self._queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._write_batches, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def writerow(self, row):
+        self._writer.writerow(row)
+        self._row_ends.append(self._buffer.tell())
+        RunMetrics.increment(RunMetrics.ROWS_WRITTEN)
+        if self._buffer.tell() >= self.BATCH_SIZE:
+            self._put(self._take_buffer())
+
+    def close(self):
+        """Writes the remaining rows and waits for the files to be closed."""
+        if self._thread is None:
+            return
+        if self._buffer.tell() > 0:
+            self._put(self._take_buffer())
+        self._put(None)
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            raise self._error
+
+    def _take_buffer(self):
+        """Gets the formatted rows and the offset of the end of each row."""
+        data = (self._buffer.getvalue(), self._row_ends)
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._row_ends = []
+        return data
+
+    def _put(self, data):
+        while True:
+            if self._error is not None:
+                raise self._error
+            try:
+                self._queue.put(data, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _write_batches(self):
+        try:
+            while True:
+                data = self._queue.get()
+                if data is None:
+                    break
+                if self._file is None:
+                    self._open_next_file()
+                text, row_ends = data
+                batch = text.encode('utf-8')
+                if not self._max_file_size or self._fits(len(batch)):
+                    self._write(batch)
+                else:
+                    # Start the next file between the rows of the batch.
+                    start = 0
+                    for end in row_ends:
+                        row = text[start:end].encode('utf-8')
+                        start = end
+                        if self._has_rows and not self._fits(len(row)):
+                            self._open_next_file()
+                        self._write(row)
+            if self._file is None:
+                # Always create the file even if there are no rows.
+                self._open_next_file()
+        except Exception as ex:
+            self._error = ex
+            # Unblock the report thread.
+            while not self._queue.empty():
+                self._queue.get_nowait()
+        finally:
+            self._close_file()
+
+    def _write(self, data):
+        with Profiler.span(Profiler.CSV_FLUSH):
+            self._file.write(data)
+        if self._file is not self._raw_file:
+            self._unflushed += len(data)
+        self._has_rows = True
+
+    def _fits(self, size):
+        """Gets if size more bytes can be written to the current file without it exceeding max_file_size."""
+        if self._raw_file.tell() + self._max_compressed_size(self._unflushed + size) <= self._max_file_size:
+            return True
+        if self._unflushed:
+            # Flush the compressor so the compressed size of the file is known.
+            self._file.flush()
+            self._unflushed = 0
+        return self._raw_file.tell() + self._max_compressed_size(size) <= self._max_file_size
+
+    def _max_compressed_size(self, size):
+        """Gets the most bytes that size bytes can take in the file, including the end of a compressed file."""
+        if not self._compress:
+            return size
+        # Data that does not compress is stored in blocks with a small header.
+        return size + size // 128 + 128
+
+    def _open_next_file(self):
+        self._close_file()
+        part = len(self.paths) + 1
+        path = self.path if part == 1 else '{0}-part{1:04d}{2}'.format(self._base_path, part, self._extension)
+        self._raw_file = open(path, mode='wb')
+        if self._compress == 'gzip':
+            self._file = gzip.GzipFile(fileobj=self._raw_file, mode='wb', compresslevel=self._compress_level)
+        elif self._compress == 'zstd':
+            self._file = self._zstd_compressor(self._compress_level).stream_writer(self._raw_file, closefd=False)
+        else:
+            self._file = self._raw_file
+        self.paths.append(path)
+        self._unflushed = 0
+        self._write(self._header)
+        self._has_rows = False
+
+    def _close_file(self):
+        if self._file is not None and self._file is not self._raw_file:
+            self._file.close()
+        if self._raw_file is not None:
+            RunMetrics.increment(RunMetrics.BYTES_WRITTEN, self._raw_file.tell())
+            self._raw_file.close()
+        self._file = None
+        self._raw_file = None
+
+    @staticmethod
+    def _zstd_compressor(level):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('zstd compression requires the zstandard package: pip install syn-reports[zstd]')
+        return zstandard.ZstdCompressor(level=level)
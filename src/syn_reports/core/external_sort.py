@@ -0,0 +1,69 @@
+import os
+import csv
+import heapq
+import tempfile
+
+
+class ExternalSort:
+    """
+    Sorts more rows than fit in memory by sorting them in chunks, writing each chunk to a temp file,
+    and merging the sorted chunk files.
+    """
+    DEFAULT_CHUNK_SIZE = 500000
+
+    def __init__(self, fieldnames, key, chunk_size=None, tmp_dir=None):
+        """
+        Args:
+            fieldnames: The names of the fields in each row.
+            key: Function that returns the sort key for a row.
+            chunk_size: The max number of rows to hold in memory.
+            tmp_dir: The directory to write the chunk files to.
+        """
+        self._fieldnames = fieldnames
+        self._key = key
+        self._chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        self._tmp_dir = tmp_dir
+        self._chunk_paths = []
+
+    def sort(self, rows):
+        """Sorts the rows.
+
+        Args:
+            rows: Iterable of dicts.
+
+        Returns:
+            Generator of the sorted dicts.
+        """
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self._chunk_size:
+                self._write_chunk(chunk)
+                chunk = []
+
+        if not self._chunk_paths:
+            # Everything fit in memory.
+            chunk.sort(key=self._key)
+            yield from chunk
+            return
+
+        if chunk:
+            self._write_chunk(chunk)
+        files = [open(path, mode='r', newline='', encoding='utf-8') for path in self._chunk_paths]
+        try:
+            readers = [csv.DictReader(f, fieldnames=self._fieldnames) for f in files]
+            yield from heapq.merge(*readers, key=self._key)
+        finally:
+            for f in files:
+                f.close()
+            for path in self._chunk_paths:
+                os.remove(path)
+            self._chunk_paths = []
+
+    def _write_chunk(self, chunk):
+        chunk.sort(key=self._key)
+        fd, path = tempfile.mkstemp(prefix='syn-reports-sort-', suffix='.csv', dir=self._tmp_dir)
+        self._chunk_paths.append(path)
+        with os.fdopen(fd, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self._fieldnames, quoting=csv.QUOTE_ALL)
+            writer.writerows(chunk)
@@ -0,0 +1,185 @@
+import synapseclient as syn
+from .csv_writer import CsvWriter
+
+
+class NormalizedWriter:
+    """
+    Writes a permissions report as separate tables keyed by ID instead of repeating each user's row
+    for every member of every team on every entity:
+
+        acl_entries:      One row per entity and principal on the entity's ACL.
+        principals:       One row per user or team (joined on principal_id).
+        team_members:     One row per member of each team on an ACL (joined on team_id and user_id).
+        team_invitations: One row per open invitation to each team on an ACL.
+
+    Each table is written to its own CSV next to the path, e.g., report-acl_entries.csv,
+    report-principals.csv, etc. Principals, team members, and invitations are only written once per file.
+    """
+    ACL_ENTRIES = 'acl_entries'
+    PRINCIPALS = 'principals'
+    TEAM_MEMBERS = 'team_members'
+    TEAM_INVITATIONS = 'team_invitations'
+
+    # Table name: (columns, columns that identify a row or None if every row is written).
+    TABLES = {
+        ACL_ENTRIES: (['entity_type',
+                       'entity_id',
+                       'entity_name',
+                       'entity_parent_id',
+                       'entity_project_id',
+                       'principal_id',
+                       'permission_level'], None),
+        PRINCIPALS: (['principal_id',
+                      'principal_type',
+                      'team_name',
+                      'username',
+                      'first_name',
+                      'last_name',
+                      'user_data',
+                      'emails'], ['principal_id']),
+        TEAM_MEMBERS: (['team_id',
+                        'user_id',
+                        'is_team_manager'], ['team_id', 'user_id']),
+        TEAM_INVITATIONS: (['team_id',
+                            'invitee_id',
+                            'invitee_email'], ['team_id', 'invitee_id', 'invitee_email'])
+    }
+
+    def __init__(self, path, compress=None, max_file_size=None, include_emails=False, compress_level=None):
+        """
+        Args:
+            path: The path of the report. The table name is added to the name of each table's CSV.
+            compress: None, 'gzip', or 'zstd'.
+            max_file_size: The max size of each file in bytes (after compression).
+            include_emails: Include the emails of each user in the principals.
+            compress_level: The compression level. Defaults to CsvWriter.COMPRESS_LEVELS.
+        """
+        self.path = path[:-len('.csv')] if path.lower().endswith('.csv') else path
+        self._include_emails = include_emails
+        self._writers = {}
+        self._keys = {}
+        for table, (fieldnames, key_columns) in self.TABLES.items():
+            if table == self.PRINCIPALS and not include_emails:
+                fieldnames = [c for c in fieldnames if c != 'emails']
+            self._writers[table] = CsvWriter('{0}-{1}.csv'.format(self.path, table),
+                                             fieldnames,
+                                             compress=compress,
+                                             max_file_size=max_file_size,
+                                             compress_level=compress_level)
+            self._keys[table] = set() if key_columns else None
+        self.paths = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        errors = []
+        for writer in self._writers.values():
+            try:
+                writer.close()
+            except Exception as ex:
+                errors.append(ex)
+            self.paths.extend(p for p in writer.paths if p not in self.paths)
+        if errors:
+            raise errors[0]
+
+    @classmethod
+    def table_of(cls, path):
+        """Gets the name of the table a CSV written by this class is for.
+
+        Returns:
+            The table name or None.
+        """
+        name = path.rsplit('.csv', 1)[0]
+        return next((t for t in cls.TABLES if name.endswith('-{0}'.format(t))), None)
+
+    def add(self, table, row):
+        """Writes a row to a table. Rows with the same key as a row already written to the table are skipped.
+
+        Returns:
+            True if the row was written.
+        """
+        keys = self._keys[table]
+        if keys is not None:
+            key = tuple(str(row.get(c) or '') for c in self.TABLES[table][1])
+            if key in keys:
+                return False
+            keys.add(key)
+        self._writers[table].writerow(row)
+        return True
+
+    def add_acl_entry(self, entity, entity_type, entity_parent_id, entity_project_id, principal_id, permission):
+        self.add(self.ACL_ENTRIES, {
+            'entity_type': entity_type.name,
+            'entity_id': entity['id'],
+            'entity_name': entity['name'],
+            'entity_parent_id': entity_parent_id,
+            'entity_project_id': entity_project_id,
+            'principal_id': principal_id,
+            'permission_level': permission.name
+        })
+
+    def add_principal(self, principal_id, user_or_team):
+        """Writes a user or team to the principals.
+
+        Args:
+            principal_id: The ID of the user or team.
+            user_or_team: The user's profile, the team, or None if it could not be loaded.
+
+        Returns:
+            True if the principal was not already written.
+        """
+        row = {'principal_id': principal_id}
+        if isinstance(user_or_team, syn.Team):
+            row['principal_type'] = 'Team'
+            row['team_name'] = user_or_team.name
+        elif user_or_team is None:
+            row['principal_type'] = 'Unknown'
+        else:
+            row['principal_type'] = 'User'
+            row['username'] = user_or_team.userName
+            row['first_name'] = user_or_team.get('firstName', None)
+            row['last_name'] = user_or_team.get('lastName', None)
+            row['user_data'] = ' - '.join(user_or_team.get(f) for f in ['company', 'location', 'position']
+                                          if user_or_team.get(f, None))
+            if self._include_emails:
+                row['emails'] = ','.join(user_or_team.get('emails', []))
+        return self.add(self.PRINCIPALS, row)
+
+    def add_team(self, team, team_members, team_invitations, get_users):
+        """Writes the members and open invitations of a team and the users they are for.
+
+        Args:
+            team: The team.
+            team_members: The team's members.
+            team_invitations: The team's open invitations.
+            get_users: Function to get the profiles of a list of user IDs as a dict of user ID to profile.
+        """
+        user_ids = []
+        for team_member in team_members:
+            user_id = team_member.get('member').get('ownerId')
+            self.add(self.TEAM_MEMBERS, {
+                'team_id': team.id,
+                'user_id': user_id,
+                'is_team_manager': team_member.get('isAdmin')
+            })
+            user_ids.append(str(user_id))
+
+        for team_invitation in team_invitations:
+            invitee_id = team_invitation.get('inviteeId', None)
+            self.add(self.TEAM_INVITATIONS, {
+                'team_id': team.id,
+                'invitee_id': invitee_id,
+                'invitee_email': team_invitation.get('inviteeEmail', None)
+            })
+            if invitee_id is not None:
+                user_ids.append(str(invitee_id))
+
+        # Only load the profiles of the users that have not been written (e.g., for another team) in one batch.
+        user_ids = [user_id for user_id in dict.fromkeys(user_ids) if (user_id,) not in self._keys[self.PRINCIPALS]]
+        users = get_users(user_ids) if user_ids else {}
+        for user_id in user_ids:
+            self.add_principal(user_id, users.get(user_id))
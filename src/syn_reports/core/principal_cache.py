@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import synapseclient as syn
+from .utils import Utils
+
+
+class PrincipalCache:
+    """
+    A persistent SQLite cache of the teams, team members, team invitations, and user profiles saved by the
+    warm-cache command.
+
+    Utils.WithCache loads from the cache before loading from Synapse once the cache is set with
+    Utils.WithCache.use_principal_cache so a report starts with the principals already resolved. Several reports
+    can read the cache at the same time, including while it is being refreshed.
+
+    The etag and the time each team and user was loaded are stored so the cache can be refreshed incrementally.
+    Teams and users that were loaded more than max_age seconds ago are not read so they are loaded from Synapse
+    instead if the cache has not been refreshed.
+    """
+    DEFAULT_PATH = os.path.join('~', '.syn-reports', 'principal-cache.db')
+    DEFAULT_MAX_AGE = 24 * 60 * 60
+    VERSION = 1
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+        'CREATE TABLE IF NOT EXISTS teams (id INTEGER PRIMARY KEY, name TEXT, etag TEXT, team TEXT, members TEXT,'
+        ' invitations TEXT, loaded_at REAL)',
+        'CREATE INDEX IF NOT EXISTS teams_name ON teams (name)',
+        'CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT, etag TEXT, profile TEXT,'
+        ' loaded_at REAL)',
+        'CREATE INDEX IF NOT EXISTS users_username ON users (username COLLATE NOCASE)'
+    ]
+
+    def __init__(self, path=None, create=False, max_age=None):
+        """
+        Args:
+            path: The path of the cache file. Defaults to DEFAULT_PATH.
+            create: Create the cache if it does not exist.
+            max_age: The number of seconds after loading a team or user that it can be read for.
+                Defaults to the max age the cache was warmed with.
+        """
+        self.path = Utils.expand_path(path or self.DEFAULT_PATH)
+        exists = os.path.isfile(self.path)
+        if not exists:
+            if not create:
+                raise FileNotFoundError('Principal cache does not exist: {0}'.format(self.path))
+            Utils.ensure_dirs(os.path.dirname(self.path))
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+        if create:
+            # Let reports read the cache while it is being refreshed.
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+            if not exists:
+                self.set_meta('version', self.VERSION)
+            self._conn.commit()
+        if str(self.get_meta('version')) != str(self.VERSION):
+            raise Exception('Unsupported principal cache version: {0}. Run warm-cache with --full.'.format(
+                self.get_meta('version')))
+        self.max_age = float(self.get_meta('max_age') or self.DEFAULT_MAX_AGE) if max_age is None else max_age
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        if self._conn:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _query_one(self, sql, params=()):
+        rows = self._query(sql, params)
+        return rows[0] if rows else None
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    ####################################################################################################################
+    # Write
+    ####################################################################################################################
+
+    def set_meta(self, key, value):
+        self._execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def get_meta(self, key):
+        row = self._query_one('SELECT value FROM meta WHERE key = ?', (key,))
+        return row['value'] if row else None
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM teams')
+            self._conn.execute('DELETE FROM users')
+
+    def add_team(self, team, members, invitations, loaded_at=None):
+        self._execute('INSERT OR REPLACE INTO teams (id, name, etag, team, members, invitations, loaded_at)'
+                      ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                      (int(team['id']), team['name'], team.get('etag'), json.dumps(team), json.dumps(members),
+                       json.dumps(invitations), time.time() if loaded_at is None else loaded_at))
+
+    def remove_teams(self, team_ids):
+        with self._lock:
+            self._conn.executemany('DELETE FROM teams WHERE id = ?', [(int(team_id),) for team_id in team_ids])
+
+    def add_user(self, user, loaded_at=None):
+        self._execute('INSERT OR REPLACE INTO users (id, username, etag, profile, loaded_at) VALUES (?, ?, ?, ?, ?)',
+                      (int(user['ownerId']), user.get('userName'), user.get('etag'), json.dumps(user),
+                       time.time() if loaded_at is None else loaded_at))
+
+    def remove_users(self, user_ids):
+        with self._lock:
+            self._conn.executemany('DELETE FROM users WHERE id = ?', [(int(user_id),) for user_id in user_ids])
+
+    ####################################################################################################################
+    # Read
+    ####################################################################################################################
+
+    def warmed_at(self):
+        """Gets the time the cache was last warmed or None if it has not been warmed."""
+        value = self.get_meta('warmed_at')
+        return None if value is None else float(value)
+
+    def age(self):
+        """Gets the number of seconds since the cache was last warmed or None if it has not been warmed."""
+        warmed_at = self.warmed_at()
+        return None if warmed_at is None else time.time() - warmed_at
+
+    def _min_loaded_at(self):
+        """Gets the load time of the oldest team or user that can be read."""
+        return time.time() - self.max_age
+
+    def team_states(self):
+        """Gets the etag and load time of each team.
+
+        Returns:
+            Dict of team ID to (etag, loaded_at).
+        """
+        return {str(row['id']): (row['etag'], row['loaded_at'])
+                for row in self._query('SELECT id, etag, loaded_at FROM teams')}
+
+    def user_states(self):
+        """Gets the etag and load time of each user.
+
+        Returns:
+            Dict of user ID to (etag, loaded_at).
+        """
+        return {str(row['id']): (row['etag'], row['loaded_at'])
+                for row in self._query('SELECT id, etag, loaded_at FROM users')}
+
+    def referenced_user_ids(self):
+        """Gets the IDs of the team members and invitees of all the teams."""
+        user_ids = set()
+        for row in self._query('SELECT members, invitations FROM teams'):
+            user_ids.update(str(m['member']['ownerId']) for m in json.loads(row['members']))
+            user_ids.update(str(i['inviteeId']) for i in json.loads(row['invitations']) if i.get('inviteeId'))
+        return user_ids
+
+    def get_user(self, username_or_id):
+        """Gets a user profile by user ID or username.
+
+        Returns:
+            UserProfile or None if the user is not cached.
+        """
+        username_or_id = str(username_or_id)
+        if username_or_id.isdigit():
+            row = self._query_one('SELECT profile FROM users WHERE id = ? AND loaded_at >= ?',
+                                  (int(username_or_id), self._min_loaded_at()))
+        else:
+            row = self._query_one('SELECT profile FROM users WHERE username = ? COLLATE NOCASE AND loaded_at >= ?'
+                                  ' LIMIT 1', (username_or_id, self._min_loaded_at()))
+        return syn.UserProfile(**json.loads(row['profile'])) if row else None
+
+    def get_users(self, user_ids):
+        """Gets the cached user profiles for a list of user IDs.
+
+        Returns:
+            Dict of user ID to UserProfile. Users that are not cached are not included.
+        """
+        ids = [int(user_id) for user_id in user_ids if str(user_id).isdigit()]
+        min_loaded_at = self._min_loaded_at()
+        users = {}
+        # Stay under SQLite's limit on the number of query params.
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            for row in self._query('SELECT id, profile FROM users WHERE id IN ({0}) AND loaded_at >= ?'.format(
+                    ','.join('?' * len(batch))), batch + [min_loaded_at]):
+                users[str(row['id'])] = syn.UserProfile(**json.loads(row['profile']))
+        return users
+
+    def get_team(self, team_id_or_name):
+        """Gets a team by team ID or name.
+
+        Returns:
+            Team or None if the team is not cached.
+        """
+        team_id_or_name = str(team_id_or_name)
+        if team_id_or_name.isdigit():
+            row = self._query_one('SELECT team FROM teams WHERE id = ? AND loaded_at >= ?',
+                                  (int(team_id_or_name), self._min_loaded_at()))
+        else:
+            row = self._query_one('SELECT team FROM teams WHERE name = ? AND loaded_at >= ? LIMIT 1',
+                                  (team_id_or_name, self._min_loaded_at()))
+        return syn.Team(**json.loads(row['team'])) if row else None
+
+    def get_team_members(self, team_id):
+        """Gets the members of a team.
+
+        Returns:
+            List of TeamMembers or None if the team is not cached.
+        """
+        row = self._query_one('SELECT members FROM teams WHERE id = ? AND loaded_at >= ?',
+                              (int(team_id), self._min_loaded_at()))
+        return [syn.TeamMember(**m) for m in json.loads(row['members'])] if row else None
+
+    def get_team_member(self, team_id, user_id):
+        """Gets a member of a team.
+
+        Returns:
+            Tuple (is_cached, TeamMember or None if the user is not a member).
+        """
+        members = self.get_team_members(team_id)
+        if members is None:
+            return False, None
+        return True, next((m for m in members if str(m['member']['ownerId']) == str(user_id)), None)
+
+    def get_team_open_invitations(self, team_id):
+        """Gets the open invitations of a team.
+
+        Returns:
+            List of invitations or None if the team is not cached.
+        """
+        row = self._query_one('SELECT invitations FROM teams WHERE id = ? AND loaded_at >= ?',
+                              (int(team_id), self._min_loaded_at()))
+        return json.loads(row['invitations']) if row else None
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import cProfile
+import functools
+import threading
+import tracemalloc
+import contextlib
+from collections import OrderedDict
+
+
+class Profiler:
+    """
+    Times the named phases of a run (e.g., login, view_query, acl_fetch) in aggregate and per entity,
+    and optionally profiles the run with cProfile and the peak memory of each phase with tracemalloc.
+
+    If trace_path is set each phase, each entity, and the spans added with Profiler.span (e.g., set_scope and
+    csv_flush) are written to the path as Chrome Trace Event JSON (viewable in Perfetto or chrome://tracing)
+    tagged with the entity ID and thread, to show which phases run at the same time and where the run stalls.
+
+    Phases are timed with:
+
+        with Profiler.phase('acl_fetch'):
+            ...
+
+    which does nothing unless a Profiler has been started. Phases that run on several threads at once are
+    timed on each thread, so their total can be longer than the run time. The peak memory of a phase is the peak
+    traced memory while it ran, which includes the memory of any other phases running at the same time.
+
+    The phases timed in the processes started by Utils.process_map are added to the profiler of the process that
+    started them (the other processes are not traced). cProfile only profiles the thread that started the profiler
+    in the main process, so the work done on other threads (e.g., prefetching and thread_map) and in other processes
+    is not in the cProfile stats.
+    """
+    LOGIN = 'login'
+    PROJECT_LISTING = 'project_listing'
+    VIEW_CREATION = 'view_creation'
+    VIEW_BUILD_WAIT = 'view_build_wait'
+    VIEW_QUERY = 'view_query'
+    ACL_FETCH = 'acl_fetch'
+    PRINCIPAL_RESOLUTION = 'principal_resolution'
+    TEAM_EXPANSION = 'team_expansion'
+    OUTPUT = 'output'
+
+    # Spans that are only traced.
+    ENTITY = 'entity'
+    SET_SCOPE = 'set_scope'
+    CSV_FLUSH = 'csv_flush'
+
+    # The profiler that is running in this process.
+    active = None
+
+    _NO_PHASE = contextlib.nullcontext()
+
+    def __init__(self, stats_path=None, trace_memory=False, trace_path=None):
+        """
+        Args:
+            stats_path: Path to save the cProfile stats to (readable with pstats). cProfile is not run if not set.
+            trace_memory: Trace the peak memory of each phase with tracemalloc.
+            trace_path: Path to write the Chrome Trace Event JSON to. Nothing is traced if not set.
+        """
+        self.stats_path = stats_path
+        self.trace_memory = trace_memory
+        self.trace_path = trace_path
+        self._trace_file = None
+        self._traced_thread_ids = set()
+        self._has_trace_events = False
+        self._start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Phase: [count, total seconds, max seconds, peak memory bytes].
+        self.phases = OrderedDict()
+        # Entity ID: {phase: [count, total seconds, max seconds, peak memory bytes]}.
+        self.entities = OrderedDict()
+        self._cprofile = None
+
+    def start(self):
+        if self.trace_path:
+            # The events are written as they end so large runs are not kept in memory.
+            self._trace_file = open(self.trace_path, mode='w', encoding='utf-8')
+            self._trace_file.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+            self._traced_thread_ids.clear()
+            self._has_trace_events = False
+        self._start_time = time.perf_counter()
+        if self.stats_path:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        if self.trace_memory:
+            tracemalloc.start()
+        Profiler.active = self
+        return self
+
+    def process_args(self):
+        """Gets the args to create a profiler in another process.
+        Only the phases are timed in the other process. Its timings are added with add_timings.
+        """
+        return {'trace_memory': self.trace_memory}
+
+    def take_timings(self):
+        """Gets the timings of the phases and entities and starts new timings.
+
+        Returns:
+            Tuple (phases, entities).
+        """
+        with self._lock:
+            timings = (self.phases, self.entities)
+            self.phases = OrderedDict()
+            self.entities = OrderedDict()
+        return timings
+
+    def add_timings(self, phases, entities):
+        """Adds the timings of the phases and entities from another profiler (e.g., in another process)."""
+        with self._lock:
+            all_timings = [(self.phases, phases)] + [
+                (self.entities.setdefault(entity_id, OrderedDict()), entity_phases)
+                for entity_id, entity_phases in entities.items()]
+            for timings, other_timings in all_timings:
+                for name, (count, total, max_seconds, peak) in other_timings.items():
+                    timing = timings.setdefault(name, [0, 0.0, 0.0, None])
+                    timing[0] += count
+                    timing[1] += total
+                    timing[2] = max(timing[2], max_seconds)
+                    if peak is not None:
+                        timing[3] = max(timing[3] or 0, peak)
+
+    def stop(self):
+        if Profiler.active is self:
+            Profiler.active = None
+        if self._cprofile:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.stats_path)
+            self._cprofile = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        with self._lock:
+            if self._trace_file:
+                self._trace_file.write('\n]}\n')
+                self._trace_file.close()
+                self._trace_file = None
+
+    @classmethod
+    def phase(cls, name):
+        """Times a phase if a profiler is running.
+
+        Returns:
+            Context manager.
+        """
+        profiler = cls.active
+        return profiler._time(name, profiler._current_entity()) if profiler else cls._NO_PHASE
+
+    @classmethod
+    def span(cls, name):
+        """Traces a span without adding it to the timings if a profiler is tracing.
+
+        Returns:
+            Context manager.
+        """
+        profiler = cls.active
+        if profiler and profiler._trace_file:
+            return profiler._time(name, profiler._current_entity(), aggregate=False)
+        return cls._NO_PHASE
+
+    @classmethod
+    def timed(cls, name):
+        """Decorator that times each call to a function as a phase if a profiler is running."""
+
+        def _decorator(func):
+            @functools.wraps(func)
+            def _wrapper(*args, **kwargs):
+                with cls.phase(name):
+                    return func(*args, **kwargs)
+
+            return _wrapper
+
+        return _decorator
+
+    @classmethod
+    def entity(cls, entity_id):
+        """Attributes the phases run on this thread to an entity until exited.
+
+        Returns:
+            Context manager.
+        """
+        profiler = cls.active
+        return profiler._set_entity(entity_id) if profiler else cls._NO_PHASE
+
+    @classmethod
+    def iterate(cls, name, iterable):
+        """Times each step of an iterable (e.g., loading each page of a paginated request) as a phase.
+        The steps are attributed to the current entity even if they are run on another thread.
+
+        Returns:
+            Iterable
+        """
+        profiler = cls.active
+        return profiler._iterate(name, iterable, profiler._current_entity()) if profiler else iterable
+
+    @classmethod
+    def iterate_span(cls, name, iterable):
+        """Traces each step of an iterable as a span without adding it to the timings if a profiler is tracing.
+        Only the time taken to produce each item is traced, not the time the consumer takes to use it.
+
+        Returns:
+            Iterable
+        """
+        profiler = cls.active
+        if profiler and profiler._trace_file:
+            return profiler._iterate(name, iterable, profiler._current_entity(), aggregate=False)
+        return iterable
+
+    def _current_entity(self):
+        return getattr(self._local, 'entity', None)
+
+    @contextlib.contextmanager
+    def _set_entity(self, entity_id):
+        previous = self._current_entity()
+        self._local.entity = entity_id
+        try:
+            if self._trace_file:
+                with self._time(self.ENTITY, entity_id, aggregate=False):
+                    yield
+            else:
+                yield
+        finally:
+            self._local.entity = previous
+
+    @contextlib.contextmanager
+    def _time(self, name, entity_id, aggregate=True):
+        if self.trace_memory and aggregate:
+            tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            end_time = time.perf_counter()
+            if aggregate:
+                self._add(name, entity_id, end_time - start_time)
+            if self._trace_file:
+                self._trace(name, entity_id, start_time, end_time)
+
+    def _iterate(self, name, iterable, entity_id, aggregate=True):
+        iterator = iter(iterable)
+        while True:
+            with self._time(name, entity_id, aggregate=aggregate):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def _add(self, name, entity_id, seconds):
+        peak = tracemalloc.get_traced_memory()[1] if self.trace_memory and tracemalloc.is_tracing() else None
+        with self._lock:
+            timings = [self.phases]
+            if entity_id is not None:
+                timings.append(self.entities.setdefault(entity_id, OrderedDict()))
+            for phases in timings:
+                timing = phases.setdefault(name, [0, 0.0, 0.0, None])
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+                if peak is not None:
+                    timing[3] = max(timing[3] or 0, peak)
+
+    def _trace(self, name, entity_id, start_time, end_time):
+        thread = threading.current_thread()
+        event = {'name': name,
+                 'cat': 'syn-reports',
+                 'ph': 'X',
+                 'ts': round((start_time - self._start_time) * 1000000, 1),
+                 'dur': round((end_time - start_time) * 1000000, 1),
+                 'pid': os.getpid(),
+                 'tid': thread.native_id,
+                 'args': {'entity_id': entity_id, 'thread': thread.name}}
+        with self._lock:
+            if self._trace_file is None:
+                return
+            lines = []
+            if thread.native_id not in self._traced_thread_ids:
+                self._traced_thread_ids.add(thread.native_id)
+                lines.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread.native_id,
+                              'args': {'name': thread.name}})
+            lines.append(event)
+            for line in lines:
+                if self._has_trace_events:
+                    self._trace_file.write(',\n')
+                self._trace_file.write(json.dumps(line, separators=(',', ':')))
+                self._has_trace_events = True
+
+    def print_report(self):
+        print('=' * 80)
+        print('Profile (seconds):')
+        self._print_phases(self.phases, '  ')
+        if self.entities:
+            print('Profile by entity (seconds):')
+            for entity_id, phases in self.entities.items():
+                print('  {0}:'.format(entity_id))
+                self._print_phases(phases, '    ')
+        if self.stats_path:
+            print('cProfile stats saved to: {0}'.format(self.stats_path))
+        if self.trace_path:
+            print('Trace saved to: {0}'.format(self.trace_path))
+
+    def _print_phases(self, phases, indent):
+        header = '{0}{1:<22} {2:>8} {3:>10} {4:>10} {5:>10}'.format(indent, 'phase', 'count', 'total', 'mean', 'max')
+        if self.trace_memory:
+            header += ' {0:>10}'.format('peak_mb')
+        print(header)
+        for name, (count, total, max_seconds, peak) in sorted(phases.items(), key=lambda p: -p[1][1]):
+            line = '{0}{1:<22} {2:>8} {3:>10.3f} {4:>10.3f} {5:>10.3f}'.format(indent, name, count, total,
+                                                                              total / count, max_seconds)
+            if self.trace_memory:
+                line += ' {0:>10.1f}'.format((peak or 0) / 1024 / 1024)
+            print(line)
@@ -0,0 +1,155 @@
+import argparse
+from synapsis import Synapsis
+
+
+class ReportFilter:
+    """
+    Filters the rows of the permissions reports by permission level, principal, and principal type.
+
+    The filters are checked before the principals are loaded and the teams are expanded so ACL entries
+    that cannot match are skipped without loading the principal, and a team's members and invitations
+    are only loaded if they can match.
+
+    A principal filter matches the rows of the users and teams themselves and the rows of the members
+    and invitations of the teams in the filter. Users in the filter are also matched through the teams
+    they are a member of and their open invitations to teams.
+    """
+    PRINCIPAL_TYPES = ['User', 'Team', 'Invite', 'Unknown']
+
+    def __init__(self, permission_levels=None, principals=None, principal_types=None):
+        """
+        Args:
+            permission_levels: The permission codes (e.g., ADMIN, CAN_VIEW) or names (e.g., "Administrator") to include.
+            principals: The IDs, usernames, or team names of the users and teams to include.
+            principal_types: The principal types to include. One or more of PRINCIPAL_TYPES.
+        """
+        self.permission_levels = set(ReportFilter.parse_permission_level(p) for p in permission_levels) \
+            if permission_levels else None
+        self.principals = list(principals) if principals else None
+        self.principal_types = set(principal_types) if principal_types else None
+        self.user_ids = set()
+        self.team_ids = set()
+        # The IDs of the teams the users in the filter are members of or None if they could not be loaded.
+        self._users_team_ids = set()
+        # The IDs of the teams the users in the filter are invited to or None if they could not be loaded.
+        self._users_invited_team_ids = set()
+
+    @property
+    def is_set(self):
+        return bool(self.permission_levels or self.principals or self.principal_types)
+
+    @staticmethod
+    def parse_permission_level(value):
+        """Parses a permission code (e.g., ADMIN) or name (e.g., "Can View").
+
+        Returns:
+            The permission's code.
+        """
+        for permission in Synapsis.Permissions.ALL:
+            if str(value).upper() in [permission.code.upper(), permission.name.upper()]:
+                return permission.code
+        raise argparse.ArgumentTypeError('Invalid permission level: {0}. Must be one of: {1}'.format(
+            value, ', '.join(p.code for p in Synapsis.Permissions.ALL)))
+
+    def resolve(self, utils, show_error_func):
+        """Loads the IDs of the users and teams in the principals filter.
+
+        Args:
+            utils: Utils or the Snapshot to load the users and teams from.
+            show_error_func: Function to show errors with.
+
+        Returns:
+            True if all the principals were found.
+        """
+        found_all = True
+        for id_or_name in self.principals or []:
+            user = utils.WithCache.get_user(id_or_name)
+            team = None if user else utils.WithCache.get_team(id_or_name)
+            if user:
+                user_id = str(user.ownerId)
+                self.user_ids.add(user_id)
+                if self._users_team_ids is not None:
+                    team_ids = utils.WithCache.get_users_team_ids(user_id)
+                    if team_ids is None:
+                        self._users_team_ids = None
+                    else:
+                        self._users_team_ids.update(team_ids)
+                if self._users_invited_team_ids is not None and self.includes_type('Invite'):
+                    team_ids = utils.WithCache.get_users_invited_team_ids(user_id)
+                    if team_ids is None:
+                        self._users_invited_team_ids = None
+                    else:
+                        self._users_invited_team_ids.update(team_ids)
+            elif team:
+                self.team_ids.add(str(team.id))
+            else:
+                show_error_func('Could not find user or team matching: {0}'.format(id_or_name))
+                found_all = False
+        return found_all
+
+    def includes_permission(self, permission):
+        return self.permission_levels is None or permission.code in self.permission_levels
+
+    def includes_type(self, principal_type):
+        return self.principal_types is None or principal_type in self.principal_types
+
+    def may_include_principal(self, principal_id):
+        """Gets if the rows for a principal on an ACL or its team's members can be included
+        without loading the principal.
+        """
+        if self.principals is None:
+            return True
+        principal_id = str(principal_id)
+        return (principal_id in self.user_ids or
+                principal_id in self.team_ids or
+                (bool(self.user_ids) and self.includes_type('User') and
+                 (self._users_team_ids is None or principal_id in self._users_team_ids)) or
+                self._may_include_invitations(principal_id))
+
+    def _may_include_invitations(self, team_id):
+        """Gets if a team can have open invitations for the users in the filter."""
+        return (bool(self.user_ids) and self.includes_type('Invite') and
+                (self._users_invited_team_ids is None or str(team_id) in self._users_invited_team_ids))
+
+    def includes(self, principal_type, principal_id):
+        """Gets if the row for a principal on an ACL is included."""
+        if not self.includes_type(principal_type):
+            return False
+        return self.principals is None or str(principal_id) in self.user_ids or str(principal_id) in self.team_ids
+
+    def get_team_members(self, team_id, utils):
+        """Loads the members of a team that can be included.
+
+        Returns:
+            List of team members.
+        """
+        team_id = str(team_id)
+        if not self.includes_type('User'):
+            return []
+        if self.principals is None or team_id in self.team_ids:
+            return utils.WithCache.get_team_members(team_id)
+        if self._users_team_ids is not None and team_id not in self._users_team_ids:
+            return []
+        # Only look up the users in the filter instead of loading every member.
+        team_members = []
+        for user_id in sorted(self.user_ids):
+            team_member = utils.WithCache.get_team_member(team_id, user_id)
+            if team_member:
+                team_members.append(team_member)
+        return team_members
+
+    def get_team_invitations(self, team_id, utils):
+        """Loads the open invitations of a team if they can be included.
+
+        Returns:
+            List of team invitations.
+        """
+        if not self.includes_type('Invite'):
+            return []
+        if self.principals is None or str(team_id) in self.team_ids:
+            return utils.WithCache.get_team_open_invitations(team_id)
+        if not self._may_include_invitations(team_id):
+            return []
+        # Only include the invitations of the users in the filter.
+        return [invitation for invitation in utils.WithCache.get_team_open_invitations(team_id)
+                if str(invitation.get('inviteeId')) in self.user_ids]
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict, Counter
+from synapsis import Synapsis
+from .utils import Utils
+from .profiler import Profiler
+
+
+class RunMetrics:
+    """
+    Collects the metrics of a run and writes them to a file when the run ends so scheduled runs can be monitored
+    (e.g., by the node-exporter textfile collector) without parsing the logs.
+
+    The file is written in the Prometheus text format, or as JSON if the path ends in ".json".
+    The phase durations come from a Profiler, which is started with the metrics if one is not already running.
+
+    Counters are added with:
+
+        RunMetrics.increment(RunMetrics.ROWS_WRITTEN)
+
+    which does nothing unless a RunMetrics has been started. The counters of the worker processes started by
+    Utils.process_map are added to the RunMetrics of the main process.
+    """
+    FORMAT_PROMETHEUS = 'prometheus'
+    FORMAT_JSON = 'json'
+    FORMATS = [FORMAT_PROMETHEUS, FORMAT_JSON]
+
+    ENTITIES_PROCESSED = 'entities_processed'
+    ROWS_WRITTEN = 'rows_written'
+    BYTES_WRITTEN = 'bytes_written'
+    API_CALLS = 'api_calls'
+
+    PREFIX = 'syn_reports_'
+
+    # The metrics that are running in this process.
+    active = None
+
+    def __init__(self, path, command, format=None):
+        """
+        Args:
+            path: The path to write the metrics to.
+            command: The name of the command being run.
+            format: FORMAT_PROMETHEUS or FORMAT_JSON. Defaults to the path's extension.
+        """
+        self.path = Utils.expand_path(path)
+        self.command = command
+        self.format = format or (self.FORMAT_JSON if self.path.lower().endswith('.json') else self.FORMAT_PROMETHEUS)
+        if self.format not in self.FORMATS:
+            raise ValueError('Invalid format: {0}. Must be one of: {1}'.format(self.format, ', '.join(self.FORMATS)))
+        self.counters = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._owns_profiler = False
+        self._start_time = None
+        self._start_cache_info = (0, 0)
+        # The cache (hits, misses) of the worker processes.
+        self._added_cache_info = (0, 0)
+        self._watched_sessions = []
+
+    def start(self):
+        self._start_time = time.time()
+        self._start_cache_info = Utils.WithCache.cache_info()
+        self._owns_profiler = Profiler.active is None
+        self._profiler = Profiler().start() if self._owns_profiler else Profiler.active
+        self.watch_session()
+        RunMetrics.active = self
+        return self
+
+    def stop(self):
+        if RunMetrics.active is self:
+            RunMetrics.active = None
+        if self._owns_profiler:
+            self._profiler.stop()
+
+    def process_args(self):
+        """Gets the args to start a RunMetrics with in a worker process."""
+        return {'path': self.path, 'command': self.command, 'format': self.format}
+
+    def take_counters(self):
+        """Gets the counters, errors, and cache (hits, misses) since the last call and resets them.
+
+        Returns:
+            Tuple (counters, errors, cache_info).
+        """
+        cache_info = Utils.WithCache.cache_info()
+        with self._lock:
+            counters, errors = self.counters, self.errors
+            self.counters, self.errors = Counter(), Counter()
+        taken_cache_info = tuple(n - s for n, s in zip(cache_info, self._start_cache_info))
+        self._start_cache_info = cache_info
+        return counters, errors, taken_cache_info
+
+    def add_counters(self, counters, errors, cache_info):
+        """Adds the counters taken from another RunMetrics (e.g., in a worker process)."""
+        with self._lock:
+            self.counters.update(counters)
+            self.errors.update(errors)
+            self._added_cache_info = tuple(a + n for a, n in zip(self._added_cache_info, cache_info))
+
+    @classmethod
+    def discard(cls, *names):
+        """Resets the counters (e.g., for output that is counted again when it is merged by the main process)."""
+        metrics = cls.active
+        if metrics:
+            with metrics._lock:
+                for name in names:
+                    metrics.counters.pop(name, None)
+
+    @classmethod
+    def increment(cls, name, amount=1):
+        metrics = cls.active
+        if metrics:
+            with metrics._lock:
+                metrics.counters[name] += amount
+
+    @classmethod
+    def add_error(cls, error_type, amount=1):
+        metrics = cls.active
+        if metrics:
+            with metrics._lock:
+                metrics.errors[error_type] += amount
+
+    @classmethod
+    def add_file(cls, path):
+        """Adds the size of a file that was written to the bytes written."""
+        if cls.active and path and os.path.isfile(path):
+            cls.increment(cls.BYTES_WRITTEN, os.path.getsize(path))
+
+    def login(self, login_func=None):
+        """Logs into Synapse and counts the API calls of the new session.
+
+        Args:
+            login_func: The function to log in with. Defaults to Synapsis.login.
+        """
+        (login_func or Synapsis.login)()
+        self.watch_session()
+
+    def watch_session(self):
+        """Counts the API calls and HTTP errors of the current Synapse session.
+        Must be called again after logging in since logging in creates a new session.
+        """
+        session = Synapsis.Synapse._requests_session
+        if session in self._watched_sessions:
+            return
+        self._watched_sessions.append(session)
+
+        def _on_response(response, *args, **kwargs):
+            if RunMetrics.active is self:
+                self.increment(self.API_CALLS)
+                if response.status_code >= 400:
+                    self.add_error('http_{0}'.format(response.status_code))
+            return response
+
+        session.hooks['response'].append(_on_response)
+
+    def to_dict(self, success, errors=None):
+        """Gets the metrics.
+
+        Args:
+            success: If the command finished without errors.
+            errors: The command's errors.
+        """
+        end_time = time.time()
+        hits, misses = [n - s + a for n, s, a in
+                        zip(Utils.WithCache.cache_info(), self._start_cache_info, self._added_cache_info)]
+        with self._lock:
+            error_counts = Counter(self.errors)
+            counters = Counter(self.counters)
+        if errors:
+            error_counts['report'] += len(errors)
+        phases = OrderedDict()
+        if self._profiler:
+            for name, (count, total, _, _) in self._profiler.phases.items():
+                phases[name] = {'count': count, 'seconds': round(total, 6)}
+        return OrderedDict([
+            ('command', self.command),
+            ('success', bool(success)),
+            ('start_time', round(self._start_time or end_time, 3)),
+            ('end_time', round(end_time, 3)),
+            ('duration_seconds', round(end_time - (self._start_time or end_time), 6)),
+            (self.ENTITIES_PROCESSED, counters[self.ENTITIES_PROCESSED]),
+            (self.ROWS_WRITTEN, counters[self.ROWS_WRITTEN]),
+            (self.BYTES_WRITTEN, counters[self.BYTES_WRITTEN]),
+            (self.API_CALLS, counters[self.API_CALLS]),
+            ('cache_hits', hits),
+            ('cache_misses', misses),
+            ('cache_hit_ratio', round(hits / (hits + misses), 6) if hits + misses else None),
+            ('errors', OrderedDict(sorted(error_counts.items()))),
+            ('phases', phases)
+        ])
+
+    def write(self, success, errors=None):
+        """Writes the metrics to the path. The file is replaced at once so collectors never read a partial file."""
+        metrics = self.to_dict(success, errors=errors)
+        if self.format == self.FORMAT_JSON:
+            content = json.dumps(metrics, indent=2) + '\n'
+        else:
+            content = self._to_prometheus(metrics)
+        Utils.ensure_dirs(os.path.dirname(self.path))
+        tmp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, mode='w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, self.path)
+
+    def _to_prometheus(self, metrics):
+        lines = []
+
+        def _add(name, type, help, samples):
+            name = self.PREFIX + name
+            lines.append('# HELP {0} {1}'.format(name, help))
+            lines.append('# TYPE {0} {1}'.format(name, type))
+            for labels, value in samples:
+                labels = OrderedDict([('command', self.command)] + list(labels.items()))
+                label_str = ','.join('{0}="{1}"'.format(k, self._escape(v)) for k, v in labels.items())
+                lines.append('{0}{{{1}}} {2}'.format(name, label_str, self._number(value)))
+
+        _add('last_run_success', 'gauge', 'If the last run finished without errors.',
+             [({}, 1 if metrics['success'] else 0)])
+        _add('last_run_timestamp_seconds', 'gauge', 'The time the last run ended.', [({}, metrics['end_time'])])
+        _add('run_duration_seconds', 'gauge', 'The duration of the last run.', [({}, metrics['duration_seconds'])])
+        _add(self.ENTITIES_PROCESSED, 'gauge', 'The number of entities reported on.',
+             [({}, metrics[self.ENTITIES_PROCESSED])])
+        _add(self.ROWS_WRITTEN, 'gauge', 'The number of rows written.', [({}, metrics[self.ROWS_WRITTEN])])
+        _add(self.BYTES_WRITTEN, 'gauge', 'The number of bytes written.', [({}, metrics[self.BYTES_WRITTEN])])
+        _add(self.API_CALLS, 'gauge', 'The number of Synapse API calls.', [({}, metrics[self.API_CALLS])])
+        _add('cache_hits', 'gauge', 'The number of cache hits.', [({}, metrics['cache_hits'])])
+        _add('cache_misses', 'gauge', 'The number of cache misses.', [({}, metrics['cache_misses'])])
+        if metrics['cache_hit_ratio'] is not None:
+            _add('cache_hit_ratio', 'gauge', 'The ratio of cache hits to cache lookups.',
+                 [({}, metrics['cache_hit_ratio'])])
+        _add('errors', 'gauge', 'The number of errors by type.',
+             [({'type': t}, c) for t, c in metrics['errors'].items()] or [({'type': 'report'}, 0)])
+        if metrics['phases']:
+            _add('phase_duration_seconds', 'gauge', 'The total duration of each phase.',
+                 [({'phase': p}, v['seconds']) for p, v in metrics['phases'].items()])
+            _add('phase_count', 'gauge', 'The number of times each phase ran.',
+                 [({'phase': p}, v['count']) for p, v in metrics['phases'].items()])
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @staticmethod
+    def _number(value):
+        return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import functools
+import synapseclient as syn
+from synapseclient.core.credentials.cred_data import SynapseAuthTokenCredentials
+from synapsis import Synapsis
+from .utils import Utils
+
+
+class SessionCache:
+    """
+    Reuses a logged in session and the logged in user's profile between runs so short runs do not
+    wait on logging in (the client version check and validating the auth token).
+
+    Only sessions logged in with an auth token are cached. The token itself is never written to the cache,
+    only a hash of it, so the token must still come from the command line, config file, or environment.
+    The cache is only reused if it is owned by and only readable by the current user, has not expired,
+    and was created for the same token and Synapse endpoint. If Synapse rejects the reused session
+    the cache is deleted and a new login is done.
+    """
+    DEFAULT_PATH = os.path.join('~', '.syn-reports', 'session.json')
+    DEFAULT_TTL = 15 * 60
+    VERSION = 1
+
+    def __init__(self, path=None, ttl=None):
+        self.path = Utils.expand_path(path or self.DEFAULT_PATH)
+        self.ttl = self.DEFAULT_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+
+    def login(self):
+        """Logs into Synapse with the cached session if it is valid otherwise logs in and caches the session.
+
+        Returns:
+            True if the cached session was used.
+        """
+        synapse = Synapsis.Synapse
+        # Load the config file the same way logging in does so the auth token can be found.
+        synapse.__init_self__(init_kwargs=synapse.__synapse_init_args__)
+        auth_token = self._get_auth_token()
+        if not auth_token:
+            Synapsis.login()
+            return False
+
+        token_hash = hashlib.sha256(auth_token.encode('utf-8')).hexdigest()
+        cached = self._load()
+        if (cached is not None and
+                cached.get('token_hash') == token_hash and
+                cached.get('endpoint') == synapse.repoEndpoint and
+                time.time() - cached.get('created_at', 0) < self.ttl):
+            profile = syn.UserProfile(**cached['profile'])
+            synapse.credentials = SynapseAuthTokenCredentials(auth_token, username=profile.userName)
+            Utils.WithCache.set_current_user(profile)
+            Synapsis.hooks.__call_hook__(Synapsis.hooks.AFTER_LOGIN)
+            self._login_again_on_auth_error()
+            return True
+
+        Synapsis.login()
+        profile = Synapsis.getUserProfile()
+        Utils.WithCache.set_current_user(profile)
+        self._save({
+            'version': self.VERSION,
+            'token_hash': token_hash,
+            'endpoint': synapse.repoEndpoint,
+            'created_at': time.time(),
+            'profile': dict(profile)
+        })
+        return False
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _get_auth_token(self):
+        synapse = Synapsis.Synapse
+        login_args = synapse.__build_login_args__()
+        if login_args.get('authToken'):
+            return login_args['authToken']
+        if login_args.get('email') or login_args.get('password'):
+            # Logging in with a username and password.
+            return None
+        return synapse._get_config_authentication().get('authtoken', None)
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # Do not trust a cache that could have been written or read by another user.
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            Utils.eprint('Ignoring session cache that is not private to the current user: {0}'.format(self.path))
+            return None
+        try:
+            with open(self.path, mode='r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if data.get('version') == self.VERSION else None
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, data):
+        Utils.ensure_dirs(os.path.dirname(self.path))
+        tmp_path = '{0}.tmp'.format(self.path)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        # Create the file so only the current user can read it.
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, mode='w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _login_again_on_auth_error(self):
+        """Deletes the cache and logs in again if Synapse rejects the cached session."""
+        synapse = Synapsis.Synapse
+        rest_call = functools.partial(type(synapse)._rest_call, synapse)
+
+        def _rest_call(*args, **kwargs):
+            try:
+                return rest_call(*args, **kwargs)
+            except syn.core.exceptions.SynapseHTTPError as ex:
+                if ex.response is None or ex.response.status_code != 401:
+                    raise
+            with self._lock:
+                if synapse.__dict__.get('_rest_call') is _rest_call:
+                    del synapse._rest_call
+                    Utils.eprint('Cached session was rejected. Logging in again...')
+                    self.delete()
+                    self.login()
+            return synapse._rest_call(*args, **kwargs)
+
+        synapse._rest_call = _rest_call
@@ -0,0 +1,475 @@
+import os
+import json
+import sqlite3
+import threading
+import synapseclient as syn
+from synapsis import Synapsis
+from .utils import Utils
+from .profiler import Profiler
+
+
+class Snapshot:
+    """
+    A local SQLite copy of the data the reports load from Synapse: Projects, benefactors, ACLs, teams,
+    team members, team invitations, and user profiles.
+
+    The read methods mirror the methods on Utils and Utils.WithCache so a report can load its data from a
+    Snapshot instead of Synapse by swapping one for the other.
+
+    NOTE: Only the entities that have their own ACL (and the containers above them) are stored so only Projects
+          and those entities can be reported on. Only the teams that are in an ACL are stored.
+    """
+    VERSION = 1
+
+    SCHEMA = [
+        'CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)',
+        'CREATE TABLE entities (id TEXT PRIMARY KEY, name TEXT, concrete_type TEXT, parent_id TEXT,'
+        ' project_id TEXT, created_by TEXT, has_acl INTEGER NOT NULL DEFAULT 0)',
+        'CREATE INDEX entities_name ON entities (name)',
+        'CREATE INDEX entities_parent_id ON entities (parent_id)',
+        'CREATE INDEX entities_project_id ON entities (project_id, has_acl)',
+        'CREATE TABLE ancestors (entity_id TEXT, ancestor_id TEXT, PRIMARY KEY (entity_id, ancestor_id))',
+        'CREATE INDEX ancestors_ancestor_id ON ancestors (ancestor_id)',
+        'CREATE TABLE acl (benefactor_id TEXT, principal_id INTEGER, access_types TEXT,'
+        ' PRIMARY KEY (benefactor_id, principal_id))',
+        'CREATE INDEX acl_principal_id ON acl (principal_id)',
+        'CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, last_name TEXT,'
+        ' company TEXT, location TEXT, position TEXT, emails TEXT)',
+        'CREATE INDEX users_username ON users (username COLLATE NOCASE)',
+        'CREATE TABLE teams (id INTEGER PRIMARY KEY, name TEXT)',
+        'CREATE INDEX teams_name ON teams (name)',
+        'CREATE TABLE team_members (team_id INTEGER, user_id INTEGER, is_admin INTEGER,'
+        ' PRIMARY KEY (team_id, user_id))',
+        'CREATE INDEX team_members_user_id ON team_members (user_id)',
+        'CREATE TABLE team_invitations (team_id INTEGER, invitee_id INTEGER, invitee_email TEXT)',
+        'CREATE INDEX team_invitations_team_id ON team_invitations (team_id)'
+    ]
+
+    def __init__(self, path, create=False):
+        self.path = Utils.expand_path(path)
+        if create:
+            Utils.ensure_dirs(os.path.dirname(self.path))
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        elif not os.path.isfile(self.path):
+            raise FileNotFoundError('Snapshot does not exist: {0}'.format(self.path))
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+        if create:
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+            self.set_meta('version', self.VERSION)
+        elif str(self.get_meta('version')) != str(self.VERSION):
+            raise Exception('Unsupported snapshot version: {0}. Create a new snapshot.'.format(
+                self.get_meta('version')))
+        # The ID of the root container that all Projects are in.
+        self._root_id = self.get_meta('root_id')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    # Reports load cached data from Utils.WithCache. The snapshot does not need a cache.
+    WithCache = property(lambda self: self)
+
+    def close(self):
+        if self._conn:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _query_one(self, sql, params=()):
+        rows = self._query(sql, params)
+        return rows[0] if rows else None
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    def _executemany(self, sql, rows):
+        with self._lock:
+            self._conn.executemany(sql, rows)
+
+    ####################################################################################################################
+    # Write
+    ####################################################################################################################
+
+    def set_meta(self, key, value):
+        self._execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def get_meta(self, key):
+        row = self._query_one('SELECT value FROM meta WHERE key = ?', (key,))
+        return row['value'] if row else None
+
+    def add_bundle(self, bundle):
+        """Adds an entity, its ACL, and the containers above it from an entity bundle.
+
+        Args:
+            bundle: The bundle with the entity, accessControlList, and path.
+        """
+        entity = bundle['entity']
+        entity_id = entity['id']
+        # The first item in the path is the root container and the last item is the entity.
+        path = (bundle.get('path') or {}).get('path', [])
+        if path and self._root_id is None:
+            self._root_id = path[0]['id']
+            self.set_meta('root_id', self._root_id)
+        path = path[1:]
+        project_id = path[0]['id'] if path else entity_id
+
+        parent_id = self._root_id
+        for item in path[:-1]:
+            self._add_entity(item['id'], item['name'], item['type'], parent_id, project_id)
+            self._execute('INSERT OR IGNORE INTO ancestors (entity_id, ancestor_id) VALUES (?, ?)',
+                          (entity_id, item['id']))
+            parent_id = item['id']
+
+        self._add_entity(entity_id, entity['name'], entity['concreteType'], entity.get('parentId'), project_id,
+                         created_by=entity.get('createdBy'), has_acl=bundle.get('accessControlList') is not None)
+
+        entity_acl = bundle.get('accessControlList') or {}
+        self._executemany('INSERT OR REPLACE INTO acl (benefactor_id, principal_id, access_types) VALUES (?, ?, ?)',
+                          [(entity_id, int(r['principalId']), json.dumps(sorted(r['accessType'])))
+                           for r in entity_acl.get('resourceAccess', [])])
+
+    def _add_entity(self, entity_id, name, concrete_type, parent_id, project_id, created_by=None, has_acl=False):
+        self._execute('INSERT INTO entities (id, name, concrete_type, parent_id, project_id, created_by, has_acl)'
+                      ' VALUES (?, ?, ?, ?, ?, ?, ?)'
+                      ' ON CONFLICT (id) DO UPDATE SET'
+                      ' created_by = COALESCE(excluded.created_by, created_by),'
+                      ' has_acl = MAX(excluded.has_acl, has_acl)',
+                      (entity_id, name, concrete_type, parent_id, project_id, created_by, 1 if has_acl else 0))
+
+    def add_user(self, user):
+        self._execute('INSERT OR REPLACE INTO users'
+                      ' (id, username, first_name, last_name, company, location, position, emails)'
+                      ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                      (int(user['ownerId']), user.get('userName'), user.get('firstName'), user.get('lastName'),
+                       user.get('company'), user.get('location'), user.get('position'),
+                       json.dumps(user.get('emails', []))))
+
+    def add_team(self, team, members, invitations):
+        team_id = int(team['id'])
+        self._execute('INSERT OR REPLACE INTO teams (id, name) VALUES (?, ?)', (team_id, team['name']))
+        self._executemany('INSERT OR REPLACE INTO team_members (team_id, user_id, is_admin) VALUES (?, ?, ?)',
+                          [(team_id, int(m['member']['ownerId']), 1 if m.get('isAdmin') else 0) for m in members])
+        self._executemany('INSERT INTO team_invitations (team_id, invitee_id, invitee_email) VALUES (?, ?, ?)',
+                          [(team_id, i.get('inviteeId'), i.get('inviteeEmail')) for i in invitations])
+
+    ####################################################################################################################
+    # Read (Utils)
+    ####################################################################################################################
+
+    def get_entity(self, id_or_name, show_error_func=None, only_header=False):
+        if Synapsis.is_synapse_id(id_or_name):
+            row = self._query_one('SELECT * FROM entities WHERE id = ?', (id_or_name,))
+        else:
+            # Only Projects can be found by name.
+            row = self._query_one('SELECT * FROM entities WHERE name = ? AND parent_id = ? LIMIT 1',
+                                  (id_or_name, self._root_id))
+        if row is None:
+            return None
+
+        if only_header:
+            return {
+                'id': row['id'],
+                'name': row['name'],
+                'type': row['concrete_type'],
+                'benefactorId': self.get_benefactor_id(row['id'])
+            }
+        return self._to_entity(row)
+
+    def _to_entity(self, row):
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'concreteType': row['concrete_type'],
+            'parentId': row['parent_id'],
+            'createdBy': row['created_by']
+        }
+
+    def get_benefactor_id(self, entity_id):
+        """Gets the benefactor of an entity by walking up its containers to the first one with an ACL."""
+        while entity_id is not None:
+            row = self._query_one('SELECT parent_id, has_acl FROM entities WHERE id = ?', (entity_id,))
+            if row is None:
+                return None
+            if row['has_acl']:
+                return entity_id
+            entity_id = row['parent_id']
+        return None
+
+    def get_children(self, entity_id, include_types=None):
+        """Gets the children of an entity that are in the snapshot."""
+        for row in self._query('SELECT * FROM entities WHERE parent_id = ? ORDER BY id', (entity_id,)):
+            entity = self._to_entity(row)
+            if include_types is None or Synapsis.ConcreteTypes.get(entity).name.lower() in include_types:
+                yield entity
+
+    def projects(self):
+        for row in self._query('SELECT * FROM entities WHERE parent_id = ? ORDER BY name',
+                               (self._root_id,)):
+            yield self._to_entity(row)
+
+    def users_project_access(self, user_id, **kwparams):
+        """Gets the Projects a user, or one of the user's teams, has been granted access to."""
+        principal_ids = [int(user_id)] + [int(team_id) for team_id in (self.get_users_team_ids(user_id) or [])]
+        rows = self._query('SELECT DISTINCT e.id, e.name FROM entities e JOIN acl a ON a.benefactor_id = e.id'
+                           ' WHERE e.parent_id = ? AND a.principal_id IN ({0}) ORDER BY e.name'.format(
+                               ','.join('?' * len(principal_ids))),
+                           [self._root_id] + principal_ids)
+        for row in rows:
+            yield {'id': row['id'], 'name': row['name']}
+
+    def users_teams(self, user_id):
+        for row in self._query('SELECT t.id, t.name FROM teams t JOIN team_members m ON m.team_id = t.id'
+                               ' WHERE m.user_id = ? ORDER BY t.id', (int(user_id),)):
+            yield {'id': str(row['id']), 'name': row['name']}
+
+    def all_teams(self):
+        for row in self._query('SELECT id, name FROM teams ORDER BY id'):
+            yield syn.Team(id=str(row['id']), name=row['name'])
+
+    def benefactor_view(self):
+        return SnapshotBenefactorView(self)
+
+    def get_benefactors(self, entity):
+        """Gets the unique benefactors for an entity and all its child entities.
+
+        Returns:
+            List of dicts with the benefactor_id and project_id.
+        """
+        entity_id = entity['id']
+        entity_type = Synapsis.ConcreteTypes.get(entity)
+        if entity_type.is_project:
+            rows = self._query('SELECT id, project_id FROM entities WHERE project_id = ? AND has_acl = 1'
+                               ' ORDER BY id', (entity_id,))
+        else:
+            rows = self._query('SELECT id, project_id FROM entities WHERE id = ?'
+                               ' UNION SELECT e.id, e.project_id FROM entities e'
+                               ' JOIN ancestors a ON a.entity_id = e.id'
+                               ' WHERE a.ancestor_id = ? AND e.has_acl = 1 ORDER BY id', (
+                                   self.get_benefactor_id(entity_id), entity_id))
+        return [{'benefactor_id': row['id'], 'project_id': row['project_id']} for row in rows]
+
+    def benefactors_count(self, entity_id):
+        """Gets the number of unique benefactors for an entity and all its child entities.
+        Returns None if the entity is not in the snapshot.
+        """
+        entity = self.get_entity(entity_id)
+        return len(self.get_benefactors(entity)) if entity else None
+
+    ACL_ROW_HEADERS = ['entity_type',
+                       'entity_id',
+                       'entity_name',
+                       'entity_parent_id',
+                       'entity_project_id',
+                       'principal_type',
+                       'principal_id',
+                       'principal_name',
+                       'permission_level']
+
+    def acl_rows(self, batch_size=10000):
+        """Yields a row for each principal on each ACL ordered by entity ID and principal ID.
+
+        The rows are read in batches so the ACLs do not need to fit in memory.
+
+        Returns:
+            Generator of dicts with the ACL_ROW_HEADERS keys.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT e.id, e.name, e.concrete_type, e.parent_id, e.project_id, a.principal_id, a.access_types,'
+                ' u.username, t.name AS team_name FROM acl a'
+                ' JOIN entities e ON e.id = a.benefactor_id'
+                ' LEFT JOIN users u ON u.id = a.principal_id'
+                ' LEFT JOIN teams t ON t.id = a.principal_id'
+                ' ORDER BY e.id, CAST(a.principal_id AS TEXT)')
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                entity_type = Synapsis.ConcreteTypes.get(row['concrete_type'])
+                if row['team_name'] is not None:
+                    principal_type, principal_name = 'Team', row['team_name']
+                elif row['username'] is not None:
+                    principal_type, principal_name = 'User', row['username']
+                else:
+                    principal_type, principal_name = 'Unknown', None
+                yield {
+                    'entity_type': entity_type.name,
+                    'entity_id': row['id'],
+                    'entity_name': row['name'],
+                    'entity_parent_id': None if entity_type.is_project else row['parent_id'],
+                    'entity_project_id': row['project_id'],
+                    'principal_type': principal_type,
+                    'principal_id': str(row['principal_id']),
+                    'principal_name': principal_name,
+                    'permission_level': Synapsis.Permissions.get(json.loads(row['access_types'])).name
+                }
+
+    ####################################################################################################################
+    # Read (Utils.WithCache)
+    ####################################################################################################################
+
+    def clear_cache(self):
+        pass
+
+    def get_acl(self, entity_id):
+        benefactor_id = self.get_benefactor_id(entity_id)
+        if benefactor_id is None:
+            return None
+        rows = self._query('SELECT principal_id, access_types FROM acl WHERE benefactor_id = ? ORDER BY principal_id',
+                           (benefactor_id,))
+        return {
+            'id': benefactor_id,
+            'resourceAccess': [{'principalId': row['principal_id'], 'accessType': json.loads(row['access_types'])}
+                               for row in rows]
+        }
+
+    def get_bundle(self, entity_id, **kwargs):
+        entity = self.get_entity(entity_id)
+        if entity is None:
+            return None
+        return {
+            'entity': entity,
+            'accessControlList': self.get_acl(entity_id)
+        }
+
+    def get_project_id(self, entity_id):
+        row = self._query_one('SELECT project_id FROM entities WHERE id = ?', (entity_id,))
+        return row['project_id'] if row else None
+
+    def get_user(self, username_or_id):
+        try:
+            row = self._query_one('SELECT * FROM users WHERE id = ?', (int(username_or_id),))
+        except (TypeError, ValueError):
+            row = self._query_one('SELECT * FROM users WHERE username = ? COLLATE NOCASE', (username_or_id,))
+        return self._to_user(row) if row else None
+
+    def _to_user(self, row):
+        user = syn.UserProfile(ownerId=str(row['id']),
+                               userName=row['username'],
+                               emails=json.loads(row['emails'] or '[]'))
+        for key, column in [('firstName', 'first_name'),
+                            ('lastName', 'last_name'),
+                            ('company', 'company'),
+                            ('location', 'location'),
+                            ('position', 'position')]:
+            if row[column] is not None:
+                user[key] = row[column]
+        return user
+
+    def get_users(self, user_ids, max_workers=None):
+        users = {}
+        for user_id in user_ids:
+            user = self.get_user(user_id)
+            if user:
+                users[str(user_id)] = user
+        return users
+
+    def get_team(self, team_id_or_name):
+        try:
+            row = self._query_one('SELECT * FROM teams WHERE id = ?', (int(team_id_or_name),))
+        except (TypeError, ValueError):
+            row = self._query_one('SELECT * FROM teams WHERE name = ?', (team_id_or_name,))
+        return syn.Team(id=str(row['id']), name=row['name']) if row else None
+
+    def get_user_or_team(self, user_id_or_team_id):
+        return self.get_user(user_id_or_team_id) or self.get_team(user_id_or_team_id)
+
+    TEAM_MEMBERS_SQL = ('SELECT m.team_id, m.user_id, m.is_admin, u.username, u.first_name, u.last_name'
+                        ' FROM team_members m LEFT JOIN users u ON u.id = m.user_id')
+
+    def get_team_members(self, team_id):
+        rows = self._query(self.TEAM_MEMBERS_SQL + ' WHERE m.team_id = ? ORDER BY m.user_id', (int(team_id),))
+        return [self._to_team_member(row) for row in rows]
+
+    def get_team_member(self, team_id, user_id):
+        row = self._query_one(self.TEAM_MEMBERS_SQL + ' WHERE m.team_id = ? AND m.user_id = ?',
+                              (int(team_id), int(user_id)))
+        return self._to_team_member(row) if row else None
+
+    def _to_team_member(self, row):
+        return {
+            'teamId': str(row['team_id']),
+            'member': {
+                'ownerId': str(row['user_id']),
+                'userName': row['username'],
+                'firstName': row['first_name'],
+                'lastName': row['last_name'],
+                'isIndividual': True
+            },
+            'isAdmin': bool(row['is_admin'])
+        }
+
+    def get_team_open_invitations(self, team_id):
+        rows = self._query('SELECT * FROM team_invitations WHERE team_id = ?', (int(team_id),))
+        invitations = []
+        for row in rows:
+            invitation = {'teamId': str(row['team_id'])}
+            if row['invitee_id'] is not None:
+                invitation['inviteeId'] = str(row['invitee_id'])
+            if row['invitee_email'] is not None:
+                invitation['inviteeEmail'] = row['invitee_email']
+            invitations.append(invitation)
+        return invitations
+
+    def get_users_team_ids(self, user_id):
+        return frozenset(team['id'] for team in self.users_teams(user_id))
+
+    def get_users_invited_team_ids(self, user_id):
+        return frozenset(str(row['team_id']) for row in self._query(
+            'SELECT DISTINCT team_id FROM team_invitations WHERE invitee_id = ?', (int(user_id),)))
+
+
+class SnapshotBenefactorView(list):
+    """
+    Loads the unique benefactors for a scope from a Snapshot. Used in place of a BenefactorView.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.scope = None
+        # The (benefactor_id, project_id) of each item so duplicates are skipped without searching the list.
+        self._item_keys = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+    def clear(self):
+        super().clear()
+        self._item_keys.clear()
+
+    def set_scope(self, scope, clear=True):
+        for item in self.stream_scope(scope, clear=clear):
+            self.append(item)
+
+    def stream_scope(self, scope, clear=True):
+        if clear:
+            self.clear()
+        self.scope = scope
+        with Profiler.span(Profiler.SET_SCOPE):
+            for item in self.snapshot.get_benefactors(scope):
+                key = (item['benefactor_id'], item['project_id'])
+                if key not in self._item_keys:
+                    self._item_keys.add(key)
+                    yield item
@@ -1,13 +1,27 @@
 import sys
+import argparse
 import datetime
 import functools
+import hashlib
+import json
+import multiprocessing
 import os
+import queue
+import threading
 import urllib
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import synapseclient as syn
+from synapseclient.core.credentials.cred_data import SynapseAuthTokenCredentials
 from synapsis import Synapsis
+from .profiler import Profiler
 
 
 class Utils:
+    MAX_WORKERS = (os.cpu_count() or 1) * 4
+    PREFETCH_MAXSIZE = 1000
+
     @staticmethod
     def eprint(*args, **kwargs):
         """Print to stderr"""
@@ -36,6 +50,302 @@ class Utils:
     def timestamp_str():
         return datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
 
+    @classmethod
+    def prefetch(cls, iterable, maxsize=None):
+        """Iterates an iterable on a background thread so the next items (e.g., the next page of a paginated
+        request) are loaded while the current items are being processed.
+
+        Args:
+            iterable: The iterable to prefetch.
+            maxsize: The max number of items to load ahead of the consumer.
+
+        Returns:
+            Generator
+        """
+        items = queue.Queue(maxsize=maxsize or cls.PREFETCH_MAXSIZE)
+        stopped = threading.Event()
+        done = object()
+
+        def _put(item):
+            while not stopped.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def _produce():
+            try:
+                for item in iterable:
+                    if not _put((item, None)):
+                        return
+            except Exception as ex:
+                _put((done, ex))
+                return
+            _put((done, None))
+
+        thread = threading.Thread(target=_produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item, error = items.get()
+                if error is not None:
+                    raise error
+                if item is done:
+                    break
+                yield item
+        finally:
+            stopped.set()
+
+    @classmethod
+    def thread_map(cls, func, iterable, max_workers=None):
+        """Calls func on each item in iterable using a pool of threads.
+        Results are yielded in the same order as the items in iterable and the iterable is consumed lazily.
+
+        Args:
+            func: The function to call on each item.
+            iterable: The items to call func on.
+            max_workers: The max number of threads to use.
+
+        Returns:
+            Generator
+        """
+        max_workers = max_workers or cls.MAX_WORKERS
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            try:
+                for item in iterable:
+                    pending.append(executor.submit(func, item))
+                    while pending and (pending[0].done() or len(pending) >= max_workers * 2):
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    @classmethod
+    def process_map(cls, func, iterable, processes, login=True, return_exceptions=False):
+        """Calls func on each item in iterable using a pool of processes.
+        Results are yielded in the same order as the items in iterable.
+
+        Each process logs into Synapse with its own session as the current user. If a Profiler or RunMetrics is
+        running the phases timed and the counters collected in each process are added to it.
+
+        Args:
+            func: The module level function to call on each item.
+            iterable: The items to call func on.
+            processes: The number of processes to use.
+            login: Log each process into Synapse.
+            return_exceptions: Yield the exception raised for an item instead of raising it so the results of the
+                other items are still yielded (e.g., BrokenProcessPool for the items that had not completed when
+                a process died).
+
+        Returns:
+            Generator
+        """
+        # Import here since the cassette and metrics import Utils.
+        from .cassette import Cassette
+        from .run_metrics import RunMetrics
+
+        login_args = cls.get_login_args() if login else None
+        # Record or replay the requests from each process with the cassette that is running in this process.
+        cassette_args = Cassette.active.process_args() if Cassette.active else None
+        principal_cache = cls.WithCache._principal_cache
+        profiler = Profiler.active
+        metrics = RunMetrics.active
+        with ProcessPoolExecutor(max_workers=processes,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=cls._init_process,
+                                 initargs=(login_args, cassette_args,
+                                           principal_cache.path if principal_cache else None,
+                                           profiler.process_args() if profiler else None,
+                                           metrics.process_args() if metrics else None)) as executor:
+            futures = [executor.submit(cls._call_in_process, func, item) for item in iterable]
+            try:
+                for future in futures:
+                    try:
+                        result, timings, counters = future.result()
+                    except Exception as ex:
+                        if not return_exceptions:
+                            raise
+                        yield ex
+                        continue
+                    if profiler and timings:
+                        profiler.add_timings(*timings)
+                    if metrics and counters:
+                        metrics.add_counters(*counters)
+                    yield result
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    @staticmethod
+    def _init_process(login_args, cassette_args=None, principal_cache_path=None, profiler_args=None,
+                      metrics_args=None):
+        from .cassette import Cassette
+        from .principal_cache import PrincipalCache
+        from .run_metrics import RunMetrics
+
+        if profiler_args is not None:
+            Profiler(**profiler_args).start()
+        if principal_cache_path:
+            Utils.WithCache.use_principal_cache(PrincipalCache(principal_cache_path))
+        cassette = Cassette(**cassette_args) if cassette_args else None
+        if login_args is not None:
+            Synapsis.configure(synapse_args={'multi_threaded': False}, **login_args)
+            with Profiler.phase(Profiler.LOGIN):
+                if cassette:
+                    cassette.login()
+                else:
+                    Synapsis.login()
+        if metrics_args is not None:
+            # Started after logging in so the API calls of the process's session are counted.
+            # The metrics are only written by the main process.
+            RunMetrics(**metrics_args).start()
+
+    @staticmethod
+    def _call_in_process(func, item):
+        """Calls func in a process started by process_map.
+
+        Returns:
+            Tuple (result, the timings of the call's phases or None if the process is not being profiled,
+            the call's metrics counters or None if metrics are not being collected).
+        """
+        from .run_metrics import RunMetrics
+
+        result = func(item)
+        return (result,
+                Profiler.active.take_timings() if Profiler.active else None,
+                RunMetrics.active.take_counters() if RunMetrics.active else None)
+
+    @staticmethod
+    def defer_login(login_func=None):
+        """Logs into Synapse on the first call to the Synapse REST API instead of now.
+        Synapsis must already be configured with the login args.
+
+        Args:
+            login_func: The function to log in with. Defaults to Synapsis.login.
+        """
+        synapse = Synapsis.Synapse
+        lock = threading.Lock()
+
+        def _rest_call(*args, **kwargs):
+            with lock:
+                # Remove this function so the instance uses the class's method again and only log in once.
+                if synapse.__dict__.get('_rest_call') is _rest_call:
+                    del synapse._rest_call
+                    with Profiler.phase(Profiler.LOGIN):
+                        (login_func or Synapsis.login)()
+            return synapse._rest_call(*args, **kwargs)
+
+        synapse._rest_call = _rest_call
+
+    @staticmethod
+    def get_login_args():
+        """Gets the args to log into Synapse as the current user from another process.
+        Falls back to the Synapse config file and environment variables if the user did not log in with a token.
+        """
+        credentials = getattr(Synapsis.Synapse, 'credentials', None)
+        if isinstance(credentials, SynapseAuthTokenCredentials):
+            return {'authToken': credentials.secret}
+        return {}
+
+    @staticmethod
+    def parse_shard(value):
+        """Parses a shard in the format "INDEX/COUNT" (e.g., "1/4") where INDEX starts at 1.
+
+        Returns:
+            Tuple (index, count)
+        """
+        try:
+            index, count = [int(v) for v in str(value).split('/')]
+        except ValueError:
+            raise argparse.ArgumentTypeError('Shard must be in the format INDEX/COUNT (e.g., 1/4): {0}'.format(value))
+        if count < 1 or index < 1 or index > count:
+            raise argparse.ArgumentTypeError('Shard INDEX must be between 1 and COUNT: {0}'.format(value))
+        return index, count
+
+    SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+    @classmethod
+    def parse_size(cls, value):
+        """Parses a size in bytes with an optional unit (e.g., 1048576, 500MB, 2G).
+
+        Returns:
+            The number of bytes.
+        """
+        size = str(value).strip().upper()
+        if size.endswith('B'):
+            size = size[:-1]
+        unit = size[-1:] if size[-1:] in cls.SIZE_UNITS else ''
+        try:
+            number = float(size[:len(size) - len(unit)])
+        except ValueError:
+            raise argparse.ArgumentTypeError('Invalid size: {0}'.format(value))
+        if number <= 0:
+            raise argparse.ArgumentTypeError('Size must be greater than 0: {0}'.format(value))
+        return int(number * cls.SIZE_UNITS[unit])
+
+    @staticmethod
+    def select_columns(all_columns, columns=None):
+        """Gets the columns to include in a report.
+
+        Args:
+            all_columns: All the report's columns.
+            columns: The columns to include, in the order to include them, or None to include all the columns.
+
+        Returns:
+            List of columns.
+
+        Raises:
+            ValueError if a column is not one of the report's columns.
+        """
+        if not columns:
+            return list(all_columns)
+        invalid_columns = [c for c in columns if c not in all_columns]
+        if invalid_columns:
+            raise ValueError('Invalid columns: {0}. Must be one or more of: {1}'.format(
+                ', '.join(invalid_columns), ', '.join(all_columns)))
+        return list(dict.fromkeys(columns))
+
+    @staticmethod
+    def stable_hash(key):
+        """Gets a hash of a key that is the same in every process and on every host."""
+        return int(hashlib.sha1(str(key).encode('utf-8')).hexdigest(), 16)
+
+    @classmethod
+    def select_shard(cls, keys, shard, size_func=None):
+        """Gets the keys in a shard.
+
+        Keys are assigned to shards with a stable hash so every host assigns the same keys to the same shards.
+        If size_func is set the keys are assigned largest first to the shard with the smallest total size
+        so the shards are balanced.
+
+        Args:
+            keys: The keys to split into shards.
+            shard: Tuple (index, count) of the shard to get. The index starts at 1.
+            size_func: Function that returns the estimated size of a key or None if it cannot be estimated.
+
+        Returns:
+            List of the keys in the shard in the same order as keys.
+        """
+        index, count = shard
+        if size_func is None:
+            return [key for key in keys if cls.stable_hash(key) % count == index - 1]
+
+        # Keys that cannot be estimated count as the smallest size.
+        sizes = {key: size_func(key) or 1 for key in keys}
+        totals = [0] * count
+        shard_keys = set()
+        for key in sorted(sizes, key=lambda k: (-sizes[k], cls.stable_hash(k))):
+            smallest = totals.index(min(totals))
+            totals[smallest] += sizes[key]
+            if smallest == index - 1:
+                shard_keys.add(key)
+        return [key for key in keys if key in shard_keys]
+
     @classmethod
     def get_entity(cls, id_or_name, show_error_func=None, only_header=False):
         entity = None
@@ -65,6 +375,20 @@ class Utils:
                 raise
         return entity
 
+    @classmethod
+    def get_children(cls, entity_id, include_types=None):
+        """Gets the children of a container.
+
+        Args:
+            entity_id: The ID of the container.
+            include_types: The types of children to get.
+
+        Returns:
+            Generator
+        """
+        for child in Synapsis.getChildren(entity_id, includeTypes=include_types):
+            yield child
+
     @classmethod
     def users_project_access(cls, user_id, **kwparams):
         """ Gets the Projects a user has access to.
@@ -85,39 +409,173 @@ class Utils:
             url_params = urllib.parse.urlencode(request)
             uri = '/projects/user/{0}?{1}'.format(user_id, url_params)
 
-            response = Synapsis.Synapse.restGET(uri)
+            with Profiler.phase(Profiler.PROJECT_LISTING):
+                response = Synapsis.Synapse.restGET(uri)
             for child in response['results']:
                 yield child
             request['nextPageToken'] = response.get('nextPageToken', None)
 
     @classmethod
-    def users_teams(cls, user_id):
+    def users_teams(cls, user_id, limit=20):
         """Gets all the teams a user is part of.
 
+        https://rest-docs.synapse.org/rest/GET/user/id/team.html
+
         Args:
             user_id:
+            limit: The number of teams to load per page.
 
         Returns:
+            Generator
+
+        Raises:
+            ValueError if fewer or more teams were loaded than the total reported by Synapse.
+        """
+        offset = 0
+        total = None
+        while True:
+            page = Synapsis.restGET('/user/{0}/team?limit={1}&offset={2}'.format(user_id, limit, offset))
+            results = page.get('results', [])
+            total = page.get('totalNumberOfResults', total)
+            for item in results:
+                offset += 1
+                yield item
+            if not results:
+                break
+        # The total on the last page is the total even where Synapse only uses it to show there are more pages.
+        if total is not None and offset != total:
+            raise ValueError('Loaded {0} of {1} teams for user: {2}'.format(offset, total, user_id))
+
+    @classmethod
+    def all_teams(cls):
+        """Gets all the teams in Synapse.
 
+        https://rest-docs.synapse.org/rest/GET/teams.html
+
+        Returns:
+            Generator
         """
-        for item in Synapsis._GET_paginated('/user/{0}/team/'.format(user_id)):
+        for item in Synapsis._GET_paginated('/teams'):
             yield item
 
     class WithCache:
         LRU_MAXSIZE = (os.cpu_count() or 1) * 16
+        USER_PROFILE_BATCH_SIZE = 100
+        # The max number of user profiles to keep. The least recently loaded profiles are removed first.
+        USER_PROFILES_MAXSIZE = 50000
+
+        # User profiles loaded in batches, keyed by user ID.
+        _user_profiles = OrderedDict()
+        _user_profiles_lock = threading.Lock()
+
+        # The profile of the logged in user.
+        _current_user = None
+
+        # The PrincipalCache to load teams, team members, and user profiles from before loading them from Synapse.
+        _principal_cache = None
+
+        # The (hits, misses) of the caches replaced by cache_size.
+        _replaced_cache_info = (0, 0)
+
+        @classmethod
+        def use_principal_cache(cls, principal_cache):
+            """Loads teams, team members, team invitations, and user profiles from a PrincipalCache (saved by the
+            warm-cache command) before loading them from Synapse.
+
+            Args:
+                principal_cache: The PrincipalCache or None to only load from Synapse.
+            """
+            cls._principal_cache = principal_cache
+            cls.clear_cache()
 
         @classmethod
         def clear_cache(cls):
-            for method in [
+            with cls._user_profiles_lock:
+                cls._user_profiles.clear()
+            cls._current_user = None
+            for method in cls._cached_methods():
+                method.cache_clear()
+
+        @classmethod
+        def refresh_cache(cls, max_user_profiles=None, max_workers=None):
+            """Clears the caches and loads the most recently loaded user profiles again so they stay loaded.
+            Everything else is loaded again when it is next used.
+
+            Args:
+                max_user_profiles: The max number of user profiles to load again.
+                max_workers: The max number of threads to load the user profiles with.
+
+            Returns:
+                The number of user profiles that were loaded again.
+            """
+            with cls._user_profiles_lock:
+                user_ids = [user_id for user_id, user in cls._user_profiles.items() if user is not None]
+            if max_user_profiles is not None:
+                user_ids = user_ids[-max_user_profiles:] if max_user_profiles > 0 else []
+            cls.clear_cache()
+            return len(cls.get_users(user_ids, max_workers=max_workers))
+
+        @classmethod
+        @contextmanager
+        def cache_size(cls, maxsize):
+            """Keeps up to maxsize results in each cached method instead of LRU_MAXSIZE until exited
+            (e.g., while a batch of reports is run or reports are served). The caches are cleared.
+
+            Args:
+                maxsize: The max number of results to keep in each cached method or None to keep every result.
+            """
+            previous_maxsize = cls.get_bundle.cache_parameters()['maxsize']
+            cls._set_cache_size(maxsize)
+            try:
+                yield
+            finally:
+                cls._set_cache_size(previous_maxsize)
+
+        @classmethod
+        def _set_cache_size(cls, maxsize):
+            # Keep counting the hits and misses of the replaced caches.
+            cls._replaced_cache_info = cls.cache_info()
+            for method in cls._cached_methods():
+                setattr(cls, method.__name__,
+                        classmethod(functools.lru_cache(maxsize=maxsize, typed=True)(method.__wrapped__)))
+
+        @classmethod
+        def cache_info(cls):
+            """Gets the number of cache hits and misses of all the cached methods.
+
+            Returns:
+                Tuple (hits, misses)
+            """
+            infos = [method.cache_info() for method in cls._cached_methods()]
+            hits, misses = cls._replaced_cache_info
+            return hits + sum(i.hits for i in infos), misses + sum(i.misses for i in infos)
+
+        @classmethod
+        def _cached_methods(cls):
+            return [
                 cls.get_bundle,
+                cls.get_acl,
                 cls.get_project_id,
                 cls.get_user,
                 cls.get_team,
                 cls.get_user_or_team,
                 cls.get_team_members,
-                cls.get_team_open_invitations
-            ]:
-                method.cache_clear()
+                cls.get_team_member,
+                cls.get_team_open_invitations,
+                cls.get_users_team_ids,
+                cls.get_users_invited_team_ids
+            ]
+
+        @classmethod
+        def get_current_user(cls):
+            """Gets the profile of the logged in user."""
+            if cls._current_user is None:
+                cls._current_user = Synapsis.getUserProfile()
+            return cls._current_user
+
+        @classmethod
+        def set_current_user(cls, user):
+            cls._current_user = user
 
         @classmethod
         @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
@@ -127,6 +585,21 @@ class Utils:
             except (ValueError, syn.core.exceptions.SynapseHTTPError):
                 return None
 
+        @classmethod
+        @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
+        def get_acl(cls, entity_id):
+            """Gets the ACL for an entity.
+            NOTE: Do not use syn._getACL() as it will raise an error if the entity inherits its ACL and
+            it is slower as it will make an API call to get the benefactorId.
+
+            Args:
+                entity_id: The ID of the entity. This must be the entity's benefactor.
+            """
+            try:
+                return Synapsis.restGET('/entity/{0}/acl'.format(entity_id))
+            except (ValueError, syn.core.exceptions.SynapseHTTPError):
+                return None
+
         @classmethod
         @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
         def get_project_id(cls, entity_id):
@@ -138,14 +611,88 @@ class Utils:
         @classmethod
         @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
         def get_user(cls, username_or_id):
+            user = cls._user_profiles.get(str(username_or_id))
+            if user is not None:
+                return user
+            if cls._principal_cache:
+                user = cls._principal_cache.get_user(username_or_id)
+                if user is not None:
+                    return user
             try:
                 return Synapsis.getUserProfile(username_or_id, refresh=True)
             except (ValueError, syn.core.exceptions.SynapseHTTPError):
                 return None
 
+        @classmethod
+        def get_users(cls, user_ids, max_workers=None):
+            """Gets the user profiles for a list of user IDs.
+            Profiles that have not been loaded are fetched in batches using a pool of threads
+            and each profile is only fetched once.
+
+            https://rest-docs.synapse.org/rest/POST/userProfile.html
+
+            Args:
+                user_ids: The IDs of the users to get.
+                max_workers: The max number of threads to use.
+
+            Returns:
+                Dict of user ID to UserProfile. Users that cannot be found are not included.
+            """
+            user_ids = [str(user_id) for user_id in dict.fromkeys(user_ids)]
+            # Keep the profiles for this call separately since they can be removed from the cache before returning.
+            users = {}
+            with cls._user_profiles_lock:
+                for user_id in user_ids:
+                    if user_id in cls._user_profiles:
+                        users[user_id] = cls._user_profiles[user_id]
+            missing_ids = [user_id for user_id in user_ids if user_id not in users]
+            if cls._principal_cache and missing_ids:
+                cached = cls._principal_cache.get_users(missing_ids)
+                users.update(cached)
+                cls._add_user_profiles(cached)
+                missing_ids = [user_id for user_id in missing_ids if user_id not in cached]
+            batches = [missing_ids[i:i + cls.USER_PROFILE_BATCH_SIZE]
+                       for i in range(0, len(missing_ids), cls.USER_PROFILE_BATCH_SIZE)]
+
+            for batch, profiles in zip(batches, Utils.thread_map(cls._get_user_profiles_batch, batches,
+                                                                 max_workers=max_workers)):
+                # Users that were not found are stored as None so they are not fetched again.
+                loaded = dict.fromkeys(batch)
+                loaded.update((str(profile['ownerId']), profile) for profile in profiles)
+                users.update(loaded)
+                cls._add_user_profiles(loaded)
+
+            return {user_id: users[user_id] for user_id in user_ids if users.get(user_id)}
+
+        @classmethod
+        def _add_user_profiles(cls, users):
+            with cls._user_profiles_lock:
+                cls._user_profiles.update(users)
+                while len(cls._user_profiles) > cls.USER_PROFILES_MAXSIZE:
+                    cls._user_profiles.popitem(last=False)
+
+        @classmethod
+        def _get_user_profiles_batch(cls, user_ids):
+            try:
+                response = Synapsis.restPOST('/userProfile', body=json.dumps({'list': user_ids}))
+                return [syn.UserProfile(**profile) for profile in response.get('list', [])]
+            except (ValueError, syn.core.exceptions.SynapseHTTPError):
+                # Fall back to loading each user so a single bad ID does not fail the batch.
+                profiles = []
+                for user_id in user_ids:
+                    try:
+                        profiles.append(Synapsis.getUserProfile(user_id, refresh=True))
+                    except (ValueError, syn.core.exceptions.SynapseHTTPError):
+                        pass
+                return profiles
+
         @classmethod
         @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
         def get_team(cls, team_id_or_name):
+            if cls._principal_cache:
+                team = cls._principal_cache.get_team(team_id_or_name)
+                if team is not None:
+                    return team
             try:
                 return Synapsis.getTeam(team_id_or_name)
             except (ValueError, syn.core.exceptions.SynapseHTTPError):
@@ -160,15 +707,69 @@ class Utils:
         @classmethod
         @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
         def get_team_members(cls, team_id):
+            if cls._principal_cache:
+                members = cls._principal_cache.get_team_members(team_id)
+                if members is not None:
+                    return members
             try:
                 return list(Synapsis.getTeamMembers(team_id))
             except (ValueError, syn.core.exceptions.SynapseHTTPError):
                 return []
 
+        @classmethod
+        @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
+        def get_team_member(cls, team_id, user_id):
+            if cls._principal_cache:
+                is_cached, member = cls._principal_cache.get_team_member(team_id, user_id)
+                if is_cached:
+                    return member
+            try:
+                return Synapsis.restGET('/team/{0}/member/{1}'.format(team_id, user_id))
+            except syn.core.exceptions.SynapseHTTPError as ex:
+                # A 404 error is raised if the team does not exist or the user is not a member.
+                # Other errors are raised so they are not reported as the user not being a member.
+                if ex.response is not None and ex.response.status_code == 404:
+                    return None
+                raise
+
         @classmethod
         @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
         def get_team_open_invitations(cls, team_id):
+            if cls._principal_cache:
+                invitations = cls._principal_cache.get_team_open_invitations(team_id)
+                if invitations is not None:
+                    return invitations
             try:
                 return list(Synapsis.get_team_open_invitations(team_id))
             except (ValueError, syn.core.exceptions.SynapseHTTPError):
                 return []
+
+        @classmethod
+        @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
+        def get_users_team_ids(cls, user_id):
+            """Gets the IDs of all the teams a user is part of.
+
+            Returns:
+                frozenset of team IDs or None if the user's teams could not be fully loaded
+                (including if fewer teams were loaded than the total reported by Synapse).
+            """
+            try:
+                return frozenset(str(team['id']) for team in Utils.users_teams(user_id))
+            except (ValueError, syn.core.exceptions.SynapseHTTPError):
+                return None
+
+        @classmethod
+        @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
+        def get_users_invited_team_ids(cls, user_id):
+            """Gets the IDs of the teams a user has an open invitation to.
+
+            https://rest-docs.synapse.org/rest/GET/user/id/openInvitation.html
+
+            Returns:
+                frozenset of team IDs or None if the user's invitations could not be loaded.
+            """
+            try:
+                return frozenset(str(invitation['teamId'])
+                                 for invitation in Synapsis._GET_paginated('/user/{0}/openInvitation'.format(user_id)))
+            except (ValueError, syn.core.exceptions.SynapseHTTPError):
+                return None
@@ -1,11 +1,38 @@
 import pytest
 import os
 import csv
+import gzip
+from concurrent.futures.process import BrokenProcessPool
 from syn_reports.commands.benefactor_permissions_report import BenefactorPermissionsReport
-from syn_reports.core import Utils
+from syn_reports.core import Utils, Snapshot, Profiler, RunMetrics
 from synapsis import Synapsis
 
 
+@pytest.fixture()
+def snapshot_path(tmp_path):
+    path = os.path.join(tmp_path, 'snapshot.db')
+    root = {'id': 'syn4489', 'name': 'root', 'type': 'org.sagebionetworks.repo.model.Folder'}
+    with Snapshot(path, create=True) as snapshot:
+        for number, principal_id in [(1, 200), (2, None), (3, 100)]:
+            project = {'id': 'syn{0}'.format(number), 'name': 'Project{0}'.format(number),
+                       'type': 'org.sagebionetworks.repo.model.Project'}
+            snapshot.add_bundle({
+                'entity': {'id': project['id'], 'name': project['name'], 'concreteType': project['type'],
+                           'parentId': root['id']},
+                'path': {'path': [root, project]},
+                'accessControlList': {'id': project['id'], 'resourceAccess': [
+                    {'principalId': principal_id, 'accessType': ['READ']}] if principal_id else []}
+            })
+        snapshot.add_user({'ownerId': '100', 'userName': 'user100'})
+        snapshot.add_user({'ownerId': '101', 'userName': 'user101'})
+        snapshot.add_team({'id': '200', 'name': 'Team200'},
+                          [{'member': {'ownerId': '100', 'userName': 'user100'}, 'isAdmin': True},
+                           {'member': {'ownerId': '101', 'userName': 'user101'}, 'isAdmin': False}],
+                          [{'inviteeEmail': 'd@e.f'}])
+        snapshot.commit()
+    return path
+
+
 def assert_success_from_print(capsys, *entities):
     captured = capsys.readouterr()
     assert captured.err == ''
@@ -90,6 +117,99 @@ def test_it_creates_csv_files_for_each_entity(capsys, synapse_test_helper, syn_p
             assert_success_from_csv(csv_file, syn_project2)
 
 
+def test_it_reports_in_processes(synapse_test_helper, syn_project, syn_project2):
+    out_dir = synapse_test_helper.create_temp_dir()
+    csv_path = os.path.join(out_dir, 'one-process.csv')
+    BenefactorPermissionsReport([syn_project.id, syn_project2.id], out_path=csv_path).execute()
+
+    processes_csv_path = os.path.join(out_dir, 'processes.csv')
+    report = BenefactorPermissionsReport([syn_project.id, syn_project2.id], out_path=processes_csv_path,
+                                         processes=2).execute()
+    assert report.errors == []
+    assert report.csv_files_created == [processes_csv_path]
+    with open(csv_path) as f1, open(processes_csv_path) as f2:
+        assert f1.read() == f2.read()
+    # The shard files are removed.
+    assert sorted(os.listdir(out_dir)) == ['one-process.csv', 'processes.csv']
+
+
+def test_it_merges_the_completed_shards_if_a_process_dies(synapse_test_helper, syn_project, syn_project2, mocker):
+    def _process_map(func, shard_args, processes, login=True, return_exceptions=False):
+        yield func(shard_args[0])
+        yield BrokenProcessPool('A process in the process pool was terminated abruptly')
+
+    mocker.patch.object(Utils, 'process_map', side_effect=_process_map)
+    out_dir = synapse_test_helper.create_temp_dir()
+    csv_path = os.path.join(out_dir, 'processes.csv')
+    report = BenefactorPermissionsReport([syn_project.id, syn_project2.id], out_path=csv_path,
+                                         processes=2).execute()
+    assert report.errors == [
+        'ERROR: A process terminated abruptly. Shard 2 of 2 was not reported: {0}'.format(syn_project2.id)]
+    assert_success_from_csv(csv_path, syn_project)
+    assert sorted(os.listdir(out_dir)) == ['processes.csv']
+
+
+def test_it_creates_csv_files_for_each_entity_in_processes(synapse_test_helper, syn_project, syn_project2):
+    out_dir = synapse_test_helper.create_temp_dir()
+    report = BenefactorPermissionsReport([syn_project.id, syn_project2.id], out_path=out_dir,
+                                         out_file_per_entity=True, processes=2).execute()
+    assert report.errors == []
+    assert len(report.csv_files_created) == 2
+    assert_success_from_csv(report.csv_files_created[0], syn_project)
+    assert_success_from_csv(report.csv_files_created[1], syn_project2)
+
+
+def test_it_outputs_compressed_csv_files(synapse_test_helper, syn_project, syn_project2):
+    out_dir = synapse_test_helper.create_temp_dir()
+    report = BenefactorPermissionsReport([syn_project.id, syn_project2.id], out_path=out_dir,
+                                         out_file_per_entity=True, compress='gzip').execute()
+    assert len(report.csv_files_created) == 2
+    for csv_file, entity in zip(report.csv_files_created, [syn_project, syn_project2]):
+        assert csv_file.endswith('.csv.gz')
+        with gzip.open(csv_file, mode='rt') as f:
+            assert entity.id in f.read()
+
+
+def test_it_outputs_normalized_csv_files(synapse_test_helper, syn_project):
+    project_team = synapse_test_helper.create_team()
+    Synapsis.Utils.set_entity_permission(syn_project, project_team, Synapsis.Permissions.CAN_EDIT_AND_DELETE,
+                                         warn_if_inherits=False)
+    out_file = os.path.join(synapse_test_helper.create_temp_dir(), 'outfile.csv')
+    report = BenefactorPermissionsReport(syn_project.id, out_path=out_file, normalized=True).execute()
+    assert report.errors == []
+    assert [os.path.basename(p) for p in report.csv_files_created] == [
+        'outfile-acl_entries.csv', 'outfile-principals.csv', 'outfile-team_members.csv',
+        'outfile-team_invitations.csv']
+
+    tables = {}
+    for path in report.csv_files_created:
+        with open(path, newline='') as f:
+            tables[path.rsplit('-', 1)[1][:-len('.csv')]] = list(csv.DictReader(f))
+    principal_ids = [r['principal_id'] for r in tables['principals']]
+    assert len(principal_ids) == len(set(principal_ids))
+    for row in tables['acl_entries']:
+        assert row['entity_id'] == syn_project.id
+        assert row['principal_id'] in principal_ids
+    assert project_team.id in [r['team_id'] for r in tables['team_members']]
+
+
+def test_it_filters_by_permission_level_and_principal_type(synapse_test_helper, syn_project):
+    project_team = synapse_test_helper.create_team()
+    Synapsis.Utils.set_entity_permission(syn_project, project_team, Synapsis.Permissions.CAN_EDIT_AND_DELETE,
+                                         warn_if_inherits=False)
+    out_file = os.path.join(synapse_test_helper.create_temp_dir(), 'outfile.csv')
+    report = BenefactorPermissionsReport(syn_project.id, out_path=out_file,
+                                         permission_levels=['CAN_EDIT_AND_DELETE'],
+                                         principal_types=['Team']).execute()
+    assert report.errors == []
+    with open(out_file, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert project_team.id in [r['team_id'] for r in rows]
+    for row in rows:
+        assert row['permission_level'] == Synapsis.Permissions.CAN_EDIT_AND_DELETE.name
+        assert row['principal_type'] == 'Team'
+
+
 def test_it_uses_the_out_file_prefix(capsys, synapse_test_helper, syn_project):
     out_dir = synapse_test_helper.create_temp_dir()
     prefix = 'ZzZzZzZz--'
@@ -170,6 +290,94 @@ def test_it_outputs_team_invites_by_user_to_csv(synapse_test_helper, syn_project
     assert csv_passed is True
 
 
+def test_it_outputs_the_team_invites_after_each_member_if_not_filtered(tmp_path, snapshot_path):
+    def invite_rows(**kwargs):
+        out_file = os.path.join(tmp_path, 'outfile.csv')
+        BenefactorPermissionsReport('syn1', out_path=out_file, from_snapshot=snapshot_path, **kwargs).execute()
+        with open(out_file, newline='') as f:
+            return [(row['username'], row['is_team_manager']) for row in csv.DictReader(f)
+                    if row['principal_type'] == 'Invite']
+
+    # The invitations are listed for each member of the team.
+    assert invite_rows() == [('d@e.f', 'True'), ('d@e.f', 'False')]
+    # The invitations are listed once for the team if filtered.
+    assert invite_rows(principal_types=['Invite']) == [('d@e.f', '')]
+
+
+
+def test_it_outputs_the_invited_user_id_if_the_profile_is_not_loaded(capsys, tmp_path, snapshot_path):
+    with Snapshot(snapshot_path) as snapshot:
+        snapshot.add_team({'id': '200', 'name': 'Team200'}, [], [{'inviteeId': '101'}])
+        snapshot.commit()
+    BenefactorPermissionsReport('syn1', out_path=os.path.join(tmp_path, 'report.csv'), from_snapshot=snapshot_path,
+                                columns=['entity_id', 'principal_type', 'team_id', 'user_id']).execute()
+    out = capsys.readouterr().out
+    assert 'Invited User ID: 101' in out
+    assert 'None' not in out
+
+
+def test_it_reports_on_each_project_as_it_is_listed(capsys, snapshot_path, mocker):
+    spy = mocker.spy(Utils, 'prefetch')
+    BenefactorPermissionsReport(None, from_snapshot=snapshot_path).execute()
+    spy.assert_called_once()
+    lines = [line for line in capsys.readouterr().out.splitlines()
+             if line.startswith(('  - Adding Project', 'Reporting on'))]
+    assert lines == [
+        '  - Adding Project: Project1 (syn1)',
+        'Reporting on Project: Project1 (syn1) [1]',
+        '  - Adding Project: Project2 (syn2)',
+        'Reporting on Project: Project2 (syn2) [2]',
+        '  - Adding Project: Project3 (syn3)',
+        'Reporting on Project: Project3 (syn3) [3]'
+    ]
+
+
+def test_it_profiles_the_processes(tmp_path, snapshot_path):
+    timings = []
+    for processes in [None, 2]:
+        profiler = Profiler().start()
+        try:
+            report = BenefactorPermissionsReport(None, out_path=os.path.join(tmp_path, 'report.csv'),
+                                                 from_snapshot=snapshot_path, processes=processes).execute()
+        finally:
+            profiler.stop()
+        assert report.errors == []
+        timings.append(({name: timing[0] for name, timing in profiler.phases.items()}, list(profiler.entities)))
+    # The phases timed in each process are added to the profiler.
+    assert timings[0][0][Profiler.ACL_FETCH] == 3
+    assert timings[1] == timings[0]
+
+
+
+def test_it_collects_the_metrics_of_the_processes(tmp_path, snapshot_path):
+    results = []
+    for processes in [None, 2]:
+        metrics = RunMetrics(os.path.join(tmp_path, 'metrics.json'), 'benefactor-permissions').start()
+        try:
+            report = BenefactorPermissionsReport(None, out_path=os.path.join(tmp_path, 'report.csv'),
+                                                 from_snapshot=snapshot_path, processes=processes).execute()
+        finally:
+            metrics.stop()
+        assert report.errors == []
+        result = metrics.to_dict(True)
+        results.append({name: result[name] for name in [RunMetrics.ENTITIES_PROCESSED, RunMetrics.ROWS_WRITTEN,
+                                                        RunMetrics.BYTES_WRITTEN, 'errors']})
+    assert results[0][RunMetrics.ENTITIES_PROCESSED] == 3
+    assert results[0][RunMetrics.ROWS_WRITTEN] > 0
+    # The counters of each process are added to the metrics and the merged shards are only counted once.
+    assert results[1] == results[0]
+
+
+
+def test_it_loads_each_team_members_profile_once_for_normalized_output(tmp_path, snapshot_path, mocker):
+    get_user = mocker.spy(Snapshot, 'get_user')
+    report = BenefactorPermissionsReport(None, out_path=os.path.join(tmp_path, 'report.csv'),
+                                         from_snapshot=snapshot_path, normalized=True).execute()
+    assert report.errors == []
+    # The member of team 200 is only loaded for the principals table.
+    assert [c.args[1] for c in get_user.call_args_list].count('101') == 1
+
+
 def test_it_outputs_team_invites_by_email_to_csv(synapse_test_helper, syn_project):
     project_team = synapse_test_helper.create_team()
     assert Synapsis.Utils.set_entity_permission(syn_project, project_team, Synapsis.Permissions.CAN_EDIT_AND_DELETE,
@@ -219,3 +427,34 @@ def test_it_does_not_raise_error_on_projects_not_found(capsys, synapse_test_help
         BenefactorPermissionsReport(id_or_name).execute()
         captured = capsys.readouterr()
         assert 'Entity does not exist or you do not have access to the entity:' in captured.err
+
+
+def test_it_only_outputs_the_columns(synapse_test_helper, syn_project, mocker):
+    project_team = synapse_test_helper.create_team()
+    Synapsis.Utils.set_entity_permission(syn_project, project_team, Synapsis.Permissions.CAN_EDIT_AND_DELETE,
+                                         warn_if_inherits=False)
+    Utils.WithCache.clear_cache()
+    spy_get_user = mocker.spy(Utils.WithCache, 'get_user')
+
+    out_file = os.path.join(synapse_test_helper.create_temp_dir(), 'outfile.csv')
+    report = BenefactorPermissionsReport(syn_project.id, out_path=out_file,
+                                         columns=['entity_id', 'principal_type', 'team_id', 'user_id'])
+    report.execute()
+    assert not report.errors
+    with open(out_file, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        assert reader.fieldnames == ['entity_id', 'principal_type', 'team_id', 'user_id']
+        rows = list(reader)
+    assert {'entity_id': syn_project.id, 'principal_type': 'Team', 'team_id': project_team.id, 'user_id': ''} in rows
+    # The team's members are written from the team's roster without loading their profiles.
+    member_ids = [r['user_id'] for r in rows if r['principal_type'] == 'User' and r['team_id'] == project_team.id]
+    assert member_ids
+    assert not any(str(c.args[0]) in member_ids for c in spy_get_user.call_args_list)
+
+
+def test_it_does_not_output_invalid_columns(capsys, synapse_test_helper, syn_project):
+    out_file = os.path.join(synapse_test_helper.create_temp_dir(), 'outfile.csv')
+    report = BenefactorPermissionsReport(syn_project.id, out_path=out_file, columns=['entity_id', 'nope'])
+    report.execute()
+    assert 'Invalid columns: nope' in capsys.readouterr().err
+    assert not os.path.exists(out_file)
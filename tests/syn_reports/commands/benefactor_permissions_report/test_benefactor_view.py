@@ -1,4 +1,5 @@
 import pytest
+import synapseclient as syn
 from synapseclient.core.exceptions import SynapseHTTPError
 from syn_reports.commands.benefactor_permissions_report import BenefactorView
 from synapsis import Synapsis
@@ -133,7 +134,67 @@ def test_it_falls_back_to_individual_loading(benefactor_view, test_data, mocker)
 
 
 def test_it_does_not_add_duplicate_items(benefactor_view):
-    benefactor_view._add_item('1', '2')
-    benefactor_view._add_item('1', '2')
-    benefactor_view._add_item('1', '2')
-    assert len(benefactor_view) == 1
+    assert [benefactor_view._new_item('1', '2') for _ in range(3)] == [{'benefactor_id': '1', 'project_id': '2'},
+                                                                       None, None]
+
+
+def test_it_shares_the_view_project(mocker):
+    mock_store = mocker.patch.object(syn.Synapse, 'store', return_value='shared-project')
+    mock_delete = mocker.patch.object(Synapsis.Utils, 'delete_skip_trash')
+    with BenefactorView.share_view_project():
+        with BenefactorView() as bv1, BenefactorView() as bv2:
+            assert bv1.ensure_view_project() == 'shared-project'
+            assert bv2.ensure_view_project() == 'shared-project'
+        mock_store.assert_called_once()
+        mock_delete.assert_not_called()
+    mock_delete.assert_called_once_with('shared-project')
+
+
+def test_it_streams_the_view_query_results(mocker):
+    headers = [syn.table.SelectColumn(name=BenefactorView.COL_PROJECTID, columnType='ENTITYID'),
+               syn.table.SelectColumn(name=BenefactorView.COL_BENEFACTORID, columnType='ENTITYID')]
+    rows = [syn.Row(['syn1', 'syn1']), syn.Row(['syn1', 'syn2']), syn.Row(['syn1', 'syn2'])]
+    query_result = mocker.Mock(headers=headers, __iter__=lambda self: iter(rows))
+    mock_table_query = mocker.patch.object(syn.Synapse, 'tableQuery', return_value=query_result)
+
+    bv = BenefactorView()
+    items = bv._query_view(mocker.Mock(id='syn3'))
+    assert next(items) == {'benefactor_id': 'syn1', 'project_id': 'syn1'}
+    assert len(bv) == 1
+    assert list(items) == [{'benefactor_id': 'syn2', 'project_id': 'syn1'}]
+    assert len(bv) == 2
+    assert mock_table_query.call_args.kwargs['resultsAs'] == 'rowset'
+
+
+def test_it_deletes_the_views_in_a_project_it_does_not_own(mocker):
+    view = mocker.Mock(id='syn9')
+    mocker.patch.object(BenefactorView, '_create_view', return_value=view)
+    mocker.patch.object(BenefactorView, '_query_view', side_effect=lambda v: iter([{'benefactor_id': 'syn1'}]))
+    mock_delete = mocker.patch.object(Synapsis.Utils, 'delete_skip_trash')
+
+    bv = BenefactorView()
+    bv.view_project = 'project'
+    assert list(bv._create_folder_and_file_view()) == [{'benefactor_id': 'syn1'}]
+    # The view is deleted with the Project.
+    mock_delete.assert_not_called()
+
+    bv = BenefactorView(view_project='shared-project')
+    assert list(bv._create_folder_and_file_view()) == [{'benefactor_id': 'syn1'}]
+    mock_delete.assert_called_once_with(view)
+
+
+def test_it_only_keeps_the_keys_of_the_streamed_items(mocker):
+    benefactor_view = BenefactorView()
+
+    def _load():
+        for benefactor_id in ['syn1', 'syn2', 'syn1']:
+            item = benefactor_view._new_item(benefactor_id, 'syn1')
+            if item:
+                yield item
+
+    mocker.patch.object(benefactor_view, 'load', side_effect=_load)
+    assert [item['benefactor_id'] for item in benefactor_view.stream_scope('syn1')] == ['syn1', 'syn2']
+    assert len(benefactor_view) == 0
+
+    benefactor_view.set_scope('syn1')
+    assert [item['benefactor_id'] for item in benefactor_view] == ['syn1', 'syn2']
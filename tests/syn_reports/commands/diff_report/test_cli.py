@@ -0,0 +1,21 @@
+import os
+import csv
+
+
+def write_csv(path, rows):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['entity_id', 'user_id', 'permission_level'])
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def test_it_returns_success(expect_cli_exit_code, tmp_path):
+    old_path = write_csv(os.path.join(tmp_path, 'old.csv'), [{'entity_id': 'syn1', 'user_id': '1'}])
+    new_path = write_csv(os.path.join(tmp_path, 'new.csv'), [{'entity_id': 'syn2', 'user_id': '1'}])
+    expect_cli_exit_code('diff', 0, old_path, new_path, '-o', str(tmp_path))
+
+
+def test_it_returns_failure(expect_cli_exit_code, tmp_path):
+    old_path = write_csv(os.path.join(tmp_path, 'old.csv'), [{'entity_id': 'syn1', 'user_id': '1'}])
+    expect_cli_exit_code('diff', 1, old_path, old_path, '--key-columns', 'not_a_column')
@@ -0,0 +1,111 @@
+import pytest
+import os
+import csv
+from syn_reports.commands.diff_report import DiffReport
+from syn_reports.core import Snapshot
+
+HEADERS = ['entity_type', 'entity_id', 'principal_type', 'team_id', 'user_id', 'username', 'permission_level']
+
+
+def write_csv(path, rows, fieldnames=None):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames or HEADERS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def read_csv(path):
+    with open(path, mode='r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def row(entity_id, user_id, permission_level='Can View', team_id=''):
+    return {'entity_type': 'Folder', 'entity_id': entity_id, 'principal_type': 'User', 'team_id': team_id,
+            'user_id': user_id, 'username': 'user{0}'.format(user_id), 'permission_level': permission_level}
+
+
+@pytest.mark.parametrize('chunk_size', [None, 2])
+def test_it_reports_the_changed_rows(tmp_path, chunk_size):
+    old_path = write_csv(os.path.join(tmp_path, 'old.csv'), [
+        row('syn3', '1'),
+        row('syn1', '2'),
+        row('syn1', '1'),
+        row('syn2', '1', team_id='10'),
+        row('syn2', '1', team_id='10'),
+        row('syn2', '1')
+    ])
+    new_path = write_csv(os.path.join(tmp_path, 'new.csv'), [
+        row('syn2', '1', team_id='10'),
+        row('syn1', '1', permission_level='Can Edit'),
+        row('syn4', '1'),
+        row('syn1', '2'),
+        row('syn2', '1')
+    ])
+    out_path = os.path.join(tmp_path, 'diff.csv')
+    report = DiffReport(old_path, new_path, out_path=out_path, chunk_size=chunk_size).execute()
+    assert report.errors == []
+    assert dict(report.counts) == {'added': 1, 'removed': 2, 'changed': 1}
+
+    results = read_csv(out_path)
+    assert [(r['change'], r['entity_id'], r['team_id'], r['user_id']) for r in results] == [
+        ('changed', 'syn1', '', '1'),
+        ('removed', 'syn2', '10', '1'),
+        ('removed', 'syn3', '', '1'),
+        ('added', 'syn4', '', '1')
+    ]
+    assert results[0]['permission_level'] == 'Can Edit'
+    assert results[0]['previous_values'] == 'permission_level: Can View'
+
+
+def test_it_uses_the_key_columns(tmp_path):
+    old_path = write_csv(os.path.join(tmp_path, 'old.csv'), [row('syn1', '1')])
+    new_path = write_csv(os.path.join(tmp_path, 'new.csv'), [row('syn1', '1', permission_level='Can Edit')])
+    report = DiffReport(old_path, new_path, key_columns=['entity_id', 'user_id', 'permission_level']).execute()
+    assert dict(report.counts) == {'added': 1, 'removed': 1}
+
+
+def test_it_errors_on_different_files(tmp_path):
+    old_path = write_csv(os.path.join(tmp_path, 'old.csv'), [row('syn1', '1')])
+    new_path = write_csv(os.path.join(tmp_path, 'new.csv'), [{'entity_id': 'syn1'}], fieldnames=['entity_id'])
+    report = DiffReport(old_path, new_path).execute()
+    assert len(report.errors) == 1
+
+    report = DiffReport(old_path, old_path, key_columns=['not_a_column']).execute()
+    assert 'Invalid key columns: not_a_column' in report.errors[0]
+
+
+def create_snapshot(path, resource_access):
+    root = {'id': 'syn4489', 'name': 'root', 'type': 'org.sagebionetworks.repo.model.Folder'}
+    with Snapshot(path, create=True) as snapshot:
+        snapshot.add_bundle({
+            'entity': {'id': 'syn1', 'name': 'Project1', 'concreteType': 'org.sagebionetworks.repo.model.Project',
+                       'parentId': root['id']},
+            'path': {'path': [root, {'id': 'syn1', 'name': 'Project1'}]},
+            'accessControlList': {'id': 'syn1', 'resourceAccess': resource_access}
+        })
+        snapshot.add_user({'ownerId': '100', 'userName': 'user100'})
+        snapshot.add_team({'id': '200', 'name': 'Team200'}, [], [])
+    return path
+
+
+def test_it_reports_the_changed_permissions_between_snapshots(tmp_path):
+    old_path = create_snapshot(os.path.join(tmp_path, 'old.db'), [
+        {'principalId': 100, 'accessType': ['READ']},
+        {'principalId': 200, 'accessType': ['READ']}
+    ])
+    new_path = create_snapshot(os.path.join(tmp_path, 'new.db'), [
+        {'principalId': 100, 'accessType': ['READ', 'DOWNLOAD']},
+        {'principalId': 300, 'accessType': ['READ']}
+    ])
+    out_path = os.path.join(tmp_path, 'diff.csv')
+    report = DiffReport(old_path, new_path, out_path=out_path).execute()
+    assert report.errors == []
+
+    results = read_csv(out_path)
+    assert [(r['change'], r['principal_id'], r['principal_type']) for r in results] == [
+        ('changed', '100', 'User'),
+        ('removed', '200', 'Team'),
+        ('added', '300', 'Unknown')
+    ]
+    assert results[0]['previous_values'] == 'permission_level: Can View'
@@ -1,5 +1,6 @@
 import pytest
 import os
+import csv
 from syn_reports.commands.entity_permissions_report import EntityPermissionsReport
 from synapsis import Synapsis
 
@@ -95,3 +96,39 @@ def test_it_does_not_raise_error_on_projects_not_found(capsys, synapse_test_help
         EntityPermissionsReport(id_or_name).execute()
         captured = capsys.readouterr()
         assert 'Entity does not exist or you do not have access to the entity.' in captured.err
+
+
+def test_it_reports_on_a_shard(capsys, syn_project, syn_project2):
+    entities = [syn_project.id, syn_project2.name]
+    reported = []
+    for index in [1, 2]:
+        report = EntityPermissionsReport(entities, shard=(index, 2)).execute()
+        assert report.errors == []
+        reported += report._entity_ids_or_names
+    assert sorted(reported) == sorted([syn_project.id, syn_project2.id])
+
+
+def test_it_outputs_normalized_csv_files(synapse_test_helper, syn_project):
+    out_file = os.path.join(synapse_test_helper.create_temp_dir(), 'outfile.csv')
+    report = EntityPermissionsReport(syn_project.id, out_path=out_file, normalized=True).execute()
+    assert report.errors == []
+    with open(os.path.join(os.path.dirname(out_file), 'outfile-acl_entries.csv'), newline='') as f:
+        acl_entries = list(csv.DictReader(f))
+    with open(os.path.join(os.path.dirname(out_file), 'outfile-principals.csv'), newline='') as f:
+        principal_ids = [r['principal_id'] for r in csv.DictReader(f)]
+    assert len(acl_entries) > 0
+    for row in acl_entries:
+        assert row['entity_id'] == syn_project.id
+        assert row['principal_id'] in principal_ids
+
+
+def test_it_filters_by_principal(synapse_test_helper, syn_project):
+    user_id = str(Synapsis.getUserProfile()['ownerId'])
+    out_file = os.path.join(synapse_test_helper.create_temp_dir(), 'outfile.csv')
+    report = EntityPermissionsReport(syn_project.id, out_path=out_file, principals=[user_id]).execute()
+    assert report.errors == []
+    with open(out_file, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) > 0
+    for row in rows:
+        assert row['user_id'] == user_id
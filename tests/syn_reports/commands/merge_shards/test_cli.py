@@ -0,0 +1,20 @@
+import os
+import csv
+
+
+def write_csv(path, rows):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['entity_id', 'user_id'])
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def test_it_returns_success(expect_cli_exit_code, tmp_path):
+    shard_path = write_csv(os.path.join(tmp_path, 'shard.csv'), [{'entity_id': 'syn1', 'user_id': '1'}])
+    expect_cli_exit_code('merge-shards', 0, str(tmp_path), shard_path)
+
+
+def test_it_returns_failure(expect_cli_exit_code, tmp_path):
+    shard_path = write_csv(os.path.join(tmp_path, 'shard.csv'), [{'entity_id': 'syn1', 'user_id': '1'}])
+    expect_cli_exit_code('merge-shards', 1, str(tmp_path), shard_path, '--sort-columns', 'not_a_column')
@@ -0,0 +1,36 @@
+import os
+import csv
+from syn_reports.commands.merge_shards import ShardMerger
+
+
+def write_csv(path, rows, fieldnames=None):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames or ['entity_id', 'user_id', 'permission_level'])
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def test_it_merges_the_shards(tmp_path):
+    shard1 = write_csv(os.path.join(tmp_path, 'shard1.csv'), [
+        {'entity_id': 'syn3', 'user_id': '1', 'permission_level': 'Can View'},
+        {'entity_id': 'syn1', 'user_id': '2', 'permission_level': 'Can View'}
+    ])
+    shard2 = write_csv(os.path.join(tmp_path, 'shard2.csv'), [
+        {'entity_id': 'syn2', 'user_id': '1', 'permission_level': 'Can Edit'},
+        {'entity_id': 'syn1', 'user_id': '1', 'permission_level': 'Can View'}
+    ])
+    out_path = os.path.join(tmp_path, 'merged.csv')
+    merger = ShardMerger(out_path, [shard1, shard2], chunk_size=1).execute()
+    assert merger.errors == []
+    assert merger.rows_merged == 4
+    with open(out_path, mode='r', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [(r['entity_id'], r['user_id']) for r in rows] == [('syn1', '1'), ('syn1', '2'), ('syn2', '1'), ('syn3', '1')]
+
+
+def test_it_errors_if_the_shards_have_different_columns(tmp_path):
+    shard1 = write_csv(os.path.join(tmp_path, 'shard1.csv'), [])
+    shard2 = write_csv(os.path.join(tmp_path, 'shard2.csv'), [], fieldnames=['entity_id'])
+    merger = ShardMerger(os.path.join(tmp_path, 'merged.csv'), [shard1, shard2]).execute()
+    assert 'Shard has different columns than the other shards' in merger.errors[0]
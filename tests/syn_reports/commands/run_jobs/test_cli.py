@@ -0,0 +1,16 @@
+import os
+import json
+
+
+def test_it_returns_success(expect_cli_exit_code, tmp_path):
+    shard_path = os.path.join(tmp_path, 'shard.csv')
+    with open(shard_path, mode='w') as f:
+        f.write('"entity_id"\n"syn1"\n')
+    jobs_path = os.path.join(tmp_path, 'jobs.json')
+    with open(jobs_path, mode='w') as f:
+        json.dump([{'command': 'merge-shards', 'args': [shard_path], 'out': str(tmp_path)}], f)
+    expect_cli_exit_code('run-jobs', 0, jobs_path)
+
+
+def test_it_returns_failure(expect_cli_exit_code, tmp_path):
+    expect_cli_exit_code('run-jobs', 1, os.path.join(tmp_path, 'missing.json'))
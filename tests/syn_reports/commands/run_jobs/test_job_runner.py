@@ -0,0 +1,113 @@
+import os
+import csv
+import json
+from syn_reports.commands.run_jobs import JobRunner
+from syn_reports.core import Utils
+
+
+def write_csv(path, rows):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['entity_id', 'user_id'])
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def read_csv(path):
+    with open(path, mode='r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def write_jobs(path, jobs):
+    with open(path, mode='w', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            json.dump(jobs, f)
+        else:
+            import yaml
+            yaml.safe_dump(jobs, f)
+    return path
+
+
+def test_it_runs_the_jobs(tmp_path):
+    shard1 = write_csv(os.path.join(tmp_path, 'shard1.csv'), [{'entity_id': 'syn2', 'user_id': '1'}])
+    shard2 = write_csv(os.path.join(tmp_path, 'shard2.csv'), [{'entity_id': 'syn1', 'user_id': '1'}])
+    merged_path = os.path.join(tmp_path, 'merged.csv')
+    diff_path = os.path.join(tmp_path, 'diff.csv')
+    jobs_path = write_jobs(os.path.join(tmp_path, 'jobs.yaml'), {'jobs': [
+        {'name': 'merge', 'command': 'merge-shards', 'args': [shard1, shard2], 'out': merged_path},
+        {'command': 'diff', 'args': '{0} {1}'.format(shard1, shard2), 'out': diff_path}
+    ]})
+
+    runner = JobRunner(jobs_path).execute()
+    assert runner.errors == []
+    assert runner.jobs_run == 2
+    assert [r['entity_id'] for r in read_csv(merged_path)] == ['syn1', 'syn2']
+    assert sorted(r['change'] for r in read_csv(diff_path)) == ['added', 'removed']
+
+
+def test_it_runs_jobs_at_once(tmp_path):
+    shard = write_csv(os.path.join(tmp_path, 'shard.csv'), [{'entity_id': 'syn1', 'user_id': '1'}])
+    jobs = [{'command': 'merge-shards', 'args': [shard], 'out': os.path.join(tmp_path, '{0}.csv'.format(i))}
+            for i in range(4)]
+    jobs_path = write_jobs(os.path.join(tmp_path, 'jobs.json'), jobs)
+
+    runner = JobRunner(jobs_path, max_jobs=2).execute()
+    assert runner.errors == []
+    assert runner.jobs_run == 4
+    for i in range(4):
+        assert len(read_csv(os.path.join(tmp_path, '{0}.csv'.format(i)))) == 1
+
+
+def test_it_keeps_every_result_in_the_caches(tmp_path, mocker):
+    shard = write_csv(os.path.join(tmp_path, 'shard.csv'), [{'entity_id': 'syn1', 'user_id': '1'}])
+    jobs_path = write_jobs(os.path.join(tmp_path, 'jobs.json'), [
+        {'command': 'merge-shards', 'args': [shard], 'out': os.path.join(tmp_path, 'merged.csv')}])
+    maxsizes = []
+    mocker.patch.object(JobRunner, '_run_job', side_effect=lambda job: maxsizes.append(
+        Utils.WithCache.get_bundle.cache_parameters()['maxsize']) or (job[0], []))
+
+    JobRunner(jobs_path).execute()
+    JobRunner(jobs_path, cache_size=5000).execute()
+    assert maxsizes == [None, 5000]
+    assert Utils.WithCache.get_bundle.cache_parameters()['maxsize'] == Utils.WithCache.LRU_MAXSIZE
+
+
+def test_it_reports_the_errors_of_each_job(tmp_path):
+    shard = write_csv(os.path.join(tmp_path, 'shard.csv'), [{'entity_id': 'syn1', 'user_id': '1'}])
+    jobs_path = write_jobs(os.path.join(tmp_path, 'jobs.json'), [
+        {'name': 'bad', 'command': 'merge-shards', 'args': [shard, '-s', 'not_a_column'], 'out': str(tmp_path)},
+        {'name': 'good', 'command': 'merge-shards', 'args': [shard], 'out': str(tmp_path)}
+    ])
+
+    runner = JobRunner(jobs_path).execute()
+    assert runner.jobs_run == 2
+    assert runner.jobs_failed == 1
+    assert len(runner.errors) == 1
+    assert runner.errors[0].startswith('bad: Invalid sort columns')
+
+
+def test_it_does_not_run_invalid_jobs(tmp_path, mocker):
+    jobs_path = write_jobs(os.path.join(tmp_path, 'jobs.json'), [
+        {'command': 'merge-shards', 'args': [], 'out': str(tmp_path)},
+        {'command': 'not-a-command'},
+        {'command': 'run-jobs', 'args': ['jobs.json']},
+        {'command': 'diff', 'args': ['a.csv', 'b.csv', '--not-an-arg']},
+        {'args': ['a.csv']}
+    ])
+    mock_run_job = mocker.patch.object(JobRunner, '_run_job')
+
+    runner = JobRunner(jobs_path).execute()
+    mock_run_job.assert_not_called()
+    assert runner.jobs_run == 0
+    assert len(runner.errors) == 5
+    assert 'Invalid command: not-a-command' in runner.errors[1]
+    assert 'Invalid command: run-jobs' in runner.errors[2]
+    assert runner.errors[4] == 'Job 5 must have a "command".'
+
+
+def test_it_errors_if_there_are_no_jobs(tmp_path):
+    jobs_path = write_jobs(os.path.join(tmp_path, 'jobs.json'), {'jobs': []})
+    assert JobRunner(jobs_path).execute().errors == [
+        'Jobs file must contain a list of jobs: {0}'.format(jobs_path)]
+    assert JobRunner(os.path.join(tmp_path, 'missing.yaml')).execute().errors[0].startswith(
+        'Error loading jobs file')
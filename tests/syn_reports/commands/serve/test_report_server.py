@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import threading
+import urllib.request
+import urllib.error
+import pytest
+from syn_reports.commands.serve import ReportServer, CsvTail
+from syn_reports.core import Snapshot, Utils
+
+
+@pytest.fixture()
+def snapshot_path(tmp_path):
+    path = os.path.join(tmp_path, 'snapshot.db')
+    with Snapshot(path, create=True) as snapshot:
+        snapshot.add_user({'ownerId': '100', 'userName': 'user100'})
+        snapshot.add_user({'ownerId': '101', 'userName': 'user101'})
+        snapshot.add_team({'id': '200', 'name': 'Team200'},
+                          [{'member': {'ownerId': '100'}, 'isAdmin': True},
+                           {'member': {'ownerId': '101'}, 'isAdmin': False}],
+                          [])
+        snapshot.commit()
+    return path
+
+
+@pytest.fixture()
+def server():
+    report_server = ReportServer(port=0, max_requests=1)
+    thread = threading.Thread(target=report_server.execute, daemon=True)
+    thread.start()
+    while report_server.server_address is None:
+        time.sleep(0.01)
+    yield report_server
+    report_server.shutdown()
+    thread.join()
+
+
+def request(server, path, body=None):
+    url = 'http://{0}:{1}{2}'.format(*server.server_address[:2], path)
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data)) as response:
+            return response.status, [json.loads(line) for line in response.read().splitlines()]
+    except urllib.error.HTTPError as ex:
+        return ex.code, [json.loads(ex.read())]
+
+
+def test_it_lists_the_commands(server):
+    status, lines = request(server, '/commands')
+    assert status == 200
+    assert lines[0]['commands'] == ReportServer.COMMANDS
+
+
+def test_it_streams_the_report_rows(server, snapshot_path):
+    status, lines = request(server, '/reports/team-members', {'args': ['200', '--from-snapshot', snapshot_path]})
+    assert status == 200
+    rows = [line['row'] for line in lines if 'row' in line]
+    assert sorted(r['username'] for r in rows) == ['user100', 'user101']
+    assert lines[-1]['done'] is True
+    assert lines[-1]['errors'] == []
+
+
+def test_it_rejects_invalid_requests(server, snapshot_path):
+    assert request(server, '/reports/snapshot', {'args': ['out.db']})[0] == 400
+    assert request(server, '/reports/team-members', {'args': []})[0] == 400
+    assert request(server, '/reports/team-members', {'args': 'not-a-list'})[0] == 400
+    assert request(server, '/not-found')[0] == 404
+
+
+def test_it_limits_the_concurrent_requests(server, snapshot_path):
+    assert server._request_slots.acquire(blocking=False)
+    try:
+        status, lines = request(server, '/reports/team-members', {'args': ['200', '--from-snapshot', snapshot_path]})
+        assert status == 503
+    finally:
+        server._request_slots.release()
+
+
+def test_csv_tail_only_reads_complete_rows(tmp_path):
+    path = os.path.join(tmp_path, 'report.csv')
+    tail = CsvTail(path)
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        f.write('"a","b"\r\n"1","multi\r\n')
+        f.flush()
+        assert tail.read_rows() == []
+        f.write('line"\r\n"2","ü')
+        f.flush()
+        assert tail.read_rows() == [{'a': '1', 'b': 'multi\r\nline'}]
+        f.write('"\r\n')
+        f.flush()
+        assert tail.read_rows() == [{'a': '2', 'b': 'ü'}]
+
+
+def test_it_uses_large_caches(server):
+    assert Utils.WithCache.get_bundle.cache_parameters()['maxsize'] == ReportServer.DEFAULT_CACHE_SIZE
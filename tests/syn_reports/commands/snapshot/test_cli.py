@@ -0,0 +1,18 @@
+import os
+
+
+def test_it_returns_success(expect_cli_exit_code, synapse_test_helper, syn_project):
+    out_path = os.path.join(synapse_test_helper.create_temp_dir(), 'snapshot.db')
+    expect_cli_exit_code('snapshot', 0, out_path, syn_project.id)
+
+
+def test_it_returns_failure(expect_cli_exit_code, synapse_test_helper):
+    out_path = os.path.join(synapse_test_helper.create_temp_dir(), 'snapshot.db')
+    expect_cli_exit_code('snapshot', 1, out_path, 'syn000')
+
+
+def test_it_reports_from_the_snapshot(expect_cli_exit_code, synapse_test_helper, syn_project):
+    out_path = os.path.join(synapse_test_helper.create_temp_dir(), 'snapshot.db')
+    expect_cli_exit_code('snapshot', 0, out_path, syn_project.id)
+    expect_cli_exit_code('benefactor-permissions', 0, syn_project.id, '--from-snapshot', out_path)
+    expect_cli_exit_code('benefactor-permissions', 1, syn_project.id, '--from-snapshot', out_path + '.missing')
@@ -0,0 +1,53 @@
+import pytest
+import os
+from syn_reports.commands.snapshot import SnapshotBuilder
+from syn_reports.commands.benefactor_permissions_report import BenefactorPermissionsReport
+from syn_reports.commands.entity_permissions_report import EntityPermissionsReport
+from syn_reports.commands.user_project_access_report import UserProjectAccessReport
+from syn_reports.commands.user_teams_report import UserTeamsReport
+from syn_reports.commands.team_members_report import TeamMembersReport
+from syn_reports.core import Snapshot
+from synapsis import Synapsis
+
+
+@pytest.fixture(scope='session')
+def snapshot_path(synapse_test_helper, syn_project, syn_folder, syn_team):
+    Synapsis.Utils.set_entity_permission(syn_folder, syn_team, Synapsis.Permissions.CAN_EDIT_AND_DELETE,
+                                         warn_if_inherits=False)
+    out_path = os.path.join(synapse_test_helper.create_temp_dir(), 'snapshot.db')
+    builder = SnapshotBuilder(out_path, entity_ids_or_names=syn_project.id).execute()
+    assert builder.errors == []
+    return out_path
+
+
+@pytest.fixture()
+def no_synapse_calls(mocker):
+    for method in ['restGET', 'restPOST', 'restPUT', 'restDELETE']:
+        mocker.patch.object(Synapsis.Synapse, method, side_effect=Exception('Synapse called from snapshot report.'))
+
+
+def test_it_creates_the_snapshot(snapshot_path, syn_project, syn_folder, syn_team, syn_client):
+    user = syn_client.getUserProfile()
+    with Snapshot(snapshot_path) as snapshot:
+        assert [p['id'] for p in snapshot.projects()] == [syn_project.id]
+        assert snapshot.get_entity(syn_project.name)['id'] == syn_project.id
+        assert snapshot.get_benefactor_id(syn_folder.id) == syn_folder.id
+        assert snapshot.get_team(syn_team.id)['name'] == syn_team.name
+        assert snapshot.get_user(user.userName)['ownerId'] == user.ownerId
+        assert syn_team.id in snapshot.get_users_team_ids(user.ownerId)
+
+
+def test_it_reports_from_the_snapshot(capsys, no_synapse_calls, snapshot_path, syn_project, syn_folder, syn_team,
+                                      syn_client):
+    user = syn_client.getUserProfile()
+    for report in [BenefactorPermissionsReport(syn_project.id, from_snapshot=snapshot_path),
+                   EntityPermissionsReport(syn_project.id, recursive=True, from_snapshot=snapshot_path),
+                   UserProjectAccessReport(user.ownerId, from_snapshot=snapshot_path),
+                   UserTeamsReport(user.ownerId, from_snapshot=snapshot_path),
+                   TeamMembersReport(syn_team.id, from_snapshot=snapshot_path)]:
+        report.execute()
+        assert report.errors == []
+
+    captured = capsys.readouterr()
+    assert 'Folder: {0} ({1})'.format(syn_folder.name, syn_folder.id) in captured.out
+    assert 'Team: {0} ({1})'.format(syn_team.name, syn_team.id) in captured.out
@@ -1,8 +1,11 @@
-# TODO: NOTE, Not Implemented
-
-# def test_it_returns_success(expect_cli_exit_code, syn_team):
-#     expect_cli_exit_code('team-access', 0, syn_team.id)
-#
-#
-# def test_it_returns_failure(expect_cli_exit_code):
-#     expect_cli_exit_code('team-access', 1, 'syn00000')
+import os
+
+
+def test_it_returns_success(expect_cli_exit_code, synapse_test_helper, syn_project, syn_team):
+    index_path = os.path.join(synapse_test_helper.create_temp_dir(), 'access-index.json')
+    expect_cli_exit_code('team-access', 0, syn_team.id, '--index-path', index_path, '--index-scope', syn_project.id)
+
+
+def test_it_returns_failure(expect_cli_exit_code, synapse_test_helper, syn_project):
+    index_path = os.path.join(synapse_test_helper.create_temp_dir(), 'access-index.json')
+    expect_cli_exit_code('team-access', 1, 'syn00000', '--index-path', index_path, '--index-scope', syn_project.id)
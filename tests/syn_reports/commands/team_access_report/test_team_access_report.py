@@ -1,7 +1,101 @@
 import pytest
-from syn_reports.commands.team_access_report import TeamAccessReport
+import os
+from syn_reports.commands.team_access_report import TeamAccessReport, AccessIndex
+from synapsis import Synapsis
 
 
-def test_it_raises_not_implemented():
-    with pytest.raises(NotImplementedError):
-        TeamAccessReport('0').execute()
+@pytest.fixture(scope='session')
+def team_with_access(synapse_test_helper, syn_project, syn_folder):
+    team = synapse_test_helper.create_team()
+    Synapsis.Utils.set_entity_permission(syn_project, team, Synapsis.Permissions.CAN_VIEW, warn_if_inherits=False)
+    Synapsis.Utils.set_entity_permission(syn_folder, team, Synapsis.Permissions.CAN_EDIT_AND_DELETE,
+                                         warn_if_inherits=False)
+    return team
+
+
+@pytest.fixture()
+def index_path(synapse_test_helper):
+    return os.path.join(synapse_test_helper.create_temp_dir(), 'access-index.json')
+
+
+def assert_success_from_print(capsys, team, *entities):
+    captured = capsys.readouterr()
+    assert captured.err == ''
+    assert 'Team: {0} ({1}) has access to {2} entities.'.format(team.name, team.id, len(entities)) in captured.out
+    for entity in entities:
+        log_msg = '{0}: {1} ({2})'.format(Synapsis.ConcreteTypes.get(entity).name, entity.name, entity.id)
+        assert log_msg in captured.out
+
+
+def test_it_reports_on_teams_by_id(capsys, index_path, syn_project, syn_folder, team_with_access):
+    TeamAccessReport(team_with_access.id, index_path=index_path, index_scope=syn_project.id).execute()
+    assert_success_from_print(capsys, team_with_access, syn_project, syn_folder)
+
+
+def test_it_reports_on_teams_by_name(capsys, index_path, syn_project, syn_folder, team_with_access):
+    TeamAccessReport(team_with_access.name, index_path=index_path, index_scope=syn_project.id).execute()
+    assert_success_from_print(capsys, team_with_access, syn_project, syn_folder)
+
+
+def test_it_reuses_the_index(capsys, mocker, index_path, syn_project, syn_folder, team_with_access):
+    TeamAccessReport(team_with_access.id, index_path=index_path, index_scope=syn_project.id).execute()
+    capsys.readouterr()
+
+    spy = mocker.spy(AccessIndex, 'build')
+    TeamAccessReport(team_with_access.id, index_path=index_path).execute()
+    spy.assert_not_called()
+    assert_success_from_print(capsys, team_with_access, syn_project, syn_folder)
+
+    TeamAccessReport(team_with_access.id, index_path=index_path, index_scope=syn_project.id,
+                     rebuild_index=True).execute()
+    spy.assert_called_once()
+
+
+def test_it_does_not_blowup_if_team_not_found(capsys, index_path, syn_project):
+    TeamAccessReport('0', index_path=index_path, index_scope=syn_project.id).execute()
+    captured = capsys.readouterr()
+    assert 'Team does not exist or you do not have access to the team.' in captured.err
+
+
+def test_it_outputs_csv_to_file(capsys, synapse_test_helper, index_path, syn_project, syn_folder, team_with_access):
+    out_file = os.path.join(synapse_test_helper.create_temp_dir(), 'outfile.csv')
+    report = TeamAccessReport(team_with_access.id, out_path=out_file, index_path=index_path,
+                              index_scope=syn_project.id)
+    report.execute()
+    assert report._csv_full_path == out_file
+    assert_success_from_print(capsys, team_with_access, syn_project, syn_folder)
+    with open(out_file, mode='r') as f:
+        contents = f.read()
+        for entity in [syn_project, syn_folder]:
+            assert entity.id in contents
+
+
+def test_it_rebuilds_the_index_for_a_different_scope(capsys, mocker, index_path, syn_project, syn_folder,
+                                                     team_with_access):
+    TeamAccessReport(team_with_access.id, index_path=index_path, index_scope=syn_project.id).execute()
+    capsys.readouterr()
+
+    spy = mocker.spy(AccessIndex, 'build')
+    TeamAccessReport(team_with_access.id, index_path=index_path, index_scope=syn_folder.id).execute()
+    spy.assert_called_once()
+    captured = capsys.readouterr()
+    assert 'Access index was built for: {0}. Rebuilding for: {1}'.format(syn_project.id, syn_folder.id) in captured.out
+    assert 'Scope: {0})'.format(syn_folder.id) in captured.out
+
+
+def test_access_index_saves_the_scope(tmp_path):
+    index_path = str(tmp_path / 'access-index.json')
+    index = AccessIndex(index_path)
+    index.scope = ['syn2', 'syn1']
+    index.save()
+
+    index = AccessIndex(index_path).load()
+    assert index.scope == ['syn2', 'syn1']
+    assert index.has_scope(['syn1', 'syn2'])
+    assert not index.has_scope(['syn1'])
+    assert not index.has_scope(None)
+    assert index.scope_str() == 'syn2, syn1'
+
+    index.scope = None
+    assert index.has_scope(None)
+    assert index.scope_str() == 'All accessible Projects'
@@ -1,6 +1,9 @@
 import pytest
 import os
+import csv
+import synapseclient as syn
 from syn_reports.commands.team_members_report import TeamMembersReport
+from syn_reports.core import Utils
 
 
 def assert_success_from_print(capsys, *teams):
@@ -35,6 +38,17 @@ def test_it_does_not_blowup_if_entity_not_found(capsys):
     assert 'Team does not exist or you do not have access to the team.' in captured.err
 
 
+
+def test_it_reports_errors_loading_the_members(capsys, mocker):
+    mocker.patch.object(syn.Synapse, 'getTeam', return_value=syn.Team(id='3000', name='Team A'))
+    mocker.patch.object(syn.Synapse, 'getTeamMembers',
+                        side_effect=syn.core.exceptions.SynapseHTTPError('Forbidden',
+                                                                         response=mocker.Mock(status_code=403)))
+    report = TeamMembersReport('3000').execute()
+    assert report.errors == ['Error loading team data: Forbidden']
+    assert 'Found team' not in capsys.readouterr().out
+
+
 def test_it_outputs_csv_to_dir(capsys, synapse_test_helper, syn_team):
     out_dir = synapse_test_helper.create_temp_dir()
     report = TeamMembersReport(syn_team.id, out_path=out_dir)
@@ -50,3 +64,42 @@ def test_it_outputs_csv_to_file(capsys, synapse_test_helper, syn_team):
     assert report._csv_full_path == out_file
     assert_success_from_print(capsys, syn_team)
     assert_success_from_csv(report._csv_full_path, syn_team)
+
+
+def test_it_reports_the_overlap(capsys, synapse_test_helper, syn_team):
+    other_team = synapse_test_helper.create_team()
+    out_dir = synapse_test_helper.create_temp_dir()
+    report = TeamMembersReport([syn_team.id, other_team.id], out_path=out_dir, overlap=True)
+    report.execute()
+    captured = capsys.readouterr()
+    assert captured.err == ''
+    assert '{0} ({1}) and {2} ({3}): 1 shared members.'.format(
+        syn_team.name, syn_team.id, other_team.name, other_team.id) in captured.out
+    assert '1 users are on more than one team.' in captured.out
+
+    overlap_csv_path = report._csv_full_path[:-len('.csv')] + '-overlap.csv'
+    with open(overlap_csv_path, newline='') as f:
+        rows = list(csv.reader(f))
+        assert rows[0] == ['team_id', 'team_name', syn_team.id, other_team.id]
+        assert rows[1] == [syn_team.id, syn_team.name, '1', '1']
+
+    users_csv_path = report._csv_full_path[:-len('.csv')] + '-user-team-counts.csv'
+    with open(users_csv_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+        assert len(rows) == 1
+        assert rows[0]['team_count'] == '2'
+
+
+def test_it_only_outputs_the_columns(capsys, synapse_test_helper, syn_team, mocker):
+    spy_get_users = mocker.spy(Utils.WithCache, 'get_users')
+    out_file = os.path.join(synapse_test_helper.create_temp_dir(), 'outfile.csv')
+    report = TeamMembersReport(syn_team.id, out_path=out_file, columns=['username', 'team_id'])
+    report.execute()
+    assert_success_from_print(capsys, syn_team)
+    with open(out_file, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0].keys()) == ['username', 'team_id']
+    assert rows[0]['team_id'] == syn_team.id
+    assert rows[0]['username']
+    # The profiles are only loaded for the company.
+    spy_get_users.assert_not_called()
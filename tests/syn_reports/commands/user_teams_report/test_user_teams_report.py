@@ -1,6 +1,8 @@
 import pytest
 import os
+import synapseclient as syn
 from syn_reports.commands.user_teams_report import UserTeamsReport
+from syn_reports.core import Utils
 
 
 @pytest.fixture(scope='session')
@@ -76,8 +78,59 @@ def test_it_reports_on_has_member(capsys, syn_user, syn_team, mocker, synapse_te
     assert 'Team: {0} ({1})'.format(syn_team.name, syn_team.id) not in captured.out
 
     # Does not have the member in the team
-    mocker.patch('syn_reports.core.utils.Utils.WithCache.get_team_members', return_value=[])
+    mocker.patch('syn_reports.core.utils.Utils.WithCache.get_users_team_ids', return_value=frozenset())
     UserTeamsReport(syn_user.ownerId, required_member_ids_or_usernames=syn_user.userName).execute()
     captured = capsys.readouterr()
     assert 'Only including teams that have members: {0}'.format(syn_user.userName) in captured.out
     assert 'Team: {0} ({1})'.format(syn_team.name, syn_team.id) not in captured.out
+
+
+def test_it_reports_on_has_member_from_team_members(capsys, syn_user, syn_team, mocker):
+    # Falls back to the team members when the required member's teams cannot be loaded.
+    mocker.patch('syn_reports.core.utils.Utils.WithCache.get_users_team_ids', return_value=None)
+    UserTeamsReport(syn_user.ownerId, required_member_ids_or_usernames=syn_user.userName).execute()
+    assert_user_success_from_print(capsys, syn_user, syn_team)
+
+    # Does not have the member in the team
+    mocker.patch('syn_reports.core.utils.Utils.WithCache.get_team_members', return_value=[])
+    UserTeamsReport(syn_user.ownerId, required_member_ids_or_usernames=syn_user.userName).execute()
+    captured = capsys.readouterr()
+    assert 'Team: {0} ({1})'.format(syn_team.name, syn_team.id) not in captured.out
+
+
+def test_it_reports_in_team_major_mode(capsys, syn_user, syn_team):
+    report = UserTeamsReport(syn_user.ownerId, mode=UserTeamsReport.MODE_TEAM_MAJOR).execute()
+    assert report.errors == ['The team-major mode can only be used with --has-member.']
+
+    UserTeamsReport(syn_user.ownerId, required_member_ids_or_usernames=syn_user.userName,
+                    mode=UserTeamsReport.MODE_TEAM_MAJOR).execute()
+    captured = capsys.readouterr()
+    assert 'Loading the members of each team...' in captured.out
+    assert 'Username: {0} ({1})'.format(syn_user.userName, syn_user.ownerId) in captured.out
+    assert 'Team: {0} ({1})'.format(syn_team.name, syn_team.id) in captured.out
+    assert 'Is Admin: Yes' in captured.out
+
+
+
+def test_it_does_not_load_every_team_in_team_major_mode(capsys, mocker):
+    user = syn.UserProfile(ownerId='100', userName='user-a')
+    mocker.patch.object(Utils.WithCache, 'get_user', return_value=user)
+    # The teams of the required member cannot be loaded.
+    mocker.patch.object(Utils.WithCache, 'get_users_team_ids', return_value=None)
+    all_teams = mocker.patch.object(Utils, 'all_teams')
+    users_teams = mocker.patch.object(Utils, 'users_teams', return_value=[])
+    UserTeamsReport('100', required_member_ids_or_usernames='user-a', mode=UserTeamsReport.MODE_TEAM_MAJOR).execute()
+    assert 'Using the per-user mode since the teams of the required members could not be loaded.' in \
+           capsys.readouterr().out
+    all_teams.assert_not_called()
+    users_teams.assert_called_once_with('100')
+
+
+def test_it_picks_the_mode_by_estimated_api_calls(syn_user):
+    team_ids = set(str(i) for i in range(100))
+    assert UserTeamsReport([syn_user.ownerId])._choose_mode(['user'], team_ids) == UserTeamsReport.MODE_PER_USER
+    assert UserTeamsReport([syn_user.ownerId] * 1000)._choose_mode(['user'], team_ids) == \
+           UserTeamsReport.MODE_TEAM_MAJOR
+    # Every team would be loaded without the required members' teams.
+    assert UserTeamsReport([syn_user.ownerId] * 1000)._choose_mode([], None) == UserTeamsReport.MODE_PER_USER
+    assert UserTeamsReport([syn_user.ownerId] * 1000)._choose_mode(['user'], None) == UserTeamsReport.MODE_PER_USER
@@ -0,0 +1,76 @@
+import json
+import pytest
+import synapseclient as syn
+from syn_reports.commands.warm_cache import CacheWarmer
+from syn_reports.core import Utils, PrincipalCache
+from synapsis import Synapsis
+
+
+class FakeSynapse:
+    def __init__(self):
+        self.teams = {'3000': {'id': '3000', 'name': 'Team A', 'etag': 'e1'},
+                      '3001': {'id': '3001', 'name': 'Team B', 'etag': 'e2'}}
+        self.members = {'3000': ['100', '101'], '3001': ['101']}
+        self.loaded_team_ids = []
+        self.loaded_user_ids = []
+
+    def list_teams(self, uri, *args, **kwargs):
+        return iter(list(self.teams.values()))
+
+    def get_team_members(self, team_id):
+        self.loaded_team_ids.append(team_id)
+        return iter([syn.TeamMember(teamId=team_id, isAdmin=False, member={'ownerId': user_id})
+                     for user_id in self.members[team_id]])
+
+    def get_team_open_invitations(self, team_id):
+        return iter([{'teamId': team_id, 'inviteeId': '102'}] if team_id == '3001' else [])
+
+    def get_user_profiles(self, uri, body=None, **kwargs):
+        user_ids = json.loads(body)['list']
+        self.loaded_user_ids.extend(user_ids)
+        return {'list': [{'ownerId': user_id, 'userName': 'user-{0}'.format(user_id), 'etag': 'u1'}
+                         for user_id in user_ids]}
+
+
+@pytest.fixture
+def fake_synapse(mocker):
+    fake = FakeSynapse()
+    mocker.patch.object(Synapsis.Synapse, '_GET_paginated', side_effect=fake.list_teams)
+    mocker.patch.object(Synapsis.Synapse, 'getTeamMembers', side_effect=fake.get_team_members)
+    mocker.patch.object(Synapsis.Synapse, 'get_team_open_invitations', side_effect=fake.get_team_open_invitations)
+    mocker.patch.object(Synapsis.Synapse, 'restPOST', side_effect=fake.get_user_profiles)
+    yield fake
+    Utils.WithCache.clear_cache()
+
+
+def test_it_warms_and_refreshes_the_cache(tmp_path, fake_synapse):
+    cache_path = str(tmp_path.joinpath('principal-cache.db'))
+    assert CacheWarmer(cache_path=cache_path).execute().errors == []
+    assert sorted(fake_synapse.loaded_team_ids) == ['3000', '3001']
+    assert sorted(fake_synapse.loaded_user_ids) == ['100', '101', '102']
+    with PrincipalCache(cache_path) as cache:
+        assert cache.get_team_members('3001')[0].member.ownerId == '101'
+        assert cache.get_user('102').userName == 'user-102'
+
+    # Only the team with a new etag is reloaded and the removed team is removed.
+    fake_synapse.loaded_team_ids.clear()
+    fake_synapse.loaded_user_ids.clear()
+    Utils.WithCache.clear_cache()
+    fake_synapse.teams['3001']['etag'] = 'e3'
+    fake_synapse.members['3001'] = ['103']
+    del fake_synapse.teams['3000']
+    CacheWarmer(cache_path=cache_path).execute()
+    assert fake_synapse.loaded_team_ids == ['3001']
+    assert fake_synapse.loaded_user_ids == ['103']
+    with PrincipalCache(cache_path) as cache:
+        assert cache.get_team('3000') is None
+        assert cache.get_user('100') is None
+        assert set(cache.user_states()) == {'102', '103'}
+
+    # Everything is reloaded with full.
+    fake_synapse.loaded_team_ids.clear()
+    fake_synapse.loaded_user_ids.clear()
+    Utils.WithCache.clear_cache()
+    CacheWarmer(cache_path=cache_path, full=True).execute()
+    assert fake_synapse.loaded_team_ids == ['3001']
+    assert sorted(fake_synapse.loaded_user_ids) == ['102', '103']
@@ -0,0 +1,13 @@
+import os
+
+
+def test_it_returns_success(expect_cli_exit_code, synapse_test_helper, syn_team):
+    cache_path = os.path.join(synapse_test_helper.create_temp_dir(), 'principal-cache.db')
+    expect_cli_exit_code('warm-cache', 0, syn_team.id, '--cache-path', cache_path)
+    expect_cli_exit_code('team-members', 0, syn_team.id, '--principal-cache', cache_path)
+
+
+def test_it_returns_failure(expect_cli_exit_code, synapse_test_helper):
+    cache_path = os.path.join(synapse_test_helper.create_temp_dir(), 'principal-cache.db')
+    expect_cli_exit_code('warm-cache', 1, '0', '--cache-path', cache_path)
+    expect_cli_exit_code('team-members', 1, '0', '--principal-cache', cache_path + '.missing')
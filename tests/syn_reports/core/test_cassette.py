@@ -0,0 +1,100 @@
+import os
+import json
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from syn_reports.core import Cassette
+from synapsis import Synapsis
+
+
+class FakeAdapter(BaseAdapter):
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps({'url': request.url, 'count': len(self.requests)}).encode('utf-8')
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_adapter(mocker):
+    adapter = FakeAdapter()
+    session = requests.Session()
+    session.mount('https://', adapter)
+    mocker.patch.object(Synapsis.Synapse, '_requests_session', session)
+    yield adapter
+    Cassette.active = None
+
+
+def new_session(mocker):
+    session = requests.Session()
+    session.mount('https://', FakeAdapter())
+    mocker.patch.object(Synapsis.Synapse, '_requests_session', session)
+    return session
+
+
+def test_it_records_and_replays(tmp_path, fake_adapter, mocker):
+    mock_login = mocker.patch.object(type(Synapsis), 'login')
+    cassette = Cassette(str(tmp_path), Cassette.RECORD)
+    cassette.login()
+    mock_login.assert_called_once()
+    session = Synapsis.Synapse._requests_session
+    recorded = [session.get('https://test.synapse.org/a').json(),
+                session.get('https://test.synapse.org/a').json(),
+                session.post('https://test.synapse.org/b', data='body-1').json()]
+    cassette.stop()
+    assert cassette.recorded_count == 3
+    assert len(fake_adapter.requests) == 3
+    assert len(os.listdir(str(tmp_path))) == 1
+
+    session = new_session(mocker)
+    cassette = Cassette(str(tmp_path), Cassette.REPLAY)
+    cassette.login()
+    assert mock_login.call_count == 1
+    assert session.get('https://test.synapse.org/a').json() == recorded[0]
+    assert session.get('https://test.synapse.org/a').json() == recorded[1]
+    # The last response is repeated.
+    assert session.get('https://test.synapse.org/a').json() == recorded[1]
+    # Falls back to the method and URL if the body is different.
+    assert session.post('https://test.synapse.org/b', data='body-2').json() == recorded[2]
+    with pytest.raises(Exception, match='Request not recorded in cassette: GET https://test.synapse.org/c'):
+        session.get('https://test.synapse.org/c')
+    assert session.get_adapter('https://').__class__.__name__ == '_CassetteAdapter'
+    assert not session.get_adapter('https://')._adapter.requests
+
+
+
+def test_it_does_not_replay_a_response_twice(tmp_path, fake_adapter, mocker):
+    cassette = Cassette(str(tmp_path), Cassette.RECORD)
+    cassette.start()
+    session = Synapsis.Synapse._requests_session
+    recorded = [session.post('https://test.synapse.org/b', data=body).json() for body in ['body-1', 'body-2']]
+    cassette.stop()
+
+    session = new_session(mocker)
+    Cassette(str(tmp_path), Cassette.REPLAY).start()
+    assert session.post('https://test.synapse.org/b', data='body-1').json() == recorded[0]
+    # The fallback skips the response that was replayed for its exact request.
+    assert session.post('https://test.synapse.org/b', data='body-3').json() == recorded[1]
+    with pytest.raises(Exception, match='Request not recorded in cassette: POST https://test.synapse.org/b'):
+        session.post('https://test.synapse.org/b', data='body-4')
+
+
+def test_it_does_not_replay_without_a_recording(tmp_path, fake_adapter):
+    with pytest.raises(Exception, match='No recorded requests found'):
+        Cassette(str(tmp_path), Cassette.REPLAY).start()
+
+
+def test_it_validates_the_latency(tmp_path):
+    with pytest.raises(ValueError):
+        Cassette(str(tmp_path), Cassette.REPLAY, latency='slow')
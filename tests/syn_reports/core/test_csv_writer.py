@@ -0,0 +1,82 @@
+import pytest
+import os
+import csv
+import gzip
+from syn_reports.core import CsvWriter
+
+
+def read_rows(path):
+    if path.endswith('.gz'):
+        with gzip.open(path, mode='rt', newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+    with open(path, mode='r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_it_writes_the_csv(tmp_path):
+    path = os.path.join(tmp_path, 'report.csv')
+    with CsvWriter(path, ['a', 'b']) as writer:
+        writer.writerow({'a': 1, 'b': 'x,y'})
+    assert writer.paths == [path]
+    assert read_rows(path) == [{'a': '1', 'b': 'x,y'}]
+
+
+def test_it_writes_the_header_without_rows(tmp_path):
+    with CsvWriter(os.path.join(tmp_path, 'report.csv'), ['a', 'b']) as writer:
+        pass
+    with open(writer.path, mode='rb') as f:
+        assert f.read() == b'"a","b"\r\n'
+
+
+def test_it_compresses_the_csv(tmp_path):
+    with CsvWriter(os.path.join(tmp_path, 'report.csv'), ['a'], compress='gzip') as writer:
+        for i in range(1000):
+            writer.writerow({'a': i})
+    assert writer.paths == [os.path.join(tmp_path, 'report.csv.gz')]
+    assert [int(r['a']) for r in read_rows(writer.path)] == list(range(1000))
+
+
+def test_it_rotates_the_files(tmp_path, mocker):
+    mocker.patch.object(CsvWriter, 'BATCH_SIZE', 100)
+    with CsvWriter(os.path.join(tmp_path, 'report.csv'), ['a'], compress='gzip', max_file_size=200) as writer:
+        for i in range(10000):
+            writer.writerow({'a': i})
+    assert len(writer.paths) > 1
+    assert writer.paths[1] == os.path.join(tmp_path, 'report-part0002.csv.gz')
+    rows = []
+    for path in writer.paths:
+        rows += read_rows(path)
+    assert [int(r['a']) for r in rows] == list(range(10000))
+
+
+@pytest.mark.parametrize('compress', [None, 'gzip'])
+@pytest.mark.parametrize('max_file_size', [300, 5000])
+def test_it_does_not_exceed_the_max_file_size(tmp_path, compress, max_file_size):
+    with CsvWriter(os.path.join(tmp_path, 'report.csv'), ['a', 'b'], compress=compress,
+                   max_file_size=max_file_size) as writer:
+        for i in range(20000):
+            writer.writerow({'a': i, 'b': 'value-{0}'.format(i * 7919 % 10007)})
+    assert len(writer.paths) > 1
+    for path in writer.paths:
+        assert os.path.getsize(path) <= max_file_size
+    rows = []
+    for path in writer.paths:
+        rows += read_rows(path)
+    assert [int(r['a']) for r in rows] == list(range(20000))
+
+
+def test_it_uses_the_compress_level(tmp_path):
+    paths = []
+    for compress_level in [1, 9]:
+        with CsvWriter(os.path.join(tmp_path, 'report-{0}.csv'.format(compress_level)), ['a'], compress='gzip',
+                       compress_level=compress_level) as writer:
+            for i in range(10000):
+                writer.writerow({'a': i})
+        paths.append(writer.path)
+    assert os.path.getsize(paths[0]) > os.path.getsize(paths[1])
+    assert read_rows(paths[0]) == read_rows(paths[1])
+
+
+def test_it_raises_on_invalid_compression(tmp_path):
+    with pytest.raises(ValueError):
+        CsvWriter(os.path.join(tmp_path, 'report.csv'), ['a'], compress='zip')
@@ -0,0 +1,12 @@
+import os
+from syn_reports.core import ExternalSort
+
+
+def test_external_sort(tmp_path):
+    rows = [{'a': str(i % 7), 'b': str(i)} for i in range(50)]
+    key = lambda r: (r['a'], r['b'])
+    for chunk_size in [5, 1000]:
+        result = list(ExternalSort(['a', 'b'], key=key, chunk_size=chunk_size, tmp_dir=str(tmp_path)).sort(rows))
+        assert result == sorted(rows, key=key)
+    # The chunk files are deleted.
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,81 @@
+import os
+import csv
+import synapseclient as syn
+from synapsis import Synapsis
+from syn_reports.core import NormalizedWriter
+
+
+def read_csv(path):
+    with open(path, mode='r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_it_writes_each_table(tmp_path):
+    users = {
+        '100': syn.UserProfile(ownerId='100', userName='user100', company='Co', emails=['a@b.c']),
+        '101': syn.UserProfile(ownerId='101', userName='user101')
+    }
+    team = syn.Team(id='200', name='Team200')
+    entity = {'id': 'syn1', 'name': 'Project1'}
+    entity_type = Synapsis.ConcreteTypes.get('org.sagebionetworks.repo.model.Project')
+    permission = Synapsis.Permissions.CAN_VIEW
+
+    with NormalizedWriter(os.path.join(tmp_path, 'report.csv'), include_emails=True) as writer:
+        for principal_id, user_or_team in [('100', users['100']), ('200', team), ('300', None)]:
+            writer.add_acl_entry(entity, entity_type, None, 'syn1', principal_id, permission)
+            if writer.add_principal(principal_id, user_or_team) and user_or_team is team:
+                writer.add_team(team,
+                                [{'member': {'ownerId': '100'}, 'isAdmin': True},
+                                 {'member': {'ownerId': '101'}, 'isAdmin': False}],
+                                [{'inviteeEmail': 'd@e.f'}],
+                                lambda user_ids: {u: users[u] for u in user_ids if u in users})
+        # The team is only written once.
+        assert writer.add_principal('200', team) is False
+
+    assert writer.paths == [os.path.join(tmp_path, 'report-{0}.csv'.format(t)) for t in NormalizedWriter.TABLES]
+    assert [NormalizedWriter.table_of(p) for p in writer.paths] == list(NormalizedWriter.TABLES)
+
+    acl_entries = read_csv(writer.paths[0])
+    assert [(r['entity_id'], r['principal_id'], r['permission_level']) for r in acl_entries] == [
+        ('syn1', '100', 'Can View'), ('syn1', '200', 'Can View'), ('syn1', '300', 'Can View')]
+
+    principals = {r['principal_id']: r for r in read_csv(writer.paths[1])}
+    assert sorted(principals) == ['100', '101', '200', '300']
+    assert principals['100']['user_data'] == 'Co'
+    assert principals['100']['emails'] == 'a@b.c'
+    assert principals['200']['principal_type'] == 'Team'
+    assert principals['200']['team_name'] == 'Team200'
+    assert principals['300']['principal_type'] == 'Unknown'
+
+    assert [(r['team_id'], r['user_id'], r['is_team_manager']) for r in read_csv(writer.paths[2])] == [
+        ('200', '100', 'True'), ('200', '101', 'False')]
+    assert [(r['team_id'], r['invitee_email']) for r in read_csv(writer.paths[3])] == [('200', 'd@e.f')]
+
+
+def test_it_only_writes_the_emails_column_if_included(tmp_path):
+    user = syn.UserProfile(ownerId='100', userName='user100', emails=['a@b.c'])
+    for include_emails in [False, True]:
+        path = os.path.join(tmp_path, 'report-{0}.csv'.format(include_emails))
+        with NormalizedWriter(path, include_emails=include_emails) as writer:
+            writer.add_principal('100', user)
+        principals = read_csv(writer.paths[1])
+        assert ('emails' in principals[0]) is include_emails
+        assert principals[0]['username'] == 'user100'
+
+
+def test_it_only_loads_the_users_that_were_not_written(tmp_path, mocker):
+    users = {str(i): syn.UserProfile(ownerId=str(i), userName='user{0}'.format(i)) for i in range(100, 103)}
+    get_users = mocker.Mock(side_effect=lambda user_ids: {u: users[u] for u in user_ids})
+    with NormalizedWriter(os.path.join(tmp_path, 'report.csv')) as writer:
+        writer.add_principal('100', users['100'])
+        writer.add_team(syn.Team(id='200', name='Team200'),
+                        [{'member': {'ownerId': '100'}}, {'member': {'ownerId': '101'}}],
+                        [{'inviteeId': '101'}, {'inviteeId': '102'}],
+                        get_users)
+        writer.add_team(syn.Team(id='201', name='Team201'),
+                        [{'member': {'ownerId': '101'}}, {'member': {'ownerId': '102'}}],
+                        [],
+                        get_users)
+    # The profiles are loaded in one batch per team and only once.
+    assert get_users.call_args_list == [mocker.call(['101', '102'])]
+    assert [r['principal_id'] for r in read_csv(writer.paths[1])] == ['100', '101', '102']
@@ -0,0 +1,86 @@
+import time
+import pytest
+import synapseclient as syn
+from syn_reports.core import Utils, PrincipalCache
+from synapsis import Synapsis
+
+
+@pytest.fixture
+def principal_cache(tmp_path):
+    cache = PrincipalCache(str(tmp_path.joinpath('principal-cache.db')), create=True)
+    cache.add_team(syn.Team(id='3000', name='Team A', etag='e1'),
+                   [syn.TeamMember(teamId='3000', isAdmin=True, member={'ownerId': '100', 'userName': 'user-a'})],
+                   [{'teamId': '3000', 'inviteeId': '101'}])
+    cache.add_user(syn.UserProfile(ownerId='100', userName='user-a', etag='u1'))
+    cache.add_user(syn.UserProfile(ownerId='101', userName='user-b', etag='u2'))
+    cache.commit()
+    yield cache
+    Utils.WithCache.use_principal_cache(None)
+    cache.close()
+
+
+@pytest.fixture
+def no_synapse_calls(mocker):
+    for method in ['restGET', 'restPOST', 'getTeam', 'getTeamMembers', 'getUserProfile']:
+        mocker.patch.object(Synapsis.Synapse, method, side_effect=Exception('Synapse called.'))
+
+
+def test_it_requires_an_existing_cache(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        PrincipalCache(str(tmp_path.joinpath('missing.db')))
+
+
+def test_it_reads_the_cache(principal_cache):
+    assert principal_cache.get_team('Team A')['etag'] == 'e1'
+    assert principal_cache.get_team_members('3000')[0].member.userName == 'user-a'
+    assert principal_cache.get_team_member('3000', '101') == (True, None)
+    assert principal_cache.get_team_member('3001', '100') == (False, None)
+    assert principal_cache.get_team_open_invitations('3001') is None
+    assert principal_cache.get_user('USER-B')['ownerId'] == '101'
+    assert set(principal_cache.get_users(['100', '101', '102'])) == {'100', '101'}
+    assert principal_cache.referenced_user_ids() == {'100', '101'}
+    assert principal_cache.team_states()['3000'][0] == 'e1'
+
+
+def test_with_cache_loads_from_the_cache(principal_cache, no_synapse_calls):
+    Utils.WithCache.use_principal_cache(PrincipalCache(principal_cache.path))
+    assert Utils.WithCache.get_team('3000').name == 'Team A'
+    assert Utils.WithCache.get_team_members('3000')[0]['isAdmin'] is True
+    assert Utils.WithCache.get_team_member('3000', '100')['member']['ownerId'] == '100'
+    assert Utils.WithCache.get_team_open_invitations('3000')[0]['inviteeId'] == '101'
+    assert Utils.WithCache.get_user('user-a')['ownerId'] == '100'
+    assert set(Utils.WithCache.get_users(['100', '101'])) == {'100', '101'}
+    with pytest.raises(Exception, match='Synapse called.'):
+        Utils.WithCache.get_team('3001')
+
+
+def test_it_does_not_read_entries_older_than_the_max_age(principal_cache, no_synapse_calls):
+    old = time.time() - 2 * PrincipalCache.DEFAULT_MAX_AGE
+    principal_cache.add_team(syn.Team(id='3001', name='Team B', etag='e2'), [], [], loaded_at=old)
+    principal_cache.add_user(syn.UserProfile(ownerId='102', userName='user-c', etag='u3'), loaded_at=old)
+    principal_cache.commit()
+    assert principal_cache.max_age == PrincipalCache.DEFAULT_MAX_AGE
+    assert principal_cache.get_team('Team B') is None
+    assert principal_cache.get_team_members('3001') is None
+    assert principal_cache.get_team_open_invitations('3001') is None
+    assert principal_cache.get_user('102') is None
+    assert principal_cache.get_user('user-c') is None
+    assert set(principal_cache.get_users(['100', '102'])) == {'100'}
+
+    # The max age the cache was warmed with is used.
+    principal_cache.set_meta('max_age', 3 * PrincipalCache.DEFAULT_MAX_AGE)
+    principal_cache.commit()
+    cache = PrincipalCache(principal_cache.path)
+    assert cache.get_team('3001')['etag'] == 'e2'
+    assert cache.get_user('user-c')['ownerId'] == '102'
+    cache.close()
+
+    Utils.WithCache.use_principal_cache(PrincipalCache(principal_cache.path, max_age=60))
+    with pytest.raises(Exception, match='Synapse called.'):
+        Utils.WithCache.get_team('3001')
+
+
+def test_it_gets_the_age(principal_cache):
+    assert principal_cache.age() is None
+    principal_cache.set_meta('warmed_at', time.time() - 60)
+    assert 60 <= principal_cache.age() < 70
@@ -0,0 +1,110 @@
+import json
+import time
+import pstats
+import pytest
+from syn_reports.core import Profiler
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = Profiler(stats_path=str(tmp_path.joinpath('profile.stats')), trace_memory=True).start()
+    yield profiler
+    profiler.stop()
+
+
+def test_it_does_nothing_when_not_started():
+    assert Profiler.active is None
+    with Profiler.phase(Profiler.LOGIN):
+        pass
+    items = [1, 2]
+    assert Profiler.iterate(Profiler.VIEW_QUERY, items) is items
+
+
+def test_it_times_the_phases(profiler, capsys):
+    @Profiler.timed(Profiler.OUTPUT)
+    def output():
+        return 'done'
+
+    with Profiler.phase(Profiler.LOGIN):
+        pass
+    with Profiler.entity('syn1'):
+        assert output() == 'done'
+        assert list(Profiler.iterate(Profiler.VIEW_QUERY, ['a', 'b'])) == ['a', 'b']
+    with Profiler.entity('syn2'):
+        output()
+
+    assert profiler.phases[Profiler.LOGIN][0] == 1
+    assert profiler.phases[Profiler.OUTPUT][0] == 2
+    # Each item and the end of the iterable.
+    assert profiler.phases[Profiler.VIEW_QUERY][0] == 3
+    assert list(profiler.entities) == ['syn1', 'syn2']
+    assert profiler.entities['syn1'][Profiler.OUTPUT][0] == 1
+    assert Profiler.LOGIN not in profiler.entities['syn1']
+    assert profiler.phases[Profiler.OUTPUT][3] is not None
+
+    profiler.stop()
+    assert Profiler.active is None
+    assert pstats.Stats(profiler.stats_path).total_calls > 0
+    profiler.print_report()
+    out = capsys.readouterr().out
+    assert 'Profile (seconds):' in out
+    assert 'peak_mb' in out
+    assert '  syn2:' in out
+
+
+def test_it_writes_a_trace(tmp_path):
+    trace_path = str(tmp_path.joinpath('trace.json'))
+    profiler = Profiler(trace_path=trace_path).start()
+    try:
+        with Profiler.entity('syn1'):
+            with Profiler.span(Profiler.SET_SCOPE):
+                with Profiler.phase(Profiler.ACL_FETCH):
+                    pass
+    finally:
+        profiler.stop()
+
+    with open(trace_path) as f:
+        events = json.load(f)['traceEvents']
+    assert [e['name'] for e in events] == ['thread_name', Profiler.ACL_FETCH, Profiler.SET_SCOPE, Profiler.ENTITY]
+    acl_fetch, set_scope, entity = events[1:]
+    assert all(e['ph'] == 'X' and e['args']['entity_id'] == 'syn1' for e in events[1:])
+    assert entity['ts'] <= set_scope['ts'] <= acl_fetch['ts']
+    assert acl_fetch['ts'] + acl_fetch['dur'] <= entity['ts'] + entity['dur']
+    # Spans are only traced.
+    assert Profiler.SET_SCOPE not in profiler.phases
+    assert Profiler.ACL_FETCH in profiler.phases
+
+
+
+def test_it_traces_each_step_of_an_iterable_as_a_span(tmp_path):
+    trace_path = str(tmp_path.joinpath('trace.json'))
+    profiler = Profiler(trace_path=trace_path).start()
+    try:
+        for _ in Profiler.iterate_span(Profiler.SET_SCOPE, range(2)):
+            # The time taken to use each item is not in the span.
+            time.sleep(0.05)
+    finally:
+        profiler.stop()
+
+    with open(trace_path) as f:
+        events = json.load(f)['traceEvents']
+    set_scopes = [e for e in events if e['name'] == Profiler.SET_SCOPE]
+    # One span for each item and one for the end of the iterable.
+    assert len(set_scopes) == 3
+    assert all(e['dur'] < 50000 for e in set_scopes)
+    assert Profiler.SET_SCOPE not in profiler.phases
+
+
+def test_it_adds_the_timings_of_another_profiler():
+    other = Profiler(**Profiler(trace_memory=False).process_args())
+    other._add(Profiler.ACL_FETCH, 'syn1', 2.0)
+    other._add(Profiler.ACL_FETCH, None, 1.0)
+    timings = other.take_timings()
+    assert other.phases == {} and other.entities == {}
+
+    profiler = Profiler()
+    profiler._add(Profiler.ACL_FETCH, 'syn2', 0.5)
+    profiler.add_timings(*timings)
+    assert profiler.phases[Profiler.ACL_FETCH] == [3, 3.5, 2.0, None]
+    assert profiler.entities['syn1'][Profiler.ACL_FETCH] == [1, 2.0, 2.0, None]
+    assert profiler.entities['syn2'][Profiler.ACL_FETCH] == [1, 0.5, 0.5, None]
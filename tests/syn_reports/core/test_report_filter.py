@@ -0,0 +1,113 @@
+import os
+import argparse
+import pytest
+from synapsis import Synapsis
+from syn_reports.core import ReportFilter, Snapshot
+
+
+@pytest.fixture()
+def snapshot(tmp_path):
+    with Snapshot(os.path.join(tmp_path, 'snapshot.db'), create=True) as snapshot:
+        snapshot.add_user({'ownerId': '100', 'userName': 'user100'})
+        snapshot.add_user({'ownerId': '101', 'userName': 'user101'})
+        snapshot.add_team({'id': '200', 'name': 'Team200'},
+                          [{'member': {'ownerId': '100'}, 'isAdmin': True},
+                           {'member': {'ownerId': '101'}, 'isAdmin': False}],
+                          [{'inviteeEmail': 'd@e.f'}])
+        snapshot.add_team({'id': '201', 'name': 'Team201'},
+                          [{'member': {'ownerId': '101'}, 'isAdmin': False}],
+                          [])
+        snapshot.commit()
+        yield snapshot
+
+
+def test_it_parses_permission_levels():
+    assert ReportFilter.parse_permission_level('admin') == 'ADMIN'
+    assert ReportFilter.parse_permission_level('Can View') == 'CAN_VIEW'
+    with pytest.raises(argparse.ArgumentTypeError):
+        ReportFilter.parse_permission_level('ADMINISTER')
+
+
+def test_it_includes_everything_without_filters(snapshot):
+    report_filter = ReportFilter()
+    assert report_filter.is_set is False
+    assert report_filter.resolve(snapshot, print)
+    assert report_filter.includes_permission(Synapsis.Permissions.CAN_VIEW)
+    assert report_filter.may_include_principal('999')
+    assert report_filter.includes('Unknown', '999')
+    assert len(report_filter.get_team_members('200', snapshot)) == 2
+    assert len(report_filter.get_team_invitations('200', snapshot)) == 1
+
+
+def test_it_filters_by_permission_level():
+    report_filter = ReportFilter(permission_levels=['ADMIN', 'Can View'])
+    assert report_filter.includes_permission(Synapsis.Permissions.ADMIN)
+    assert report_filter.includes_permission(Synapsis.Permissions.CAN_VIEW)
+    assert not report_filter.includes_permission(Synapsis.Permissions.CAN_DOWNLOAD)
+
+
+def test_it_filters_by_user(snapshot, mocker):
+    report_filter = ReportFilter(principals=['user100'])
+    assert report_filter.resolve(snapshot, print)
+    get_team_members = mocker.spy(snapshot, 'get_team_members')
+
+    assert report_filter.may_include_principal('100')
+    assert report_filter.includes('User', '100')
+    # Only the teams the user is a member of can match.
+    assert report_filter.may_include_principal('200')
+    assert not report_filter.includes('Team', '200')
+    assert not report_filter.may_include_principal('201')
+    assert not report_filter.may_include_principal('101')
+
+    assert [m['member']['ownerId'] for m in report_filter.get_team_members('200', snapshot)] == ['100']
+    assert report_filter.get_team_members('201', snapshot) == []
+    assert report_filter.get_team_invitations('200', snapshot) == []
+    get_team_members.assert_not_called()
+
+
+def test_it_filters_by_the_invitations_of_a_user(snapshot):
+    snapshot.add_team({'id': '202', 'name': 'Team202'},
+                      [],
+                      [{'inviteeId': '100'}, {'inviteeId': '101'}, {'inviteeEmail': 'd@e.f'}])
+    snapshot.commit()
+    report_filter = ReportFilter(principals=['user100'])
+    assert report_filter.resolve(snapshot, print)
+
+    assert report_filter.may_include_principal('202')
+    assert not report_filter.includes('Team', '202')
+    assert report_filter.get_team_members('202', snapshot) == []
+    assert [i['inviteeId'] for i in report_filter.get_team_invitations('202', snapshot)] == ['100']
+
+    report_filter = ReportFilter(principals=['user100'], principal_types=['User'])
+    assert report_filter.resolve(snapshot, print)
+    assert not report_filter.may_include_principal('202')
+    assert report_filter.get_team_invitations('202', snapshot) == []
+
+
+def test_it_filters_by_team(snapshot):
+    report_filter = ReportFilter(principals=['Team200'])
+    assert report_filter.resolve(snapshot, print)
+    assert report_filter.may_include_principal('200')
+    assert report_filter.includes('Team', '200')
+    assert not report_filter.may_include_principal('100')
+    assert not report_filter.may_include_principal('201')
+    assert len(report_filter.get_team_members('200', snapshot)) == 2
+    assert len(report_filter.get_team_invitations('200', snapshot)) == 1
+
+
+def test_it_filters_by_principal_type(snapshot, mocker):
+    report_filter = ReportFilter(principal_types=['Team'])
+    get_team_members = mocker.spy(snapshot, 'get_team_members')
+    get_team_open_invitations = mocker.spy(snapshot, 'get_team_open_invitations')
+    assert report_filter.includes('Team', '200')
+    assert not report_filter.includes('User', '100')
+    assert report_filter.get_team_members('200', snapshot) == []
+    assert report_filter.get_team_invitations('200', snapshot) == []
+    get_team_members.assert_not_called()
+    get_team_open_invitations.assert_not_called()
+
+
+def test_it_errors_if_a_principal_is_not_found(snapshot):
+    errors = []
+    assert ReportFilter(principals=['user100', 'nobody']).resolve(snapshot, errors.append) is False
+    assert errors == ['Could not find user or team matching: nobody']
@@ -0,0 +1,101 @@
+import json
+import requests
+import pytest
+from requests.adapters import BaseAdapter
+from syn_reports.core import RunMetrics, Profiler, CsvWriter
+from synapsis import Synapsis
+
+
+class FakeAdapter(BaseAdapter):
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 404 if request.url.endswith('/missing') else 200
+        response._content = b'{}'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def session(mocker):
+    session = requests.Session()
+    session.mount('https://', FakeAdapter())
+    mocker.patch.object(Synapsis.Synapse, '_requests_session', session)
+    yield session
+    RunMetrics.active = None
+    Profiler.active = None
+
+
+def test_it_does_nothing_when_not_started():
+    assert RunMetrics.active is None
+    RunMetrics.increment(RunMetrics.ROWS_WRITTEN)
+    RunMetrics.add_error('http_500')
+
+
+def test_it_writes_json(tmp_path, session):
+    path = str(tmp_path.joinpath('metrics.json'))
+    metrics = RunMetrics(path, 'entity-permissions').start()
+    assert Profiler.active is not None
+    session.get('https://test.synapse.org/a')
+    session.get('https://test.synapse.org/missing')
+    RunMetrics.increment(RunMetrics.ENTITIES_PROCESSED)
+    with Profiler.phase(Profiler.ACL_FETCH):
+        pass
+    with CsvWriter(str(tmp_path.joinpath('report.csv')), ['a']) as writer:
+        writer.writerow({'a': 1})
+        writer.writerow({'a': 2})
+    metrics.stop()
+    assert Profiler.active is None
+    metrics.write(False, errors=['error 1'])
+
+    with open(path) as f:
+        result = json.load(f)
+    assert result['command'] == 'entity-permissions'
+    assert result['success'] is False
+    assert result[RunMetrics.ENTITIES_PROCESSED] == 1
+    assert result[RunMetrics.ROWS_WRITTEN] == 2
+    assert result[RunMetrics.BYTES_WRITTEN] == tmp_path.joinpath('report.csv').stat().st_size
+    assert result[RunMetrics.API_CALLS] == 2
+    assert result['errors'] == {'http_404': 1, 'report': 1}
+    assert result['phases'][Profiler.ACL_FETCH]['count'] == 1
+
+
+def test_it_writes_prometheus(tmp_path, session):
+    path = str(tmp_path.joinpath('metrics.prom'))
+    metrics = RunMetrics(path, 'team-members').start()
+    RunMetrics.increment(RunMetrics.ROWS_WRITTEN, 3)
+    metrics.stop()
+    metrics.write(True)
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert '# TYPE syn_reports_rows_written gauge' in lines
+    assert 'syn_reports_rows_written{command="team-members"} 3' in lines
+    assert 'syn_reports_last_run_success{command="team-members"} 1' in lines
+    assert 'syn_reports_errors{command="team-members",type="report"} 0' in lines
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_it_counts_the_calls_of_a_new_session(tmp_path, session, mocker):
+    metrics = RunMetrics(str(tmp_path.joinpath('metrics.prom')), 'user-teams').start()
+    new_session = requests.Session()
+    new_session.mount('https://', FakeAdapter())
+
+    def _login():
+        mocker.patch.object(Synapsis.Synapse, '_requests_session', new_session)
+
+    metrics.login(_login)
+    new_session.get('https://test.synapse.org/a')
+    session.get('https://test.synapse.org/a')
+    metrics.stop()
+    # Calls are not counted after the metrics are stopped.
+    new_session.get('https://test.synapse.org/a')
+    assert metrics.counters[RunMetrics.API_CALLS] == 2
+
+
+def test_it_validates_the_format(tmp_path):
+    with pytest.raises(ValueError):
+        RunMetrics(str(tmp_path.joinpath('metrics.txt')), 'diff', format='xml')
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import pytest
+import synapseclient as syn
+from syn_reports.core import Utils, SessionCache
+from synapsis import Synapsis
+
+
+@pytest.fixture
+def session_cache(tmp_path):
+    return SessionCache(path=str(tmp_path.joinpath('session.json')))
+
+
+@pytest.fixture
+def mock_login(mocker):
+    mocker.patch.object(type(Synapsis.Synapse), '__init_self__')
+    mocker.patch.object(SessionCache, '_get_auth_token', return_value='token-1')
+    mocker.patch.object(syn.Synapse, 'getUserProfile',
+                        return_value=syn.UserProfile(ownerId='123', userName='test-user'))
+    mock = mocker.patch.object(type(Synapsis), 'login')
+    yield mock
+    Utils.WithCache.clear_cache()
+    Synapsis.Synapse.__dict__.pop('_rest_call', None)
+
+
+def test_login_saves_private_cache(session_cache, mock_login):
+    assert session_cache.login() is False
+    mock_login.assert_called_once()
+    assert os.stat(session_cache.path).st_mode & 0o777 == 0o600
+
+    with open(session_cache.path) as f:
+        data = json.load(f)
+    assert 'token-1' not in json.dumps(data)
+    assert data['endpoint'] == Synapsis.Synapse.repoEndpoint
+    assert data['profile']['userName'] == 'test-user'
+    assert Utils.WithCache.get_current_user().userName == 'test-user'
+
+
+def test_login_reuses_cache(session_cache, mock_login):
+    session_cache.login()
+    Utils.WithCache.clear_cache()
+
+    assert session_cache.login() is True
+    mock_login.assert_called_once()
+    assert Utils.WithCache.get_current_user().userName == 'test-user'
+    assert Synapsis.Synapse.credentials.secret == 'token-1'
+
+
+def test_login_does_not_reuse_cache_for_other_token(session_cache, mock_login, mocker):
+    session_cache.login()
+    mocker.patch.object(SessionCache, '_get_auth_token', return_value='token-2')
+    assert session_cache.login() is False
+    assert mock_login.call_count == 2
+
+
+def test_login_does_not_reuse_expired_cache(session_cache, mock_login, mocker):
+    session_cache.login()
+    mocker.patch('time.time', return_value=time.time() + session_cache.ttl + 1)
+    assert session_cache.login() is False
+    assert mock_login.call_count == 2
+
+
+def test_login_does_not_reuse_cache_readable_by_others(session_cache, mock_login, capsys):
+    session_cache.login()
+    os.chmod(session_cache.path, 0o644)
+    assert session_cache.login() is False
+    assert mock_login.call_count == 2
+    assert 'not private' in capsys.readouterr().err
+
+
+def test_login_without_auth_token_is_not_cached(session_cache, mock_login, mocker):
+    mocker.patch.object(SessionCache, '_get_auth_token', return_value=None)
+    assert session_cache.login() is False
+    mock_login.assert_called_once()
+    assert not os.path.exists(session_cache.path)
+
+
+def test_login_again_on_auth_error(session_cache, mock_login, mocker):
+    response = mocker.Mock(status_code=401)
+    mock_rest_call = mocker.patch.object(syn.Synapse, '_rest_call',
+                                         side_effect=[syn.core.exceptions.SynapseHTTPError(response=response),
+                                                      'ok'])
+    session_cache.login()
+    assert session_cache.login() is True
+
+    assert Synapsis._rest_call('get', '/a', None, None, None, None, None) == 'ok'
+    assert mock_rest_call.call_count == 2
+    assert mock_login.call_count == 2
+    assert '_rest_call' not in Synapsis.Synapse.__dict__
@@ -0,0 +1,84 @@
+import pytest
+import os
+from syn_reports.core import Snapshot
+
+PROJECT = 'org.sagebionetworks.repo.model.Project'
+FOLDER = 'org.sagebionetworks.repo.model.Folder'
+
+
+def bundle(entity_id, name, concrete_type, path, resource_access=None):
+    return {
+        'entity': {'id': entity_id, 'name': name, 'concreteType': concrete_type, 'parentId': path[-1]['id'],
+                   'createdBy': '100'},
+        'path': {'path': path + [{'id': entity_id, 'name': name, 'type': concrete_type}]},
+        'accessControlList': {'id': entity_id, 'resourceAccess': resource_access or []}
+    }
+
+
+@pytest.fixture()
+def snapshot(tmp_path):
+    root = {'id': 'syn4489', 'name': 'root', 'type': FOLDER}
+    project = {'id': 'syn1', 'name': 'Project1', 'type': PROJECT}
+    folder = {'id': 'syn2', 'name': 'Folder1', 'type': FOLDER}
+    with Snapshot(os.path.join(tmp_path, 'snapshot.db'), create=True) as snapshot:
+        snapshot.add_bundle(bundle('syn1', 'Project1', PROJECT, [root],
+                                   [{'principalId': 100, 'accessType': ['READ']},
+                                    {'principalId': 200, 'accessType': ['READ', 'DOWNLOAD']}]))
+        snapshot.add_bundle(bundle('syn3', 'Folder2', FOLDER, [root, project, folder],
+                                   [{'principalId': 200, 'accessType': ['READ']}]))
+        snapshot.add_user({'ownerId': '100', 'userName': 'user100', 'firstName': 'First', 'emails': ['a@b.c']})
+        snapshot.add_user({'ownerId': '101', 'userName': 'user101'})
+        snapshot.add_team({'id': '200', 'name': 'Team200'},
+                          [{'member': {'ownerId': '101'}, 'isAdmin': True}],
+                          [{'inviteeEmail': 'd@e.f'}])
+        snapshot.commit()
+        yield snapshot
+
+
+def test_it_raises_if_the_snapshot_does_not_exist(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Snapshot(os.path.join(tmp_path, 'missing.db'))
+
+
+def test_it_gets_entities(snapshot):
+    assert snapshot.get_entity('syn1')['name'] == 'Project1'
+    assert snapshot.get_entity('Project1')['id'] == 'syn1'
+    assert snapshot.get_entity('Folder1') is None
+    assert snapshot.get_entity('syn2', only_header=True)['benefactorId'] == 'syn1'
+    assert snapshot.get_entity('syn3', only_header=True)['benefactorId'] == 'syn3'
+    assert [c['id'] for c in snapshot.get_children('syn1')] == ['syn2']
+    assert [p['id'] for p in snapshot.projects()] == ['syn1']
+
+
+def test_it_gets_benefactors(snapshot):
+    project = snapshot.get_entity('syn1')
+    folder = snapshot.get_entity('syn2')
+    assert [b['benefactor_id'] for b in snapshot.get_benefactors(project)] == ['syn1', 'syn3']
+    assert [b['benefactor_id'] for b in snapshot.get_benefactors(folder)] == ['syn1', 'syn3']
+
+    benefactor_view = snapshot.benefactor_view()
+    benefactor_view.set_scope(snapshot.get_entity('syn3'))
+    assert benefactor_view == [{'benefactor_id': 'syn3', 'project_id': 'syn1'}]
+
+
+def test_it_gets_acls(snapshot):
+    assert snapshot.get_acl('syn2')['id'] == 'syn1'
+    assert snapshot.get_acl('syn1')['resourceAccess'] == [{'principalId': 100, 'accessType': ['READ']},
+                                                          {'principalId': 200, 'accessType': ['DOWNLOAD', 'READ']}]
+    assert snapshot.WithCache.get_bundle('syn3')['accessControlList']['id'] == 'syn3'
+
+
+def test_it_gets_users_and_teams(snapshot):
+    assert snapshot.get_user('100')['firstName'] == 'First'
+    assert snapshot.get_user('USER100')['emails'] == ['a@b.c']
+    assert snapshot.get_user('999') is None
+    assert snapshot.get_team('Team200')['id'] == '200'
+    assert snapshot.get_user_or_team('200')['name'] == 'Team200'
+    assert list(snapshot.get_users(['100', '999']).keys()) == ['100']
+
+    assert snapshot.get_team_members('200')[0]['member']['userName'] == 'user101'
+    assert snapshot.get_team_member('200', '101')['isAdmin'] is True
+    assert snapshot.get_team_open_invitations('200') == [{'teamId': '200', 'inviteeEmail': 'd@e.f'}]
+    assert list(snapshot.users_teams('101')) == [{'id': '200', 'name': 'Team200'}]
+    assert [p['id'] for p in snapshot.users_project_access('101')] == ['syn1']
+    assert list(snapshot.users_project_access('999')) == []
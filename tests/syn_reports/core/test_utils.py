@@ -1,4 +1,5 @@
 import pytest
+import argparse
 from syn_reports.core import Utils
 from synapsis import Synapsis
 import synapseclient as syn
@@ -66,3 +67,180 @@ def test_with_cache_get_team_members(synapse_test_helper):
     # Returns [] if the team does not exist
     assert Utils.WithCache.get_team_members('-9999999') == []
     assert Utils.WithCache.get_team_members('000') == []
+
+
+def test_prefetch():
+    assert list(Utils.prefetch(iter(range(100)), maxsize=5)) == list(range(100))
+    assert list(Utils.prefetch(iter([]))) == []
+
+    # Raises errors from the iterable.
+    def _raises():
+        yield 1
+        raise ValueError('prefetch error')
+
+    with pytest.raises(ValueError, match='prefetch error'):
+        list(Utils.prefetch(_raises()))
+
+    # Stops when the consumer stops.
+    for item in Utils.prefetch(iter(range(100)), maxsize=1):
+        if item == 2:
+            break
+
+
+def test_thread_map():
+    assert list(Utils.thread_map(lambda i: i * 2, range(100), max_workers=4)) == [i * 2 for i in range(100)]
+    assert list(Utils.thread_map(lambda i: i, [])) == []
+
+
+def test_with_cache_get_team_member(synapse_test_helper):
+    user_id = Synapsis.getUserProfile().get('ownerId')
+    team = synapse_test_helper.create_team()
+    team_member = Utils.WithCache.get_team_member(team.id, user_id)
+    assert team_member['isAdmin'] is True
+
+    # Returns None if the team does not exist
+    assert Utils.WithCache.get_team_member('-9999999', user_id) is None
+
+
+def test_with_cache_get_team_member_raises_errors(mocker):
+    response = mocker.Mock(status_code=500)
+    mocker.patch.object(syn.Synapse, 'restGET',
+                        side_effect=syn.core.exceptions.SynapseHTTPError('Server error', response=response))
+    with pytest.raises(syn.core.exceptions.SynapseHTTPError):
+        Utils.WithCache.get_team_member('3000', '100')
+
+    response.status_code = 404
+    assert Utils.WithCache.get_team_member('3000', '100') is None
+    Utils.WithCache.clear_cache()
+
+
+def test_with_cache_get_users_team_ids(synapse_test_helper):
+    user_id = Synapsis.getUserProfile().get('ownerId')
+    team = synapse_test_helper.create_team()
+    team_ids = Utils.WithCache.get_users_team_ids(user_id)
+    assert team.id in team_ids
+
+
+def test_with_cache_get_users(mocker):
+    user_id = Synapsis.getUserProfile().get('ownerId')
+    users = Utils.WithCache.get_users([user_id, user_id, '-9999999'])
+    assert list(users.keys()) == [str(user_id)]
+    assert users[str(user_id)]['ownerId'] == user_id
+
+    # Loaded users are not fetched again.
+    spy = mocker.spy(Utils.WithCache, '_get_user_profiles_batch')
+    assert Utils.WithCache.get_users([user_id])[str(user_id)]['ownerId'] == user_id
+    assert Utils.WithCache.get_user(user_id)['ownerId'] == user_id
+    spy.assert_not_called()
+
+
+def test_parse_shard():
+    assert Utils.parse_shard('2/4') == (2, 4)
+    for value in ['0/4', '5/4', '1', 'a/b']:
+        with pytest.raises(argparse.ArgumentTypeError):
+            Utils.parse_shard(value)
+
+
+def test_select_shard():
+    keys = ['syn{0}'.format(i) for i in range(100)]
+    shards = [Utils.select_shard(keys, (index, 4)) for index in range(1, 5)]
+    assert sorted(sum(shards, [])) == sorted(keys)
+    assert all(shards)
+    # The shards are the same every time.
+    assert shards == [Utils.select_shard(list(reversed(keys)), (index, 4))[::-1] for index in range(1, 5)]
+
+    sizes = {key: 100 if key == 'syn0' else 1 for key in keys}
+    shards = [Utils.select_shard(keys, (index, 4), size_func=sizes.get) for index in range(1, 5)]
+    assert sorted(sum(shards, [])) == sorted(keys)
+    # The large key is in a shard by itself.
+    assert ['syn0'] in shards
+
+
+def test_parse_size():
+    assert Utils.parse_size('100') == 100
+    assert Utils.parse_size('2k') == 2048
+    assert Utils.parse_size('500MB') == 500 * 1024 ** 2
+    assert Utils.parse_size('1.5G') == int(1.5 * 1024 ** 3)
+    for value in ['0', 'abc', '-1MB']:
+        with pytest.raises(argparse.ArgumentTypeError):
+            Utils.parse_size(value)
+
+
+def test_select_columns():
+    all_columns = ['a', 'b', 'c']
+    assert Utils.select_columns(all_columns) == all_columns
+    assert Utils.select_columns(all_columns, ['c', 'a', 'c']) == ['c', 'a']
+    with pytest.raises(ValueError) as ex:
+        Utils.select_columns(all_columns, ['a', 'd'])
+    assert 'Invalid columns: d' in str(ex.value)
+
+
+def test_defer_login(mocker):
+    mock_rest_call = mocker.patch.object(syn.Synapse, '_rest_call')
+    mock_login = mocker.patch.object(type(Synapsis), 'login')
+    Utils.defer_login()
+    mock_login.assert_not_called()
+
+    list(Utils.thread_map(lambda uri: Synapsis._rest_call('get', uri, None, None, None, None, None),
+                          ['/a', '/b', '/c']))
+    mock_login.assert_called_once()
+    assert mock_rest_call.call_count == 3
+    assert '_rest_call' not in Synapsis.Synapse.__dict__
+
+
+def test_users_teams_detects_truncated_results(mocker):
+    pages = [{'results': [{'id': '1'}, {'id': '2'}], 'totalNumberOfResults': 3},
+             {'results': [], 'totalNumberOfResults': 3}]
+    mocker.patch.object(syn.Synapse, 'restGET', side_effect=pages)
+    with pytest.raises(ValueError, match='Loaded 2 of 3 teams for user: 100'):
+        list(Utils.users_teams('100'))
+
+    mocker.patch.object(syn.Synapse, 'restGET', side_effect=[{'results': [{'id': '1'}], 'totalNumberOfResults': 1},
+                                                             {'results': [], 'totalNumberOfResults': 1}])
+    assert Utils.WithCache.get_users_team_ids('100') == frozenset(['1'])
+    Utils.WithCache.clear_cache()
+    mocker.patch.object(syn.Synapse, 'restGET', side_effect=pages)
+    assert Utils.WithCache.get_users_team_ids('100') is None
+    Utils.WithCache.clear_cache()
+
+
+def test_with_cache_get_users_bounds_the_profiles(mocker):
+    mocker.patch.object(Utils.WithCache, 'USER_PROFILES_MAXSIZE', 3)
+    mocker.patch.object(Utils.WithCache, '_get_user_profiles_batch',
+                        side_effect=lambda ids: [syn.UserProfile(ownerId=i, userName='user-{0}'.format(i))
+                                                 for i in ids])
+    users = Utils.WithCache.get_users(['1', '2', '3', '4', '5'])
+    assert list(users) == ['1', '2', '3', '4', '5']
+    assert len(Utils.WithCache._user_profiles) == 3
+    Utils.WithCache.clear_cache()
+
+
+def test_with_cache_cache_size(mocker):
+    mocker.patch.object(syn.Synapse, 'restGET', side_effect=lambda uri: {'uri': uri})
+    maxsize = Utils.WithCache.get_acl.cache_parameters()['maxsize']
+    hits, misses = Utils.WithCache.cache_info()
+    with Utils.WithCache.cache_size(None):
+        for method in Utils.WithCache._cached_methods():
+            assert method.cache_parameters()['maxsize'] is None
+        for i in range(maxsize + 1):
+            Utils.WithCache.get_acl('syn{0}'.format(i))
+        # Every result is kept.
+        Utils.WithCache.get_acl('syn0')
+        assert Utils.WithCache.get_acl.cache_info().currsize == maxsize + 1
+        assert Utils.WithCache.cache_info() == (hits + 1, misses + maxsize + 1)
+    assert Utils.WithCache.get_acl.cache_parameters()['maxsize'] == maxsize
+    # The hits and misses of the replaced caches are still counted.
+    assert Utils.WithCache.cache_info() == (hits + 1, misses + maxsize + 1)
+
+
+def test_with_cache_refresh_cache(mocker):
+    mock_batch = mocker.patch.object(Utils.WithCache, '_get_user_profiles_batch',
+                                     side_effect=lambda ids: [syn.UserProfile(ownerId=i) for i in ids if i != '9'])
+    Utils.WithCache.get_users(['1', '2', '3', '9'])
+    mock_batch.reset_mock()
+
+    # Only the most recently loaded profiles are loaded again.
+    assert Utils.WithCache.refresh_cache(max_user_profiles=2) == 2
+    mock_batch.assert_called_once_with(['2', '3'])
+    assert list(Utils.WithCache._user_profiles) == ['2', '3']
+    Utils.WithCache.clear_cache()
@@ -1 +1,48 @@
+import pytest
+import os
+import sys
+import time
+import subprocess
+from syn_reports.cli import main as cli_main
+from synapsis import Synapsis
 
+# Guards against slowing down the CLI startup (e.g., by importing the commands or logging in for every command).
+MAX_STARTUP_SECONDS = 1.5
+
+RUN_CLI = '\n'.join([
+    'import sys',
+    'from syn_reports.cli import main',
+    'try:',
+    '    main(sys.argv[1:])',
+    'except SystemExit as ex:',
+    '    print(ex.code, "synapseclient" in sys.modules)'
+])
+
+
+def run_cli(*args):
+    start_time = time.monotonic()
+    # Use the same import paths as the tests.
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, '-c', RUN_CLI, *args], capture_output=True, text=True, env=env)
+    elapsed = time.monotonic() - start_time
+    exit_code, imported_synapseclient = result.stdout.strip().splitlines()[-1].split(' ')
+    return int(exit_code), imported_synapseclient == 'True', elapsed
+
+
+@pytest.mark.parametrize('args', [['--help'], ['--version']])
+def test_it_starts_without_importing_the_commands(args):
+    exit_code, imported_synapseclient, elapsed = run_cli(*args)
+    assert exit_code == 0
+    assert imported_synapseclient is False
+    assert elapsed < MAX_STARTUP_SECONDS
+
+
+def test_it_fails_early_without_logging_in(tmp_path, mocker):
+    exit_code, _, elapsed = run_cli('diff', str(tmp_path / 'missing1.csv'), str(tmp_path / 'missing2.csv'))
+    assert exit_code == 1
+    assert elapsed < MAX_STARTUP_SECONDS * 2
+
+    mock_login = mocker.patch.object(type(Synapsis), 'login')
+    with pytest.raises(SystemExit):
+        cli_main(['diff', str(tmp_path / 'missing1.csv'), str(tmp_path / 'missing2.csv')])
+    mock_login.assert_not_called()